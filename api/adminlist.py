@@ -0,0 +1,107 @@
+# api/adminlist.py
+"""
+Серверные списки админки: фильтр, сортировка, keyset-страницы и счётчики.
+
+Раньше списки тренеров/услуг/курсов/новостей грузили все строки (.all())
+и фильтровали/сортировали их в браузере. Теперь всё в SQL:
+
+    ?q=…            подстрока в названии/имени (ILIKE по search-колонкам)
+    ?section=ski    секция (для тренеров и услуг)
+    ?price_min=…&price_max=…   диапазон цены (услуги)
+    ?flag=…         доп. условия вида «только с картинкой»
+    ?sort=name&dir=asc         только по колонкам из белого списка
+    ?cursor=…       keyset-страница (api/pagination.py)
+
+Счётчики — один GROUP BY по секции поверх тех же фильтров (кроме самой
+секции): «Все (120) · Горнолыжная база (70) · Зал (50)».
+"""
+from dataclasses import dataclass, field
+
+from api.models import db
+from api.pagination import KeysetPage, keyset_paginate
+
+
+@dataclass
+class ListSpec:
+    model: type
+    sorts: dict                                  # ключ в URL -> колонка
+    default_sort: str
+    default_desc: bool = False
+    search: tuple = ()                           # колонки для ?q=
+    section_col: object = None
+    price_col: object = None
+    flags: dict = field(default_factory=dict)    # ключ -> (подпись, условие SQL)
+    options: tuple = ()                          # load_only/undefer и т.п.
+
+
+@dataclass
+class AdminList:
+    items: list
+    page: KeysetPage
+    total: int                                   # строк под фильтром
+    counts: dict                                 # секция -> строк (под остальными фильтрами)
+    params: dict                                 # текущие параметры фильтра/сортировки
+    sort: str
+    desc: bool
+
+    def args(self, **overrides) -> dict:
+        """Параметры для url_for: текущие + изменения, без пустых значений и без курсора."""
+        merged = {**self.params, "sort": self.sort, "dir": "desc" if self.desc else "asc", **overrides}
+        return {k: v for k, v in merged.items() if v not in (None, "")}
+
+    def sort_args(self, key: str) -> dict:
+        """Ссылка заголовка колонки: повторный клик меняет направление."""
+        desc = not self.desc if key == self.sort else False
+        return self.args(sort=key, dir="desc" if desc else "asc")
+
+
+def _float(value: str | None) -> float | None:
+    try:
+        return float(value.replace(",", ".")) if value else None
+    except ValueError:
+        return None
+
+
+def _like(text: str) -> str:
+    escaped = text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def admin_list(spec: ListSpec, args, per_page: int = 50) -> AdminList:
+    params = {"q": (args.get("q") or "").strip()[:100]}
+    query = spec.model.query.options(*spec.options)
+
+    if params["q"] and spec.search:
+        pattern = _like(params["q"])
+        query = query.filter(db.or_(*(col.ilike(pattern, escape="\\") for col in spec.search)))
+    if spec.price_col is not None:
+        params["price_min"] = _float(args.get("price_min"))
+        params["price_max"] = _float(args.get("price_max"))
+        if params["price_min"] is not None:
+            query = query.filter(spec.price_col >= params["price_min"])
+        if params["price_max"] is not None:
+            query = query.filter(spec.price_col <= params["price_max"])
+    flags = [f for f in args.getlist("flag") if f in spec.flags]
+    for name in flags:
+        query = query.filter(spec.flags[name][1])
+    params["flag"] = flags
+
+    # счётчики по секциям до фильтра по самой секции — чтобы видеть «сколько в другой»
+    counts: dict = {}
+    if spec.section_col is not None:
+        counts = dict(query.with_entities(spec.section_col, db.func.count(spec.model.id))
+                      .order_by(None).group_by(spec.section_col).all())
+        section = args.get("section") or ""
+        params["section"] = section if section in counts or section in ("ski", "gym") else ""
+        if params["section"]:
+            query = query.filter(spec.section_col == params["section"])
+        total = counts.get(params["section"], 0) if params["section"] else sum(counts.values())
+    else:
+        total = query.with_entities(db.func.count(spec.model.id)).order_by(None).scalar()
+
+    sort = args.get("sort") if args.get("sort") in spec.sorts else spec.default_sort
+    desc = {"asc": False, "desc": True}.get(args.get("dir"), spec.default_desc if sort == spec.default_sort else False)
+    page = keyset_paginate(query, spec.sorts[sort], spec.model.id,
+                           cursor=args.get("cursor"), per_page=per_page, desc=desc)
+    return AdminList(items=page.items, page=page, total=total, counts=counts,
+                     params=params, sort=sort, desc=desc)
@@ -0,0 +1,186 @@
+# api/assets.py
+"""
+Статика с хэшем в имени: style.css → /assets/style.1a2b3c4d5e.css.
+
+Такие URL меняются при любом изменении файла, поэтому их можно кэшировать
+«навсегда» (Cache-Control: immutable, max-age=1 год) — повторный визит не
+делает ни одного запроса за статикой, а деплой сам сбрасывает кэш.
+
+`flask --app api.index assets-build` заранее считает хэши (static/manifest.json)
+и кладёт рядом сжатые копии .gz/.br. Без сборки всё считается лениво при
+первом обращении и сжатые версии держатся в памяти процесса.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+
+from flask import Response, abort, request, send_file
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+COMPRESSIBLE = {".css", ".js", ".svg", ".ico", ".json", ".txt", ".xml", ".html"}
+MAX_COMPRESS_SIZE = 2 * 1024 * 1024
+HASH_LEN = 10
+
+
+class AssetManifest:
+    def __init__(self, static_folder: str, manifest_name: str = "manifest.json"):
+        self.static_folder = static_folder
+        self.manifest_path = os.path.join(static_folder, manifest_name)
+        self._hashes: dict[str, str] = {}               # 'style.css' -> '1a2b3c4d5e'
+        self._compressed: dict[tuple[str, str, int], bytes] = {}   # (файл, кодировка, mtime_ns)
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.manifest_path, encoding="utf-8") as fh:
+                self._hashes = json.load(fh)
+        except (OSError, ValueError):
+            self._hashes = {}
+
+    def _path(self, filename: str) -> str | None:
+        path = os.path.normpath(os.path.join(self.static_folder, filename))
+        if not path.startswith(os.path.abspath(self.static_folder) + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def digest(self, filename: str) -> str | None:
+        with self._lock:
+            if filename in self._hashes:
+                return self._hashes[filename]
+        path = self._path(filename)
+        if path is None:
+            return None
+        h = hashlib.md5()
+        with open(path, "rb") as fh:
+            for chunk in iter(lambda: fh.read(65536), b""):
+                h.update(chunk)
+        digest = h.hexdigest()[:HASH_LEN]
+        with self._lock:
+            self._hashes[filename] = digest
+        return digest
+
+    def hashed_name(self, filename: str) -> str | None:
+        """'css/style.css' → 'css/style.<hash>.css'; None, если файла нет."""
+        digest = self.digest(filename)
+        if digest is None:
+            return None
+        stem, ext = os.path.splitext(filename)
+        return f"{stem}.{digest}{ext}"
+
+    @staticmethod
+    def split_hashed(hashed: str) -> tuple[str, str] | None:
+        """'css/style.<hash>.css' → ('css/style.css', '<hash>')."""
+        stem, ext = os.path.splitext(hashed)
+        base, _, digest = stem.rpartition(".")
+        if not base or len(digest) != HASH_LEN:
+            return None
+        return base + ext, digest
+
+    # ───────────── сжатие ─────────────
+    def compressed(self, filename: str, encoding: str) -> bytes | None:
+        """
+        Готовая .gz/.br-копия с диска или сжатие в памяти (один раз на версию файла).
+        Копия старше исходника (файл правили без assets-build) не отдаётся —
+        иначе под новым хэшем и immutable ушли бы старые байты.
+        """
+        path = self._path(filename)
+        if path is None or os.path.splitext(filename)[1].lower() not in COMPRESSIBLE:
+            return None
+        if encoding == "br" and brotli is None:
+            return None
+        suffix = ".br" if encoding == "br" else ".gz"
+        source_mtime = os.stat(path).st_mtime_ns
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                with open(path + suffix, "rb") as fh:
+                    return fh.read()
+        except FileNotFoundError:
+            pass
+
+        key = (filename, encoding, source_mtime)
+        with self._lock:
+            if key in self._compressed:
+                return self._compressed[key]
+        if os.path.getsize(path) > MAX_COMPRESS_SIZE:
+            return None
+        with open(path, "rb") as fh:
+            data = _compress(fh.read(), encoding)
+        with self._lock:
+            for stale in [k for k in self._compressed if k[:2] == key[:2]]:
+                del self._compressed[stale]           # прежняя версия файла
+            self._compressed[key] = data
+        return data
+
+    # ───────────── сборка ─────────────
+    def build(self, compress: bool = True) -> dict[str, str]:
+        """Считает хэши всех файлов static/ и пишет manifest.json (+ .gz/.br)."""
+        hashes = {}
+        for root, _dirs, files in os.walk(self.static_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                rel = os.path.relpath(path, self.static_folder).replace(os.sep, "/")
+                if rel == os.path.basename(self.manifest_path) or name.endswith((".gz", ".br")):
+                    continue
+                with self._lock:
+                    self._hashes.pop(rel, None)
+                hashes[rel] = self.digest(rel)
+                ext = os.path.splitext(name)[1].lower()
+                if compress and ext in COMPRESSIBLE:
+                    with open(path, "rb") as fh:
+                        data = fh.read()
+                    for encoding, suffix in (("gzip", ".gz"), ("br", ".br")):
+                        if encoding == "br" and brotli is None:
+                            continue
+                        with open(path + suffix, "wb") as fh:
+                            fh.write(_compress(data, encoding))
+        with open(self.manifest_path, "w", encoding="utf-8") as fh:
+            json.dump(hashes, fh, ensure_ascii=False, indent=0, sort_keys=True)
+        self._hashes = hashes
+        return hashes
+
+    # ───────────── отдача ─────────────
+    def serve(self, hashed: str) -> Response:
+        parts = self.split_hashed(hashed)
+        if parts is None:
+            abort(404)
+        filename, digest = parts
+        current = self.digest(filename)
+        if current is None:
+            abort(404)
+        # Старый хэш (HTML от прошлого деплоя) — отдаём текущий файл, но не навсегда
+        cache_control = IMMUTABLE if digest == current else "public, max-age=300"
+
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        accepted = request.accept_encodings
+        for encoding in ("br", "gzip"):
+            if not accepted[encoding]:
+                continue
+            data = self.compressed(filename, encoding)
+            if data is None:
+                continue
+            resp = Response(data, mimetype=mimetype)
+            resp.headers["Content-Encoding"] = encoding
+            resp.set_etag(f"{current}-{encoding}")
+            resp.make_conditional(request)
+            break
+        else:
+            resp = send_file(self._path(filename), mimetype=mimetype, conditional=True, etag=current)
+
+        resp.headers["Cache-Control"] = cache_control
+        resp.headers["Vary"] = "Accept-Encoding"
+        return resp
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11)  # type: ignore[union-attr]
+    return gzip.compress(data, compresslevel=9, mtime=0)
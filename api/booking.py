@@ -0,0 +1,249 @@
+# api/booking.py
+"""
+Расписание занятий и запись на них без овербукинга.
+
+  • ScheduleRule — повторяющееся занятие (услуга, тренер, день недели, время,
+    вместимость, сезон). generate_sessions() раскладывает правила в конкретные
+    ClassSession на горизонт вперёд — идемпотентно (уникальный rule_id + starts_at),
+    запускается по крону или flask schedule-generate;
+  • book() — одно условное UPDATE по строке занятия:
+        UPDATE class_sessions SET booked = booked + :n
+        WHERE id = :id AND NOT cancelled AND starts_at > :now AND booked + :n <= capacity
+    и INSERT брони в той же транзакции. В Postgres это блокировка одной строки:
+    параллельные записи на то же занятие ждут друг друга и перепроверяют условие
+    на свежей версии строки, записи на другие занятия не ждут вовсе. Мест меньше,
+    чем просят, — UPDATE не трогает строку (rowcount 0) → BookingError, ничего не
+    записано. CHECK booked <= capacity в схеме — последний рубеж.
+    SQLite сериализует запись на уровне файла; «database is locked» после
+    busy timeout повторяется с паузой;
+  • availability() — свободные места за период: capacity - booked из самой строки
+    занятия (счётчик ведёт book/cancel), диапазон по индексу (section, starts_at) —
+    сезон в несколько тысяч занятий читается без подсчёта броней и без JOIN.
+
+Время занятий — время клуба (SCHEDULE_TZ), naive, как его видит посетитель.
+"""
+import random
+import time
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import exc as sqlalchemy_exc
+
+from api.models import Booking, ClassSession, ScheduleRule, db
+
+MAX_SEATS = 5                # мест в одной брони
+LOCK_RETRIES = 8             # SQLite: повторов при «database is locked»
+LOCK_BACKOFF = 0.05          # с, удваивается с каждым повтором
+
+
+class BookingError(Exception):
+    def __init__(self, message: str, status: int = 409, free: int | None = None):
+        super().__init__(message)
+        self.status = status
+        self.free = free
+
+
+def club_now(tz: str) -> datetime:
+    """Текущее время клуба (naive) — с ним сравниваются ClassSession.starts_at."""
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        zone = timezone.utc
+    return datetime.now(zone).replace(tzinfo=None, microsecond=0)
+
+
+def _locked(error: sqlalchemy_exc.OperationalError) -> bool:
+    return "database is locked" in str(error.orig)
+
+
+# ───────────────────────── Генерация занятий ─────────────────────────
+def occurrences(rule: ScheduleRule, start: date, end: date):
+    """Начала занятий правила в днях [start, end] с учётом сезона."""
+    first = max(start, rule.valid_from or start)
+    last = min(end, rule.valid_until or end)
+    day = first + timedelta(days=(rule.weekday - first.weekday()) % 7)
+    while day <= last:
+        yield datetime.combine(day, rule.start_time)
+        day += timedelta(days=7)
+
+
+def generate_sessions(now: datetime, days: int) -> dict:
+    """
+    Создать недостающие занятия активных правил на days дней от now и
+    подтянуть к правилам будущие занятия (вместимость — не меньше уже занятых
+    мест, тренер). Будущие занятия без броней у выключенных правил отменяются.
+    """
+    # Service объявлена в api/index.py — берём таблицу из метаданных, без импорта по кругу
+    service = db.metadata.tables["service"]
+    end = now.date() + timedelta(days=days - 1)
+    rules = db.session.execute(
+        db.select(ScheduleRule, service.c.section)
+        .join(service, service.c.id == ScheduleRule.service_id)
+        .where(ScheduleRule.active.is_(True))).all()
+
+    existing = set()
+    if rules:
+        existing = set(db.session.execute(
+            db.select(ClassSession.rule_id, ClassSession.starts_at)
+            .where(ClassSession.rule_id.in_([rule.id for rule, _ in rules]),
+                   ClassSession.starts_at >= now)).all())
+
+    rows = []
+    for rule, section in rules:
+        for starts_at in occurrences(rule, now.date(), end):
+            if starts_at <= now or (rule.id, starts_at) in existing:
+                continue
+            rows.append({"rule_id": rule.id, "service_id": rule.service_id, "coach_id": rule.coach_id,
+                         "section": section, "starts_at": starts_at,
+                         "ends_at": starts_at + timedelta(minutes=rule.duration_min),
+                         "capacity": rule.capacity, "booked": 0, "cancelled": False})
+    if rows:
+        db.session.execute(db.insert(ClassSession), rows)
+
+    updated = 0
+    for rule, _ in rules:
+        updated += db.session.execute(
+            db.update(ClassSession)
+            .where(ClassSession.rule_id == rule.id, ClassSession.starts_at > now,
+                   ClassSession.cancelled.is_(False),
+                   (ClassSession.capacity != rule.capacity)
+                   | ClassSession.coach_id.is_distinct_from(rule.coach_id))
+            .values(capacity=db.case((ClassSession.booked > rule.capacity, ClassSession.booked),
+                                     else_=rule.capacity),
+                    coach_id=rule.coach_id)
+            .execution_options(synchronize_session=False)).rowcount
+
+    inactive = db.select(ScheduleRule.id).where(ScheduleRule.active.is_(False))
+    cancelled = db.session.execute(
+        db.update(ClassSession)
+        .where(ClassSession.rule_id.in_(inactive), ClassSession.starts_at > now,
+               ClassSession.booked == 0, ClassSession.cancelled.is_(False))
+        .values(cancelled=True)
+        .execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    return {"created": len(rows), "updated": updated, "cancelled": cancelled}
+
+
+# ───────────────────────── Запись ─────────────────────────
+def _refusal(session_id: int, seats: int, now: datetime) -> BookingError:
+    """Почему условный UPDATE не сработал (только для текста ошибки — решение уже принято)."""
+    row = db.session.execute(
+        db.select(ClassSession.starts_at, ClassSession.capacity, ClassSession.booked, ClassSession.cancelled)
+        .where(ClassSession.id == session_id)).first()
+    if row is None:
+        return BookingError("Занятие не найдено.", 404)
+    if row.cancelled:
+        return BookingError("Занятие отменено.", 410)
+    if row.starts_at <= now:
+        return BookingError("Запись на это занятие закрыта.", 409)
+    free = max(0, row.capacity - row.booked)
+    if free:
+        return BookingError(f"Свободных мест: {free}, а запрошено {seats}.", 409, free)
+    return BookingError("Свободных мест нет.", 409, 0)
+
+
+def _with_retries(fn):
+    """Повторить транзакцию, если SQLite не дождался блокировки файла."""
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return fn()
+        except sqlalchemy_exc.OperationalError as e:
+            db.session.rollback()
+            if not _locked(e) or attempt == LOCK_RETRIES - 1:
+                raise
+            time.sleep(LOCK_BACKOFF * (2 ** attempt) * (0.5 + random.random()))
+
+
+def book(session_id: int, seats: int, name: str | None, phone: str | None, now: datetime) -> Booking:
+    """Занять seats мест на занятии или BookingError. Бронь и счётчик — одной транзакцией."""
+    if not 1 <= seats <= MAX_SEATS:
+        raise BookingError(f"Можно занять от 1 до {MAX_SEATS} мест.", 400)
+
+    def attempt() -> Booking:
+        taken = db.session.execute(
+            db.update(ClassSession)
+            .where(ClassSession.id == session_id, ClassSession.cancelled.is_(False),
+                   ClassSession.starts_at > now,
+                   ClassSession.booked + seats <= ClassSession.capacity)
+            .values(booked=ClassSession.booked + seats)
+            .execution_options(synchronize_session=False)).rowcount
+        if taken != 1:
+            db.session.rollback()
+            raise _refusal(session_id, seats, now)
+        booking = Booking(session_id=session_id, name=name, phone=phone, seats=seats, status="confirmed")
+        db.session.add(booking)
+        db.session.commit()
+        return booking
+
+    return _with_retries(attempt)
+
+
+def cancel(booking_id: int) -> Booking:
+    """Отменить бронь и вернуть места. Повторная отмена — BookingError."""
+    def attempt() -> Booking:
+        booking = db.session.get(Booking, booking_id)
+        if booking is None:
+            raise BookingError("Бронь не найдена.", 404)
+        # статус — условием UPDATE: две параллельные отмены вернут места один раз
+        changed = db.session.execute(
+            db.update(Booking)
+            .where(Booking.id == booking_id, Booking.status == "confirmed")
+            .values(status="cancelled")
+            .execution_options(synchronize_session=False)).rowcount
+        if changed != 1:
+            db.session.rollback()
+            raise BookingError("Бронь уже отменена.", 409)
+        db.session.execute(
+            db.update(ClassSession)
+            .where(ClassSession.id == booking.session_id)
+            .values(booked=ClassSession.booked - booking.seats)
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        db.session.refresh(booking)
+        return booking
+
+    return _with_retries(attempt)
+
+
+def upcoming_seats(service_id: int, now: datetime) -> int:
+    """Мест в подтверждённых бронях на будущие неотменённые занятия услуги."""
+    return db.session.execute(
+        db.select(db.func.coalesce(db.func.sum(Booking.seats), 0))
+        .join(ClassSession, ClassSession.id == Booking.session_id)
+        .where(ClassSession.service_id == service_id, ClassSession.starts_at > now,
+               ClassSession.cancelled.is_(False), Booking.status == "confirmed")).scalar()
+
+
+# ───────────────────────── Свободные места ─────────────────────────
+@dataclass
+class Slot:
+    id: int
+    service_id: int
+    coach_id: int | None
+    starts_at: datetime
+    ends_at: datetime
+    capacity: int
+    free: int
+
+    def as_dict(self) -> dict:
+        return {"id": self.id, "service_id": self.service_id, "coach_id": self.coach_id,
+                "starts_at": self.starts_at.isoformat(), "ends_at": self.ends_at.isoformat(),
+                "capacity": self.capacity, "free": self.free}
+
+
+def availability(section: str, start: datetime, end: datetime,
+                 service_id: int | None = None, only_free: bool = False) -> list[Slot]:
+    """Неотменённые занятия секции с start до end по порядку. Одна выборка по индексу."""
+    query = (db.select(ClassSession.id, ClassSession.service_id, ClassSession.coach_id,
+                       ClassSession.starts_at, ClassSession.ends_at, ClassSession.capacity,
+                       (ClassSession.capacity - ClassSession.booked).label("free"))
+             .where(ClassSession.section == section,
+                    ClassSession.starts_at >= start, ClassSession.starts_at < end,
+                    ClassSession.cancelled.is_(False))
+             .order_by(ClassSession.starts_at, ClassSession.id))
+    if service_id is not None:
+        query = query.where(ClassSession.service_id == service_id)
+    if only_free:
+        query = query.where(ClassSession.booked < ClassSession.capacity)
+    return [Slot(*row) for row in db.session.execute(query)]
@@ -0,0 +1,392 @@
+# api/bulk.py
+"""
+Массовый импорт/экспорт записей (услуги, тренеры, курсы, новости, расписание) в CSV и JSON.
+
+Импорт читает загруженный файл построчно (werkzeug уже сложил большой upload
+во временный файл — весь файл в память не грузим), проверяет каждую строку
+и делает upsert пачками: на пачку — один SELECT существующих записей, один flush
+и один commit. Ошибочные строки не ломают пачку — они попадают в отчёт с номером
+строки (если строку отвергла сама БД, пачка повторяется построчно через SAVEPOINT).
+
+Экспорт — генератор: записи читаются пачками по id и сразу уходят клиенту.
+
+Форматы:
+  • CSV — первая строка с заголовками (колонки как в экспорте), UTF-8 (BOM допускается);
+  • JSON — массив объектов или JSON Lines (по объекту в строке).
+В экспорте CSV ячейка, начинающаяся с = + - @ (или табуляции/CR), получает
+префикс «'» — иначе Excel выполнит её как формулу (имена и телефоны заявок — это
+ввод с сайта); импорт CSV этот префикс снимает.
+Колонка id необязательна: если есть — обновляем запись с этим id, иначе ищем
+по естественному ключу (например, секция + название услуги), иначе создаём новую.
+"""
+import csv
+import io
+import json
+from dataclasses import dataclass, field
+from datetime import date, datetime, time
+from typing import Callable, Iterator
+
+from api.models import db
+
+BATCH_SIZE = 200
+FORMULA_CHARS = ("=", "+", "-", "@", "\t", "\r")
+MAX_REPORTED_ERRORS = 500
+SECTIONS = ("ski", "gym")
+
+
+class RowError(ValueError):
+    pass
+
+
+# ───────────────────────── Описание моделей ─────────────────────────
+@dataclass
+class BulkSpec:
+    model: type
+    fields: tuple[str, ...]                       # колонки импорта/экспорта (кроме id)
+    required: tuple[str, ...] = ()
+    natural_key: tuple[str, ...] = ()             # по чему искать запись без id
+    converters: dict[str, Callable] = field(default_factory=dict)
+    prepare: Callable | None = None               # (объект) -> None перед записью: производные поля
+    after_import: Callable | None = None          # (список словарей записей пачки) -> None
+
+    def column(self, name: str):
+        return self.model.__table__.columns[name]
+
+
+def to_price(value: str) -> float:
+    try:
+        price = float(str(value).replace(",", ".").replace(" ", ""))
+    except ValueError:
+        raise RowError(f"цена «{value}» — не число") from None
+    if price < 0:
+        raise RowError("цена не может быть отрицательной")
+    return price
+
+
+def to_section(value: str) -> str:
+    value = str(value).strip().lower()
+    if value not in SECTIONS:
+        raise RowError(f"секция должна быть одной из: {', '.join(SECTIONS)}")
+    return value
+
+
+def to_datetime(value) -> datetime:
+    try:
+        return datetime.fromisoformat(str(value).strip().replace("Z", "+00:00")).replace(tzinfo=None)
+    except ValueError:
+        raise RowError(f"дата «{value}» не в формате ISO (2024-01-31 или 2024-01-31T10:00)") from None
+
+
+def to_int(value) -> int:
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RowError(f"«{value}» — не целое число") from None
+
+
+def int_in(low: int, high: int | None = None) -> Callable:
+    """Конвертер целого в диапазоне [low, high] (high=None — без верхней границы)."""
+    def convert(value) -> int:
+        number = to_int(value)
+        if number < low or (high is not None and number > high):
+            raise RowError(f"{number} вне диапазона {low}…{high if high is not None else '∞'}")
+        return number
+    return convert
+
+
+def to_date(value) -> date:
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        raise RowError(f"дата «{value}» не в формате 2024-01-31") from None
+
+
+def to_time(value) -> time:
+    try:
+        return time.fromisoformat(str(value).strip())
+    except ValueError:
+        raise RowError(f"время «{value}» не в формате 18:30") from None
+
+
+def to_bool(value) -> bool:
+    text = str(value).strip().lower()
+    if text in ("1", "true", "да", "yes"):
+        return True
+    if text in ("0", "false", "нет", "no"):
+        return False
+    raise RowError(f"«{value}» — ожидалось 1/0 или да/нет")
+
+
+# ───────────────────────── Чтение файла ─────────────────────────
+def csv_cell(value):
+    """Экранировать формулу для Excel: «=1+1» → «'=1+1». Обратимо через csv_uncell."""
+    if isinstance(value, str) and value.lstrip("'").startswith(FORMULA_CHARS) \
+            and value.startswith(FORMULA_CHARS + ("'",)):
+        return "'" + value
+    return value
+
+
+def csv_uncell(value):
+    if isinstance(value, str) and value.startswith("'") and value.lstrip("'").startswith(FORMULA_CHARS):
+        return value[1:]
+    return value
+
+
+def iter_csv(stream) -> Iterator[tuple[int, dict]]:
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    reader = csv.DictReader(text)
+    for row in reader:
+        yield reader.line_num, {k: csv_uncell(v) for k, v in row.items()}
+
+
+def iter_json(stream, chunk_size: int = 64 * 1024) -> Iterator[tuple[int, dict]]:
+    """
+    Потоковый разбор JSON-массива или JSON Lines без загрузки файла целиком:
+    объекты по одному вынимаются из буфера через raw_decode.
+    """
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig")
+    buf, eof, n = "", False, 0
+    in_array = None
+    while True:
+        buf = buf.lstrip(" \t\r\n,")
+        if in_array is None and buf:
+            in_array = buf.startswith("[")
+            if in_array:
+                buf = buf[1:]
+                continue
+        if in_array and buf.startswith("]"):
+            return
+        if buf:
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise RowError(f"некорректный JSON после записи №{n}") from None
+            else:
+                n += 1
+                buf = buf[end:]
+                yield n, obj
+                continue
+        elif eof:
+            return
+        chunk = text.read(chunk_size)
+        eof = not chunk
+        buf += chunk
+
+
+# ───────────────────────── Импорт ─────────────────────────
+@dataclass
+class ImportReport:
+    kind: str
+    dry_run: bool = False
+    created: int = 0
+    updated: int = 0
+    failed: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+
+    def error(self, line: int, message: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def as_dict(self) -> dict:
+        return {"kind": self.kind, "dry_run": self.dry_run, "created": self.created,
+                "updated": self.updated, "failed": self.failed,
+                "errors": [{"line": line, "error": msg} for line, msg in self.errors]}
+
+
+def clean_row(spec: BulkSpec, raw) -> dict:
+    """Строка файла → словарь значений колонок модели (или RowError)."""
+    if not isinstance(raw, dict):
+        raise RowError("ожидался объект с полями")
+    values = {}
+    for name in spec.fields:
+        if name not in raw:
+            continue
+        value = raw[name]
+        if isinstance(value, str):
+            value = value.strip()
+        if value in ("", None):
+            if name in spec.required:
+                raise RowError(f"поле «{name}» обязательно")
+            values[name] = None
+            continue
+        if name in spec.converters:
+            value = spec.converters[name](value)
+        elif isinstance(value, (int, float)):
+            value = str(value)
+        length = getattr(spec.column(name).type, "length", None)
+        if length and isinstance(value, str) and len(value) > length:
+            raise RowError(f"поле «{name}» длиннее {length} символов")
+        values[name] = value
+
+    row_id = raw.get("id")
+    if row_id not in ("", None):
+        try:
+            values["id"] = int(row_id)
+        except (TypeError, ValueError):
+            raise RowError(f"id «{row_id}» — не целое число") from None
+    return values
+
+
+def _existing(spec: BulkSpec, rows: list[dict]) -> tuple[dict, dict]:
+    """Один-два запроса на пачку: записи по id и по естественному ключу."""
+    model = spec.model
+    ids = {r["id"] for r in rows if "id" in r}
+    by_id = {obj.id: obj for obj in model.query.filter(model.id.in_(ids))} if ids else {}
+    by_key = {}
+    if spec.natural_key:
+        first = spec.natural_key[0]
+        probes = {r[first] for r in rows if "id" not in r and r.get(first) is not None}
+        if probes:
+            for obj in model.query.filter(getattr(model, first).in_(probes)):
+                by_key.setdefault(tuple(getattr(obj, k) for k in spec.natural_key), obj)
+    return by_id, by_key
+
+
+def _apply(spec: BulkSpec, values: dict, by_id: dict, by_key: dict):
+    """Найти/создать объект и записать в него значения. Возвращает (obj, created)."""
+    if "id" in values:
+        obj = by_id.get(values["id"])
+        if obj is None:
+            raise RowError(f"запись с id={values['id']} не найдена")
+    else:
+        key = tuple(values.get(k) for k in spec.natural_key) if spec.natural_key else None
+        obj = by_key.get(key) if key and None not in key else None
+    created = obj is None
+    if created:
+        missing = [name for name in spec.required if values.get(name) is None]
+        if missing:
+            raise RowError("не заполнены обязательные поля: " + ", ".join(missing))
+        obj = spec.model()
+        db.session.add(obj)
+    for name, value in values.items():
+        if name != "id":
+            setattr(obj, name, value)
+    if spec.prepare:
+        spec.prepare(obj)
+    return obj, created
+
+
+def _write_batch(spec: BulkSpec, batch: list[tuple[int, dict]], per_row: bool):
+    """
+    Применить пачку в текущей транзакции. Возвращает (ошибки, снимки записей, сколько создано).
+    per_row=False — все INSERT/UPDATE одним flush; per_row=True — SAVEPOINT на строку,
+    чтобы найти строку, нарушающую ограничения БД, и не потерять остальные.
+    """
+    by_id, by_key = _existing(spec, [values for _, values in batch])
+    errors, applied = [], []
+    for line, values in batch:
+        try:
+            if per_row:
+                with db.session.begin_nested():
+                    obj, created = _apply(spec, values, by_id, by_key)
+                    db.session.flush()
+            else:
+                obj, created = _apply(spec, values, by_id, by_key)
+        except RowError as e:
+            errors.append((line, str(e)))
+            continue
+        except Exception as e:  # noqa: BLE001 — только в построчном режиме: ограничения БД и т.п.
+            if not per_row:
+                raise
+            errors.append((line, f"ошибка БД: {e.__class__.__name__}"))
+            continue
+        if created and spec.natural_key:
+            by_key[tuple(getattr(obj, k) for k in spec.natural_key)] = obj
+        applied.append((obj, created))
+    db.session.flush()
+    # снимок до commit: после него атрибуты истекут и каждый стоил бы SELECT
+    touched = [{name: getattr(obj, name) for name in ("id",) + spec.fields} for obj, _ in applied]
+    return errors, touched, sum(created for _, created in applied)
+
+
+def _flush_batch(spec: BulkSpec, batch: list[tuple[int, dict]], report: ImportReport) -> None:
+    try:
+        try:
+            errors, touched, created_n = _write_batch(spec, batch, per_row=False)
+        except Exception:  # noqa: BLE001 — какая-то строка не прошла в БД: повторяем построчно
+            db.session.rollback()
+            errors, touched, created_n = _write_batch(spec, batch, per_row=True)
+        if report.dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for line, message in errors:
+        report.error(line, message)
+    report.created += created_n
+    report.updated += len(touched) - created_n
+    if touched and not report.dry_run and spec.after_import:
+        spec.after_import(touched)
+    db.session.expunge_all()                     # не копим объекты в identity map
+
+
+def import_rows(spec: BulkSpec, kind: str, rows: Iterator[tuple[int, dict]],
+                dry_run: bool = False, batch_size: int = BATCH_SIZE) -> ImportReport:
+    report = ImportReport(kind=kind, dry_run=dry_run)
+    batch: list[tuple[int, dict]] = []
+    try:
+        for line, raw in rows:
+            try:
+                batch.append((line, clean_row(spec, raw)))
+            except RowError as e:
+                report.error(line, str(e))
+            if len(batch) >= batch_size:
+                _flush_batch(spec, batch, report)
+                batch = []
+    except (RowError, UnicodeDecodeError, csv.Error) as e:
+        report.error(0, f"файл не разобран: {e}")
+    if batch:
+        _flush_batch(spec, batch, report)
+    return report
+
+
+# ───────────────────────── Экспорт ─────────────────────────
+def iter_records(spec: BulkSpec, batch_size: int = 500) -> Iterator[dict]:
+    """Все записи по возрастанию id, пачками (keyset по id, без OFFSET)."""
+    model, last_id = spec.model, 0
+    columns = [model.id] + [getattr(model, name) for name in spec.fields]
+    while True:
+        rows = (db.session.query(*columns).filter(model.id > last_id)
+                .order_by(model.id).limit(batch_size).all())
+        if not rows:
+            return
+        for row in rows:
+            yield dict(row._mapping)
+        last_id = rows[-1].id
+
+
+def _plain_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def export_csv(spec: BulkSpec) -> Iterator[str]:
+    buf = io.StringIO()
+    buf.write("\ufeff")                              # BOM: Excel откроет кириллицу правильно
+    writer = csv.writer(buf)
+    header = ("id",) + spec.fields
+    writer.writerow(header)
+    for n, record in enumerate(iter_records(spec), 1):
+        writer.writerow(["" if record[k] is None else csv_cell(_plain_value(record[k])) for k in header])
+        if n % 100 == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def export_json(spec: BulkSpec) -> Iterator[str]:
+    yield "["
+    sep = "\n"
+    for record in iter_records(spec):
+        yield sep + json.dumps({k: _plain_value(v) for k, v in record.items()}, ensure_ascii=False)
+        sep = ",\n"
+    yield "\n]\n"
@@ -0,0 +1,262 @@
+# api/cache.py
+"""
+Кэш отрендеренных публичных страниц в памяти процесса.
+
+Ключ — endpoint + аргументы маршрута + только те query-параметры, которые view
+читает (args=("page",) для /courses): /?x=1, /?x=2… — одна запись, а не новая на
+каждую строку запроса, и один клиент не вытеснит из LRU настоящие страницы.
+Записи живут PAGE_CACHE_TTL секунд, после чего ещё PAGE_CACHE_STALE секунд
+отдаются «как есть», пока в фоне рендерится свежая версия (stale-while-revalidate).
+Админка сбрасывает кэш через invalidate(<тип контента>).
+
+ContentVersions — счётчики версий контента в БД (таблица content_versions).
+По ним строятся ETag/Last-Modified, и условный GET отвечает 304 ещё до
+запросов страницы и render_template.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator
+from datetime import datetime
+from functools import wraps
+
+from flask import Response, current_app, make_response, request, stream_with_context
+
+from api.models import db, ContentVersion
+
+
+class PageCache:
+    def __init__(self, max_entries: int = 256, ttl: float = 60, stale_ttl: float = 600,
+                 enabled: bool = True, versions: "ContentVersions | None" = None):
+        self.max_entries = max_entries
+        # версии из БД в ключе: правки, сделанные на другом инстансе, тоже сбрасывают кэш
+        self.versions = versions
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.enabled = enabled
+        self._data: OrderedDict = OrderedDict()   # key -> (html, created_at)
+        self._deps: dict[str, set[str]] = {}      # endpoint -> {kind, ...}
+        self._refreshing: set = set()
+        self._generation = 0                      # растёт при каждой инвалидации
+        self._lock = threading.Lock()
+
+    # ───────────── хранилище ─────────────
+    def get(self, key) -> tuple[str, bool] | None:
+        """Возвращает (html, устарело?) или None, если записи нет/она протухла совсем."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            html, created = item
+            age = time.monotonic() - created
+            if age > self.ttl + self.stale_ttl:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return html, age > self.ttl
+
+    def set(self, key, html: str, generation: int | None = None) -> None:
+        with self._lock:
+            # рендер начался до инвалидации — его результат уже неактуален
+            if generation is not None and generation != self._generation:
+                return
+            self._data[key] = (html, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *kinds: str) -> None:
+        """Удаляет страницы, зависящие от любого из переданных типов контента."""
+        kinds_set = set(kinds)
+        with self._lock:
+            self._generation += 1
+            for key in [k for k in self._data if self._deps.get(k[0], set()) & kinds_set]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    # ───────────── декоратор для маршрутов ─────────────
+    def cached(self, *kinds: str, mimetype: str | None = None, args: tuple[str, ...] = ()):
+        """
+        @page_cache.cached("news") — кэширует HTML, который возвращает view.
+        kinds — типы контента, при изменении которых страницу нужно сбросить.
+        mimetype — если view отдаёт не HTML (например, JSON строкой).
+        args — query-параметры, от которых зависит ответ; остальные в ключ не входят.
+        View может вернуть и генератор строк (большой sitemap): промах отдаётся
+        клиенту потоком, а в кэш попадает склеенный текст после последнего куска.
+        """
+        extra = {"Content-Type": mimetype} if mimetype else {}
+        arg_names = tuple(args)   # wrapper(*args) ниже перекрывает имя
+        def decorator(fn):
+            self._deps[fn.__name__] = set(kinds)
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or request.method != "GET":
+                    result = fn(*args, **kwargs)
+                    if isinstance(result, Iterator):
+                        return Response(stream_with_context(result), 200, extra)
+                    return result
+
+                key = (fn.__name__,
+                       tuple(sorted(kwargs.items())),
+                       tuple((name, tuple(request.args.getlist(name))) for name in arg_names),
+                       tuple(sorted(self.versions.get(kinds).items())) if self.versions else ())
+                hit = self.get(key)
+                if hit is not None:
+                    html, stale = hit
+                    if stale:
+                        self._refresh_in_background(key, fn, args, kwargs)
+                    return html, 200, {"X-Cache": "STALE" if stale else "HIT", **extra}
+
+                generation = self.generation
+                result = fn(*args, **kwargs)
+                if isinstance(result, str):
+                    self.set(key, result, generation)
+                    return result, 200, {"X-Cache": "MISS", **extra}
+                if isinstance(result, Iterator):
+                    body = stream_with_context(self._tee(key, result, generation))
+                    return Response(body, 200, {"X-Cache": "MISS", **extra})
+                return result
+            return wrapper
+        return decorator
+
+    def _tee(self, key, chunks: Iterator[str], generation: int) -> Iterator[str]:
+        """Отдаёт куски дальше и кладёт целый ответ в кэш, если генератор дошёл до конца."""
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield chunk
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        self.set(key, "".join(parts), generation)
+
+    def _refresh_in_background(self, key, fn, args, kwargs) -> None:
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        app = current_app._get_current_object()
+        path = request.full_path
+        generation = self.generation
+
+        def refresh():
+            try:
+                with app.test_request_context(path):
+                    result = fn(*args, **kwargs)
+                    if isinstance(result, Iterator):
+                        result = "".join(result)
+                if isinstance(result, str):
+                    self.set(key, result, generation)
+            except Exception as e:  # noqa: BLE001
+                print(f"[CACHE] фоновое обновление {key[0]} не удалось: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name="page-cache-refresh", daemon=True).start()
+
+
+class ContentVersions:
+    """
+    Версии контента: admin-запись делает bump(kind), публичные страницы
+    читают get(kinds). Значения из БД держим в памяти ttl секунд, чтобы
+    проверка If-None-Match обычно обходилась без обращения к Postgres.
+    """
+
+    def __init__(self, ttl: float = 5, build_id: str = "",
+                 cache_control: str = "public, max-age=0"):
+        self.ttl = ttl
+        self.build_id = build_id        # меняется при деплое → шаблоны могли поменяться
+        self.cache_control = cache_control
+        self.started_at = datetime.utcnow().replace(microsecond=0)
+        self._memo: dict[str, tuple[int, datetime | None]] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, kinds) -> dict[str, tuple[int, datetime | None]]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._fetched_at < self.ttl:
+                return {k: self._memo.get(k, (0, None)) for k in kinds}
+        try:
+            rows = db.session.query(ContentVersion).all()
+        except Exception as e:  # noqa: BLE001
+            print(f"[CACHE] не удалось прочитать версии контента: {e}")
+            db.session.rollback()
+            rows = []
+        with self._lock:
+            self._memo = {r.kind: (r.version, r.updated_at) for r in rows}
+            self._fetched_at = now
+            return {k: self._memo.get(k, (0, None)) for k in kinds}
+
+    def bump(self, *kinds: str) -> None:
+        """Атомарно увеличивает версии (UPDATE ... SET version = version + 1)."""
+        now = datetime.utcnow()
+        try:
+            for kind in kinds:
+                updated = (db.session.query(ContentVersion)
+                           .filter_by(kind=kind)
+                           .update({ContentVersion.version: ContentVersion.version + 1,
+                                    ContentVersion.updated_at: now}))
+                if not updated:
+                    db.session.add(ContentVersion(kind=kind, version=1, updated_at=now))
+            db.session.commit()
+        except Exception as e:  # noqa: BLE001
+            db.session.rollback()
+            print(f"[CACHE] не удалось обновить версии {kinds}: {e}")
+        with self._lock:
+            self._fetched_at = 0.0   # перечитать при следующем запросе
+
+    def validators(self, endpoint: str, kinds, extra: str = "") -> tuple[str, datetime | None]:
+        """(etag, last_modified) для страницы, зависящей от kinds."""
+        versions = self.get(kinds)
+        raw = "|".join([self.build_id, endpoint, extra] + [f"{k}:{versions[k][0]}" for k in sorted(kinds)])
+        etag = hashlib.sha1(raw.encode()).hexdigest()[:20]
+        # новый инстанс/деплой мог принести другие шаблоны — не раньше старта процесса
+        dates = [d for _, d in versions.values() if d] + [self.started_at]
+        return etag, max(dates)
+
+    def conditional(self, *kinds: str, vary_args: bool = False):
+        """
+        @content_versions.conditional("news") — отвечает 304, если у клиента
+        актуальная версия страницы, иначе ставит ETag/Last-Modified/Cache-Control.
+        vary_args — ETag зависит и от query-строки (разные ?fields= — разные ответы).
+        """
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return fn(*args, **kwargs)
+
+                extra = request.query_string.decode("latin-1") if vary_args else ""
+                etag, last_modified = self.validators(fn.__name__, kinds, extra)
+                if request.if_none_match:
+                    not_modified = request.if_none_match.contains_weak(etag)
+                else:
+                    ims = request.if_modified_since
+                    not_modified = bool(ims and last_modified.replace(microsecond=0) <= ims.replace(tzinfo=None))
+                if not_modified:
+                    resp = Response(status=304)
+                else:
+                    resp = make_response(fn(*args, **kwargs))
+                    if resp.status_code != 200:
+                        return resp
+
+                resp.set_etag(etag, weak=True)
+                resp.last_modified = last_modified
+                resp.headers["Cache-Control"] = self.cache_control
+                return resp
+            return wrapper
+        return decorator
@@ -0,0 +1,142 @@
+# api/compression.py
+"""
+Сжатие ответов приложения (HTML, JSON, XML, CSV) — br или gzip по Accept-Encoding.
+
+Статика со своим сжатием (api/assets.py) и файлы send_file не трогаются:
+у них уже есть Content-Encoding или direct_passthrough.
+
+  • обычный ответ меньше min_size байт отдаётся как есть — на коротких
+    ответах заголовки gzip съедают выигрыш;
+  • у ответа с ETag (публичные страницы, api/cache.py) сжатое тело кэшируется
+    по (путь, ETag, кодировка): HIT из кэша страниц не сжимается заново;
+  • потоковый ответ (stream_template, sitemap, экспорт CSV) сжимается на лету,
+    каждый кусок с flush — браузер начинает разбирать <head>, пока тело ещё
+    рендерится.
+
+Уровни: gzip 1–9 (по умолчанию 6), brotli quality 0–11 (по умолчанию 5:
+на лету 11 слишком медленный — для статики он считается заранее).
+"""
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Iterable, Iterator
+
+from flask import request
+
+try:
+    import brotli  # type: ignore
+except ImportError:  # pragma: no cover
+    brotli = None
+
+COMPRESSIBLE = {
+    "text/html", "text/plain", "text/css", "text/csv", "text/xml",
+    "application/json", "application/xml", "application/rss+xml",
+    "application/javascript", "image/svg+xml",
+}
+
+
+class Compressor:
+    def __init__(self, min_size: int = 1024, gzip_level: int = 6, br_quality: int = 5,
+                 enabled: bool = True, cache_entries: int = 256):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.br_quality = br_quality
+        self.enabled = enabled
+        self.cache_entries = cache_entries
+        self._cache: OrderedDict = OrderedDict()   # (путь, etag, кодировка) -> bytes
+        self._lock = threading.Lock()
+        self.stats = {"compressed": 0, "streamed": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def init_app(self, app) -> None:
+        app.after_request(self._compress_response)
+
+    # ───────────── выбор кодировки ─────────────
+    def _encoding(self) -> str | None:
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+    def _compressible(self, resp) -> bool:
+        return (resp.status_code == 200
+                and not resp.direct_passthrough
+                and "Content-Encoding" not in resp.headers
+                and resp.mimetype in COMPRESSIBLE
+                and "no-transform" not in resp.headers.get("Cache-Control", ""))
+
+    # ───────────── сжатие ─────────────
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(data, quality=self.br_quality)  # type: ignore[union-attr]
+        stream = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)   # 31 — заголовок gzip
+        return stream.compress(data) + stream.flush()
+
+    def compress_stream(self, chunks: Iterable, encoding: str) -> Iterator[bytes]:
+        if encoding == "br":
+            stream = brotli.Compressor(quality=self.br_quality)  # type: ignore[union-attr]
+            step, finish = (lambda data: stream.process(data) + stream.flush()), stream.finish
+        else:
+            stream = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            step = lambda data: stream.compress(data) + stream.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+            finish = stream.flush
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode("utf-8")
+                if chunk:
+                    yield step(chunk)
+            yield finish()
+        finally:
+            # клиент ушёл посреди ответа: закрываем и исходный генератор (контекст запроса)
+            if hasattr(chunks, "close"):
+                chunks.close()
+
+    def _cached(self, key, data: bytes, encoding: str) -> bytes:
+        if key is None:
+            return self.compress(data, encoding)
+        with self._lock:
+            body = self._cache.get(key)
+            if body is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return body
+        body = self.compress(data, encoding)
+        with self._lock:
+            self._cache[key] = body
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return body
+
+    def _compress_response(self, resp):
+        if not self.enabled or not self._compressible(resp):
+            return resp
+        resp.vary.add("Accept-Encoding")
+        encoding = self._encoding()
+        if encoding is None:
+            return resp
+
+        if resp.is_streamed:
+            resp.response = self.compress_stream(resp.response, encoding)
+            resp.headers.pop("Content-Length", None)
+            resp.headers["Content-Encoding"] = encoding
+            self.stats["streamed"] += 1
+            return resp
+
+        data = resp.get_data()
+        if len(data) < self.min_size:
+            return resp
+        etag = resp.headers.get("ETag")
+        key = (request.full_path, etag, encoding) if etag else None
+        body = self._cached(key, data, encoding)
+        resp.set_data(body)
+        resp.headers["Content-Encoding"] = encoding
+        self.stats["compressed"] += 1
+        self.stats["bytes_in"] += len(data)
+        self.stats["bytes_out"] += len(body)
+        return resp
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "cached": len(self._cache)}
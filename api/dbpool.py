@@ -0,0 +1,157 @@
+# api/dbpool.py
+"""
+Пул соединений с Postgres с учётом serverless.
+
+Каждый инстанс Vercel держит свой пул, поэтому при всплеске трафика
+N инстансов × (pool_size + max_overflow) легко упираются в max_connections.
+Режимы (DB_POOL_MODE):
+
+  • null  — NullPool: соединение открывается на запрос и сразу закрывается.
+            Рассчитан на внешний пулер (pgbouncer в transaction mode, Supabase/Neon
+            pooler): держит соединения с Postgres он, а инстансы — ничего.
+            По умолчанию на serverless.
+  • queue — QueuePool с ограниченным размером, LIFO (лишние соединения простаивают
+            и закрываются по recycle) и коротким pool_timeout: при исчерпании пула
+            запрос быстро получает 503, а не висит, пока Postgres не откажет всем.
+
+pgbouncer в transaction mode не переносит server-side prepared statements
+(следующая транзакция может попасть на другое серверное соединение), а psycopg 3
+готовит запрос после prepare_threshold выполнений — для пулера это отключается
+(prepare_threshold=None). Включается DB_PGBOUNCER=1 или ?pgbouncer=true в URL.
+
+pool_pre_ping по умолчанию выключен: это лишний SELECT 1 на каждый checkout.
+Устаревшие соединения закрывает pool_recycle (меньше idle-таймаута сервера/пулера).
+
+PoolMetrics слушает события пула и отдаёт счётчики в /admin/metrics.
+"""
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool, Pool
+
+POOL_MODES = ("null", "queue")
+
+_local = threading.local()
+
+
+def normalize_url(url: str) -> tuple[str, bool]:
+    """
+    postgres:// → postgresql+psycopg:// (драйвер из requirements — psycopg 3).
+    Возвращает (url, pgbouncer?) — параметр ?pgbouncer=true вырезается из URL,
+    libpq его не знает.
+    """
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    if url.startswith("postgresql://"):
+        url = "postgresql+psycopg://" + url[len("postgresql://"):]
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    pgbouncer = any(k == "pgbouncer" and v.lower() in ("1", "true") for k, v in query)
+    if any(k == "pgbouncer" for k, _ in query):
+        url = urlunsplit(parts._replace(query=urlencode([(k, v) for k, v in query if k != "pgbouncer"])))
+    return url, pgbouncer
+
+
+def engine_options(url: str, mode: str, *, pgbouncer: bool = False, pool_size: int = 5,
+                   max_overflow: int = 5, pool_timeout: float = 5, pool_recycle: int = 300,
+                   pre_ping: bool = False, connect_timeout: int = 5,
+                   application_name: str = "sportclub") -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS для выбранного режима."""
+    if mode not in POOL_MODES:
+        raise ValueError(f"DB_POOL_MODE должен быть одним из {POOL_MODES}, получено {mode!r}")
+    if url.startswith("sqlite"):
+        return {}   # локальная SQLite: настройки пула по умолчанию
+    options: dict = {"pool_pre_ping": pre_ping}
+    connect_args: dict = {"connect_timeout": connect_timeout, "application_name": application_name}
+    if pgbouncer:
+        connect_args["prepare_threshold"] = None
+    if mode == "null":
+        options["poolclass"] = NullPool
+    else:
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                       pool_recycle=pool_recycle, pool_use_lifo=True)
+    options["connect_args"] = connect_args
+    return options
+
+
+class PoolMetrics:
+    """Счётчики пула по всем движкам процесса (события класса Pool)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.opened = 0            # новых DBAPI-соединений (TCP + TLS + auth)
+        self.closed = 0
+        self.invalidated = 0
+        self.checkouts = 0
+        self.checked_out = 0
+        self.checked_out_max = 0
+        self.connect_ms_total = 0.0
+        self.timeouts = 0          # QueuePool не дождался соединения за pool_timeout
+
+    def install(self) -> None:
+        # слушаем классы: engine во Flask-SQLAlchemy создаётся лениво
+        event.listen(Engine, "do_connect", self._on_do_connect)
+        event.listen(Pool, "connect", self._on_connect)
+        event.listen(Pool, "checkout", self._on_checkout)
+        event.listen(Pool, "checkin", self._on_checkin)
+        event.listen(Pool, "close", self._on_close)
+        event.listen(Pool, "invalidate", self._on_invalidate)
+
+    @staticmethod
+    def _on_do_connect(dialect, conn_rec, cargs, cparams) -> None:
+        _local.started = time.perf_counter()   # connect-событие придёт в этом же потоке
+
+    def _on_connect(self, dbapi_conn, record) -> None:
+        started = getattr(_local, "started", None)
+        with self._lock:
+            self.opened += 1
+            if started is not None:
+                self.connect_ms_total += (time.perf_counter() - started) * 1000
+        _local.started = None
+
+    def _on_checkout(self, dbapi_conn, record, proxy) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.checked_out_max = max(self.checked_out_max, self.checked_out)
+
+    def _on_checkin(self, dbapi_conn, record) -> None:
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def _on_close(self, dbapi_conn, record) -> None:
+        with self._lock:
+            self.closed += 1
+
+    def _on_invalidate(self, dbapi_conn, record, exception) -> None:
+        with self._lock:
+            self.invalidated += 1
+
+    def timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self, engine=None) -> dict:
+        with self._lock:
+            data = {
+                "connections_opened": self.opened,
+                "connections_closed": self.closed,
+                "connections_open": self.opened - self.closed,
+                "invalidated": self.invalidated,
+                "checkouts": self.checkouts,
+                "checked_out": self.checked_out,
+                "checked_out_max": self.checked_out_max,
+                "connect_avg_ms": round(self.connect_ms_total / self.opened, 2) if self.opened else 0.0,
+                "checkout_timeouts": self.timeouts,
+            }
+        if engine is not None:
+            pool = engine.pool
+            data["pool_class"] = type(pool).__name__
+            if hasattr(pool, "size") and not isinstance(pool, NullPool):
+                data.update(pool_size=pool.size(), pool_overflow=pool.overflow(),
+                            pool_idle=pool.checkedin(), pool_status=pool.status())
+        return data
+
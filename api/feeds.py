@@ -0,0 +1,57 @@
+# api/feeds.py
+"""
+/sitemap.xml и /news/feed.xml (RSS 2.0) — генераторы XML по кускам.
+
+Документ собирается построчно: sitemap по всему архиву новостей не держит в
+памяти ни список ORM-объектов, ни промежуточное дерево — строки идут из
+курсора (yield_per) прямо в ответ, а page_cache складывает итоговый текст
+(api/cache.py, генератор из view). Пересборка — только после смены версии
+контента news/course; между правками краулер получает 304 по ETag.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+FEED_ITEMS = 30
+
+
+def _w3c(value: datetime | None) -> str | None:
+    """Дата для <lastmod>: в БД naive UTC (datetime.utcnow)."""
+    return value.replace(microsecond=0).isoformat() + "+00:00" if value else None
+
+
+def _rfc822(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc))
+
+
+def sitemap(urls: Iterable[tuple[str, datetime | None]]) -> Iterator[str]:
+    """urls — (абсолютный адрес, дата изменения или None)."""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for loc, modified in urls:
+        lastmod = _w3c(modified)
+        yield (f"<url><loc>{escape(loc)}</loc>"
+               + (f"<lastmod>{lastmod}</lastmod>" if lastmod else "")
+               + "</url>\n")
+    yield "</urlset>\n"
+
+
+def rss(title: str, link: str, self_url: str, description: str,
+        items: Iterable[tuple[str, str, datetime, str | None]]) -> Iterator[str]:
+    """items — (заголовок, абсолютный адрес, дата публикации, анонс), новые первыми."""
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>\n'
+    yield (f"<title>{escape(title)}</title><link>{escape(link)}</link>"
+           f"<description>{escape(description)}</description><language>ru</language>"
+           f'<atom:link href="{escape(self_url)}" rel="self" type="application/rss+xml"/>\n')
+    first = True
+    for item_title, url, published, summary in items:
+        if first:
+            yield f"<lastBuildDate>{_rfc822(published)}</lastBuildDate>\n"
+            first = False
+        yield (f"<item><title>{escape(item_title)}</title><link>{escape(url)}</link>"
+               f'<guid isPermaLink="true">{escape(url)}</guid>'
+               f"<pubDate>{_rfc822(published)}</pubDate>"
+               f"<description>{escape(summary or '')}</description></item>\n")
+    yield "</channel></rss>\n"
@@ -0,0 +1,139 @@
+# api/images.py
+"""
+Адаптивные картинки для загрузок из админки.
+
+При загрузке из оригинала делаются варианты нескольких ширин в AVIF/WebP
+и крошечный размытый плейсхолдер (data: URI). Описание вариантов хранится
+в JSON-колонке записи (Coach.photo_variants, NewsArticle.image_variants):
+
+    {"w": 1200, "h": 800, "placeholder": "data:image/webp;base64,...",
+     "srcset": {"avif": [[url, 320], ...], "webp": [[url, 320], ...]}, "id": <public_id|None>}
+
+Pillow — опциональная зависимость: без него сохраняется только оригинал,
+а шаблоны рисуют обычный <img>. Импортируется он лениво, при первой загрузке,
+чтобы не удлинять cold start публичных страниц.
+"""
+import base64
+import io
+import os
+
+from markupsafe import Markup, escape
+
+Image = ImageOps = None  # модули Pillow, заполняет has_pil()
+
+MIME = {"avif": "image/avif", "webp": "image/webp"}
+QUALITY = {"avif": 50, "webp": 78}
+
+
+def has_pil() -> bool:
+    global Image, ImageOps
+    if Image is None:
+        try:
+            from PIL import Image as _Image, ImageOps as _ImageOps  # type: ignore
+        except ImportError:
+            return False
+        _Image.init()
+        Image, ImageOps = _Image, _ImageOps
+    return True
+
+
+def available_formats(use_avif: bool = True) -> list[str]:
+    """Форматы в порядке предпочтения (браузер берёт первый поддерживаемый <source>)."""
+    if not has_pil():
+        return []
+    fmts = []
+    if use_avif and "AVIF" in Image.SAVE:
+        fmts.append("avif")
+    if "WEBP" in Image.SAVE:
+        fmts.append("webp")
+    return fmts
+
+
+def load(data: bytes):
+    """Открывает картинку с учётом EXIF-поворота. None — если Pillow нет или файл не картинка."""
+    if not has_pil():
+        return None
+    try:
+        img = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+        return img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+    except Exception as e:  # noqa: BLE001
+        print("Image decode error:", e)
+        return None
+
+
+def target_widths(width: int, widths) -> list[int]:
+    """Ширины вариантов: не больше оригинала (апскейл только раздувает файл)."""
+    return sorted({w for w in widths if w < width} | {min(width, max(widths))})
+
+
+def placeholder(img) -> str:
+    thumb = img.copy()
+    thumb.thumbnail((24, 24))
+    buf = io.BytesIO()
+    fmt = "webp" if "WEBP" in Image.SAVE else "png"
+    thumb.save(buf, fmt.upper(), quality=30)
+    return f"data:image/{fmt};base64,{base64.b64encode(buf.getvalue()).decode()}"
+
+
+def encode(img, width: int, fmt: str) -> bytes:
+    height = max(1, round(img.height * width / img.width))
+    resized = img if width == img.width else img.resize((width, height), Image.LANCZOS)
+    buf = io.BytesIO()
+    resized.save(buf, fmt.upper(), quality=QUALITY[fmt])
+    return buf.getvalue()
+
+
+def describe(img, srcset: dict, public_id: str | None = None) -> dict:
+    return {"w": img.width, "h": img.height, "placeholder": placeholder(img),
+            "srcset": srcset, "id": public_id}
+
+
+def save_local_variants(img, local_dir: str, rel_subdir: str, stem: str, widths, formats) -> dict:
+    """Пишет варианты рядом с оригиналом в static/<rel_subdir>/<stem>-<w>.<fmt>."""
+    srcset = {}
+    for fmt in formats:
+        srcset[fmt] = []
+        for w in target_widths(img.width, widths):
+            fname = f"{stem}-{w}.{fmt}"
+            with open(os.path.join(local_dir, fname), "wb") as fh:
+                fh.write(encode(img, w, fmt))
+            srcset[fmt].append([f"{rel_subdir}/{fname}", w])
+    return describe(img, srcset)
+
+
+def cloudinary_variants(img, public_id: str, widths, formats, build_url) -> dict:
+    """
+    В Cloudinary варианты не загружаем — их отдают on-the-fly трансформации URL
+    (w_<n>,c_limit,f_<fmt>,q_auto), которые CDN кэширует после первого запроса.
+    build_url — cloudinary.utils.cloudinary_url.
+    """
+    srcset = {}
+    for fmt in formats:
+        srcset[fmt] = [
+            [build_url(public_id, width=w, crop="limit", fetch_format=fmt, quality="auto", secure=True)[0], w]
+            for w in target_widths(img.width, widths)
+        ]
+    return describe(img, srcset, public_id)
+
+
+def picture(src: str, variants: dict | None, resolve, alt: str = "", sizes: str = "100vw",
+            css_class: str = "", loading: str = "lazy") -> Markup:
+    """
+    <picture> с AVIF/WebP srcset и плейсхолдером; без вариантов — обычный <img>.
+    src — готовый URL оригинала, resolve — media_url для путей вариантов.
+    """
+    attrs = [f'src="{escape(src)}"', f'alt="{escape(alt)}"', f'loading="{loading}"', 'decoding="async"']
+    if css_class:
+        attrs.append(f'class="{escape(css_class)}"')
+    if not variants:
+        return Markup(f"<img {' '.join(attrs)}>")
+
+    attrs.append(f'width="{int(variants["w"])}" height="{int(variants["h"])}"')
+    if variants.get("placeholder"):
+        attrs.append(f'style="background:url({escape(variants["placeholder"])}) center/cover no-repeat"')
+    sources = []
+    for fmt, items in variants.get("srcset", {}).items():
+        if fmt in MIME and items:
+            srcset = ", ".join(f"{escape(resolve(url))} {int(w)}w" for url, w in items)
+            sources.append(f'<source type="{MIME[fmt]}" srcset="{srcset}" sizes="{escape(sizes)}">')
+    return Markup(f"<picture>{''.join(sources)}<img {' '.join(attrs)}></picture>")
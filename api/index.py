@@ -1,17 +1,40 @@
 # api/index.py
+import time
+_T0 = time.perf_counter()  # до остальных импортов: меряем cold start целиком
+
 import os
-from functools import wraps
-from datetime import datetime
-from email.mime.text import MIMEText
-from email.header import Header
-import smtplib
+import tempfile
+from functools import cache, wraps
+from datetime import datetime, timedelta
 from urllib.parse import quote_plus
-from flask import Flask, render_template, request, redirect, url_for, Response
+from flask import Blueprint, Flask, render_template, request, redirect, url_for, Response, abort, stream_with_context
 # импорт SQLAlchemy оставлен, хотя экземпляр берём из api.models (не создаём новый!)
-from werkzeug.utils import secure_filename
+import click
+from sqlalchemy import exc as sqlalchemy_exc
 
 # ЕДИНЫЙ db + модель Course живут в api/models.py
-from api.models import db, Course
+from api.models import db, Booking, Course, Lead, ScheduleRule
+from api.cache import ContentVersions, PageCache
+from api.pagination import keyset_paginate
+from api.adminlist import ListSpec, admin_list
+from api import booking, bulk, dbpool, feeds, images, media, migrations, readapi, richtext, search, templating, youtube
+from api.schema import ensure_schema
+from api.assets import AssetManifest
+from api.metrics import RequestMetrics, external_call
+from api.compression import Compressor
+from api.mailer import OutboxWorker, SmtpConnection, drain_outbox, enqueue_email
+from api.leads import LeadBuffer
+from api.sitegen import DeployHook, SiteGenerator
+from api.ratelimit import RateLimiter, Rule
+
+# ───────────────────── Тайминги cold start ──────────────────────
+STARTUP_TIMINGS: dict[str, float] = {}
+
+def _mark(phase: str) -> None:
+    """Время от начала импорта модуля до конца фазы, мс."""
+    STARTUP_TIMINGS[phase] = round((time.perf_counter() - _T0) * 1000, 1)
+
+_mark("imports")
 
 # ───────────────────────── Папки проекта ─────────────────────────
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -26,8 +49,43 @@ app = Flask(
 def env(key: str, default=None) -> str | None:
     return os.environ.get(key, default)
 
+# ───────────────────── Метрики запросов ─────────────────────
+# Server-Timing в каждом ответе + /admin/metrics (см. api/metrics.py)
+metrics = RequestMetrics(
+    query_budget=int(env('QUERY_BUDGET', '10')),
+    window=int(env('METRICS_WINDOW', '1000')),
+)
+metrics.init_app(app)
+
+# ───────────── Сжатие ответов br/gzip (api/compression.py) ─────────────
+compressor = Compressor(
+    min_size=int(env('COMPRESS_MIN_SIZE', '1024')),
+    gzip_level=int(env('COMPRESS_LEVEL', '6')),
+    br_quality=int(env('COMPRESS_BR_QUALITY', '5')),
+    enabled=env('COMPRESS_ENABLED', '1') != '0',
+)
+compressor.init_app(app)
+
 # ────────────────── Флаги окружения / безопасность ───────────────
 IS_SERVERLESS = bool(env('VERCEL') or env('NOW_REGION') or env('AWS_LAMBDA_FUNCTION_NAME'))
+
+# ─────────── Шаблоны: кэш байткода и фрагментов (api/templating.py) ───────────
+# bundle собирается при деплое (flask templates-compile), /tmp — всё остальное
+JINJA_BUNDLE_DIR = env('JINJA_BUNDLE_DIR') or os.path.join(ROOT_DIR, 'jinja_bytecode')
+JINJA_CACHE_DIR = env('JINJA_CACHE_DIR') or os.path.join(tempfile.gettempdir(), 'sportclub-jinja')
+jinja_bytecode = None
+if env('JINJA_BYTECODE_CACHE', '1') != '0':
+    jinja_bytecode = templating.LayeredBytecodeCache(JINJA_CACHE_DIR, JINJA_BUNDLE_DIR)
+app.jinja_options = {
+    **app.jinja_options,
+    "bytecode_cache": jinja_bytecode,
+    "extensions": [*app.jinja_options.get("extensions", ()), templating.FragmentCacheExtension],
+}
+fragment_cache = templating.FragmentCache(
+    max_entries=int(env('FRAGMENT_CACHE_SIZE', '2000')),
+    enabled=env('FRAGMENT_CACHE_ENABLED', '1') != '0',
+)
+app.jinja_env.fragment_cache = fragment_cache
 app.secret_key = env('SECRET_KEY') or os.urandom(32)
 
 ADMIN_USER = env('ADMIN_USER', 'admin')
@@ -47,15 +105,28 @@ def requires_admin(fn):
 
 # ────────────────────────── База данных ──────────────────────────
 db_url = env('DATABASE_URL')
-if db_url and db_url.startswith('postgres://'):
-    db_url = db_url.replace('postgres://', 'postgresql://', 1)
 if not db_url:
     # ВНИМАНИЕ: на Vercel FS read-only. SQLite годится только локально.
     db_url = 'sqlite:///' + os.path.join(ROOT_DIR, 'sportclub.db')
+db_url, db_pgbouncer = dbpool.normalize_url(db_url)
 
+# Режим пула (см. api/dbpool.py): на serverless по умолчанию NullPool + внешний пулер,
+# в долгоживущем процессе — ограниченный QueuePool.
+DB_POOL_MODE = env('DB_POOL_MODE', 'null' if IS_SERVERLESS else 'queue')
 app.config['SQLALCHEMY_DATABASE_URI'] = db_url
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {"pool_pre_ping": True}
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dbpool.engine_options(
+    db_url, DB_POOL_MODE,
+    pgbouncer=db_pgbouncer or env('DB_PGBOUNCER', '0') == '1',
+    pool_size=int(env('DB_POOL_SIZE', '2' if IS_SERVERLESS else '5')),
+    max_overflow=int(env('DB_MAX_OVERFLOW', '2' if IS_SERVERLESS else '5')),
+    pool_timeout=float(env('DB_POOL_TIMEOUT', '5')),
+    pool_recycle=int(env('DB_POOL_RECYCLE', '300')),
+    pre_ping=env('DB_PRE_PING', '0') == '1',
+    connect_timeout=int(env('DB_CONNECT_TIMEOUT', '5')),
+)
+pool_metrics = dbpool.PoolMetrics()
+pool_metrics.install()
 
 # ИНИЦИАЛИЗИРУЕМ ЕДИНЫЙ db, НЕ СОЗДАЁМ НОВЫЙ SQLAlchemy(app)!
 db.init_app(app)
@@ -66,6 +137,70 @@ app.config['SMTP_PORT']     = int(env('SMTP_PORT', '587'))
 app.config['SMTP_USERNAME'] = env('SMTP_USERNAME', '')
 app.config['SMTP_PASSWORD'] = env('SMTP_PASSWORD', '')
 app.config['EMAIL_TO']      = env('EMAIL_TO', '')
+app.config['SMTP_FROM']     = env('SMTP_FROM', '')       # по умолчанию = SMTP_USERNAME
+app.config['SMTP_STARTTLS'] = env('SMTP_STARTTLS', '1') != '0'  # 0 — для локального тестового SMTP
+app.config['SMTP_TIMEOUT']  = float(env('SMTP_TIMEOUT', '15'))
+
+# Outbox: письма сохраняются в БД и отправляются вне запроса (см. api/mailer.py)
+app.config['OUTBOX_BATCH_SIZE']   = int(env('OUTBOX_BATCH_SIZE', '20'))
+app.config['OUTBOX_MAX_ATTEMPTS'] = int(env('OUTBOX_MAX_ATTEMPTS', '6'))
+app.config['OUTBOX_RETRY_BASE']   = float(env('OUTBOX_RETRY_BASE', '30'))   # сек, удваивается
+CRON_SECRET = env('CRON_SECRET')  # Vercel Cron шлёт "Authorization: Bearer <CRON_SECRET>"
+
+# На serverless потоки замораживаются между вызовами — там outbox разбирает /cron/outbox
+# (vercel.json → crons, каждые 5 минут)
+outbox_worker = None
+if not IS_SERVERLESS and env('OUTBOX_WORKER', '1') != '0':
+    outbox_worker = OutboxWorker(app, poll_interval=float(env('OUTBOX_POLL_INTERVAL', '30')))
+    outbox_worker.start()
+
+# ───────────────────── Заявки с формы /submit ─────────────────────
+# Write-behind: запрос только кладёт заявку в память, поток пишет пачками (api/leads.py).
+# На serverless буфер не живёт между вызовами — там пишем сразу.
+lead_buffer = LeadBuffer(
+    app,
+    batch_size=int(env('LEADS_BATCH_SIZE', '100')),
+    flush_interval=float(env('LEADS_FLUSH_INTERVAL', '2')),
+)
+LEADS_WRITE_BEHIND = not IS_SERVERLESS and env('LEADS_WRITE_BEHIND', '1') != '0'
+if LEADS_WRITE_BEHIND:
+    lead_buffer.start()
+
+# ─────────────────── Кэш публичных страниц ───────────────────
+# Версии контента (таблица content_versions) дают ETag/Last-Modified и 304.
+content_versions = ContentVersions(
+    ttl=float(env('CONTENT_VERSION_TTL', '5')),
+    build_id=env('VERCEL_GIT_COMMIT_SHA', '') or str(os.getpid()),
+    cache_control=env('PUBLIC_CACHE_CONTROL', 'public, max-age=0, s-maxage=60, stale-while-revalidate=600'),
+)
+
+# В памяти процесса: на serverless у каждого инстанса свой кэш,
+# версии в ключе и TTL ограничивают, как долго другие инстансы видят старые данные.
+page_cache = PageCache(
+    max_entries=int(env('PAGE_CACHE_SIZE', '256')),
+    ttl=float(env('PAGE_CACHE_TTL', '60')),
+    stale_ttl=float(env('PAGE_CACHE_STALE', '600')),
+    enabled=env('PAGE_CACHE_ENABLED', '1') != '0',
+    versions=content_versions,
+)
+
+def public_page(*kinds: str, mimetype: str | None = None, args: tuple[str, ...] = ()):
+    """Условный GET (304) + кэш HTML для страницы, зависящей от kinds (и query-параметров args)."""
+    def decorator(fn):
+        view = content_versions.conditional(*kinds)(page_cache.cached(*kinds, mimetype=mimetype, args=args)(fn))
+        view.content_kinds = kinds   # для статического экспорта (api/sitegen.py)
+        return view
+    return decorator
+
+def content_changed(*kinds: str, ref_id: int | None = None) -> None:
+    """
+    Вызывать после commit в админке.
+    kinds: 'coach' | 'service' | 'news' | 'course'.
+    ref_id — id изменённой записи, если правка точечная (для перегенерации статики).
+    """
+    content_versions.bump(*kinds)
+    page_cache.invalidate(*kinds)
+    site_changed(*kinds, ref_id=ref_id)
 
 # ───────────────────── WhatsApp (запись) ─────────────────────
 SITE_WA_PHONE = env('SITE_WA_PHONE', '')  # Пример: +77071234567
@@ -76,67 +211,127 @@ ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 COACHES_SUB = "images/coaches"
 NEWS_SUB    = "images/news"
 
+# Варианты для srcset (ширины в px); AVIF кодируется медленнее WebP — можно выключить
+IMAGE_WIDTHS = tuple(int(w) for w in env('IMAGE_WIDTHS', '320,640,1024,1600').split(','))
+
+@cache
+def image_formats() -> tuple[str, ...]:
+    # Pillow грузится при первой загрузке картинки, а не при старте
+    return tuple(images.available_formats(use_avif=env('IMAGE_AVIF', '1') != '0'))
+
 def allowed_file(fname: str) -> bool:
     return "." in fname and fname.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 CLOUDINARY_URL = env("CLOUDINARY_URL")
-USE_CLOUDINARY = False
-if CLOUDINARY_URL:
-    try:
-        import cloudinary, cloudinary.uploader  # type: ignore
-        cloudinary.config(cloudinary_url=CLOUDINARY_URL, secure=True)
-        USE_CLOUDINARY = True
-        print("Cloudinary enabled.")
-    except Exception as e:  # noqa: BLE001
-        print("Cloudinary init error:", e)
-        USE_CLOUDINARY = False
+USE_CLOUDINARY = bool(CLOUDINARY_URL)
+_cloudinary = None
 
-def store_image(file_storage, rel_subdir: str, cloud_folder: str | None = None):
+def get_cloudinary():
     """
-    Возвращает dict {"url": <путь/https>, "id": <public_id|None>} или None.
+    cloudinary импортируется при первой загрузке/удалении картинки:
+    публичным страницам он не нужен, а импорт заметно удлиняет cold start.
     """
-    if not file_storage or file_storage.filename == "" or not allowed_file(file_storage.filename):
-        return None
-
-    # Прод: Cloudinary
-    if USE_CLOUDINARY:
+    global _cloudinary, USE_CLOUDINARY
+    if _cloudinary is None and USE_CLOUDINARY:
         try:
-            folder = f"vershina/{(cloud_folder or rel_subdir).strip('/')}"
-            res = cloudinary.uploader.upload(  # type: ignore
-                file_storage,
-                folder=folder,
-                resource_type="image",
-                unique_filename=True,
-                overwrite=False,
-            )
-            return {"url": res.get("secure_url"), "id": res.get("public_id")}
+            import cloudinary, cloudinary.api, cloudinary.uploader, cloudinary.utils  # type: ignore
+            cloudinary.config(cloudinary_url=CLOUDINARY_URL, secure=True)
+            _cloudinary = cloudinary
+            print("Cloudinary enabled.")
         except Exception as e:  # noqa: BLE001
-            print("Cloudinary upload error:", e)
-            return None
+            print("Cloudinary init error:", e)
+            USE_CLOUDINARY = False
+    return _cloudinary
+
+# Загрузка идёт в пуле потоков: запись сохраняется сразу со статусом ожидания,
+# фото подставляется, когда файл загружен (api/media.py). На serverless — в запросе.
+MEDIA_BACKEND = env('MEDIA_BACKEND', 'cloudinary' if USE_CLOUDINARY else ('' if IS_SERVERLESS else 'local'))
+MEDIA_ORPHAN_GRACE = float(env('MEDIA_ORPHAN_GRACE', '86400'))   # сек: моложе — не считаем сиротой
+
+def make_media_backend(name: str):
+    if name == "cloudinary":
+        return media.CloudinaryBackend(get_cloudinary)
+    if name == "local":
+        return media.LocalBackend(app.static_folder)
+    if name == "memory":
+        return media.MemoryBackend()
+    return None   # serverless без облака: сохранить файл некуда
+
+media_backend = make_media_backend(MEDIA_BACKEND)
+media_uploader = None
+if media_backend is not None:
+    media_uploader = media.MediaUploader(
+        app, media_backend, IMAGE_WIDTHS, image_formats,
+        workers=int(env('MEDIA_WORKERS', '0' if IS_SERVERLESS else '2')),
+        on_change=lambda kind, ref_id: content_changed(kind, ref_id=ref_id),
+    )
 
-    # Серверлес без облака — сохранить нельзя
-    if IS_SERVERLESS:
-        print(f"Uploads disabled on serverless without CLOUDINARY_URL (file={file_storage.filename})")
+def take_upload(file_storage, field: media.MediaField) -> media.Upload | None:
+    """Файл из формы (или None, если его нет / расширение не то / загрузки выключены)."""
+    if media_uploader is None:
+        if file_storage and file_storage.filename:
+            print(f"Uploads disabled: MEDIA_BACKEND не задан (file={file_storage.filename})")
         return None
-
-    # Локально: сохраняем в static/
-    fname = secure_filename(file_storage.filename)
-    local_dir = os.path.join(app.static_folder, rel_subdir)
-    os.makedirs(local_dir, exist_ok=True)
-    file_storage.save(os.path.join(local_dir, fname))
-    return {"url": f"{rel_subdir}/{fname}", "id": None}
-
-def delete_image(public_id: str | None):
-    if USE_CLOUDINARY and public_id:
-        try:
-            cloudinary.uploader.destroy(public_id, invalidate=True, resource_type="image")  # type: ignore
-        except Exception as e:  # noqa: BLE001
-            print("Cloudinary delete error:", e)
+    return media.read_upload(file_storage, field, allowed_file)
+
+# ───────────────────── Статика с хэшем в URL ─────────────────────
+ASSET_FINGERPRINT = env('ASSET_FINGERPRINT', '1') != '0'
+assets = AssetManifest(app.static_folder)
+
+def static_url(filename: str) -> str:
+    """URL статики с хэшем содержимого (/assets/style.<hash>.css) или обычный /static/."""
+    if ASSET_FINGERPRINT:
+        hashed = assets.hashed_name(filename)
+        if hashed:
+            return url_for("hashed_asset", filename=hashed)
+    return url_for("static", filename=filename)
+
+def url_for_assets(endpoint: str, **values) -> str:
+    """url_for для шаблонов: url_for('static', filename=...) отдаёт хэшированный URL."""
+    if endpoint == "static" and set(values) == {"filename"}:
+        return static_url(values["filename"])
+    return url_for(endpoint, **values)
+
+app.jinja_env.globals["url_for"] = url_for_assets
+
+@app.route("/assets/<path:filename>")
+def hashed_asset(filename: str):
+    return assets.serve(filename)
+
+@app.cli.command("templates-compile")
+@click.option("--out", default=None, help="каталог (по умолчанию JINJA_BUNDLE_DIR)")
+def templates_compile_command(out):
+    """Скомпилировать шаблоны в байткод для выкладки вместе с кодом (деплой)."""
+    out = out or JINJA_BUNDLE_DIR
+    print(f"Скомпилировано шаблонов: {templating.compile_templates(app.jinja_env, out)} → {out}")
+
+@app.cli.command("assets-build")
+def assets_build_command():
+    """Посчитать хэши статики (static/manifest.json) и сделать .gz/.br копии."""
+    print(f"Собрано файлов: {len(assets.build())}")
 
 def media_url(path: str | None) -> str:
     if not path:
         return ""
-    return path if path.startswith(("http://", "https://")) else url_for("static", filename=path)
+    return path if path.startswith(("http://", "https://")) else static_url(path)
+
+def responsive_img(path: str | None, variants: dict | None, alt: str = "",
+                   sizes: str = "100vw", css_class: str = "", loading: str = "lazy"):
+    """<picture> с srcset/sizes для загруженной картинки (см. images.picture)."""
+    return images.picture(media_url(path), variants, media_url, alt=alt, sizes=sizes,
+                          css_class=css_class, loading=loading)
+
+def normalize_phone(phone: str | None) -> str:
+    """
+    Номер → только цифры в международном формате: '+7 (707) 123-45-67' → '77071234567'.
+    Местные варианты '8 707 ...' и '707 ...' (10 цифр) приводятся к коду +7.
+    """
+    digits = "".join(ch for ch in (phone or "") if ch.isdigit())
+    if len(digits) == 11 and digits.startswith("8"):
+        digits = "7" + digits[1:]
+    elif len(digits) == 10:
+        digits = "7" + digits
+    return digits
 
 def make_wa_link(phone: str | None, text: str | None = None) -> str:
     """
@@ -145,7 +340,7 @@ def make_wa_link(phone: str | None, text: str | None = None) -> str:
     """
     if not phone:
         return "#"
-    digits = "".join(ch for ch in phone if ch.isdigit())
+    digits = normalize_phone(phone)
     msg = quote_plus(text or "")
     return f"https://wa.me/{digits}?text={msg}"
 
@@ -154,7 +349,9 @@ def make_wa_link(phone: str | None, text: str | None = None) -> str:
 def inject_media_helpers():
     return {
         "media_url": media_url,
+        "responsive_img": responsive_img,
         "wa_link": make_wa_link,
+        "yt_thumb": youtube.course_thumbnail,
         "SITE_WA_PHONE": SITE_WA_PHONE,
         "SITE_WA_TEXT": SITE_WA_TEXT,
     }
@@ -168,8 +365,15 @@ class Coach(db.Model):
     experience = db.Column(db.Text)
     specialization = db.Column(db.String(200))
     photo_path = db.Column(db.String(300))
+    photo_variants = db.Column(db.JSON)  # адаптивные варианты фото (api/images.py)
+    photo_status = db.Column(db.String(24))  # None | 'pending:<токен>' | 'failed' (api/media.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # ключ кэша карточки
     section = db.Column(db.String(50), nullable=False)  # 'ski' | 'gym'
 
+    # WHERE section = … ORDER BY name (страницы секций); ORDER BY name, id (список в админке)
+    __table_args__ = (db.Index("ix_coach_section_name", "section", "name"),
+                      db.Index("ix_coach_name_id", "name", "id"))
+
     def __repr__(self):
         return f"<Coach {self.name}>"
 
@@ -181,6 +385,9 @@ class Service(db.Model):
     duration = db.Column(db.String(50))
     section = db.Column(db.String(50), nullable=False)  # 'ski' | 'gym'
 
+    __table_args__ = (db.Index("ix_service_section_name", "section", "name"),
+                      db.Index("ix_service_name_id", "name", "id"))
+
     def __repr__(self):
         return f"<Service {self.name}>"
 
@@ -190,15 +397,84 @@ class NewsArticle(db.Model):
     content = db.Column(db.Text, nullable=False)
     pub_date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     image_path = db.Column(db.String(300))
+    image_variants = db.Column(db.JSON)  # адаптивные варианты картинки (api/images.py)
+    image_status = db.Column(db.String(24))  # None | 'pending:<токен>' | 'failed' (api/media.py)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # ключ кэша карточки
+
+    # Производные от content, считаются при сохранении (api/richtext.py, flask news-render)
+    content_html = db.deferred(db.Column(db.Text))   # очищенный HTML для страницы новости
+    excerpt = db.Column(db.String(400))              # анонс для списков — простой текст
+    word_count = db.Column(db.Integer)
+    reading_minutes = db.Column(db.Integer)
+
+    # ORDER BY pub_date DESC, id DESC + keyset-курсор (главная, /news, API)
+    __table_args__ = (db.Index("ix_news_article_pub_date_id", pub_date.desc(), id.desc()),)
+
+    def render_content(self) -> None:
+        rendered = richtext.render(self.content)
+        self.content_html = rendered.html
+        self.excerpt = rendered.excerpt
+        self.word_count = rendered.word_count
+        self.reading_minutes = rendered.reading_minutes
 
     def __repr__(self):
         return f"<NewsArticle {self.title}>"
 
-with app.app_context():
-    try:
-        db.create_all()
-    except Exception as e:  # noqa: BLE001
-        print("DB init skipped/failed:", e)
+# Колонки для списков новостей (без тяжёлых content/content_html)
+NEWS_LIST_OPTIONS = (
+    db.load_only(NewsArticle.id, NewsArticle.title, NewsArticle.pub_date,
+                 NewsArticle.image_path, NewsArticle.image_variants, NewsArticle.updated_at,
+                 NewsArticle.excerpt, NewsArticle.reading_minutes),
+)
+NEWS_PER_PAGE = int(env('NEWS_PER_PAGE', '10'))
+ADMIN_NEWS_PER_PAGE = int(env('ADMIN_NEWS_PER_PAGE', '50'))
+ADMIN_PER_PAGE = int(env('ADMIN_PER_PAGE', '50'))
+
+# Где лежат картинки записей (api/media.py)
+COACH_PHOTO = media.MediaField(Coach, "coach", "photo_path", "photo_variants", "photo_status",
+                               COACHES_SUB, "coaches")
+NEWS_IMAGE = media.MediaField(NewsArticle, "news", "image_path", "image_variants", "image_status",
+                              NEWS_SUB, "news")
+MEDIA_FIELDS = [COACH_PHOTO, NEWS_IMAGE]
+
+_mark("models")
+
+# Схема БД. На serverless по умолчанию не трогаем её при старте (лишний
+# round trip к Postgres на каждом cold start) — миграцию запускает сборка
+# (vercel.json → buildCommand) до экспорта статики:
+#   flask --app api.index db-migrate
+AUTO_MIGRATE = env('AUTO_MIGRATE', '0' if IS_SERVERLESS else '1') != '0'
+
+def migrate() -> None:
+    with app.app_context():
+        try:
+            ensure_schema()
+        except Exception as e:  # noqa: BLE001
+            print("DB init skipped/failed:", e)
+
+if AUTO_MIGRATE:
+    migrate()
+    _mark("schema")
+
+@app.cli.command("db-migrate")
+@click.option("--status", "show_status", is_flag=True, help="только показать применённые/ожидающие миграции")
+def db_migrate_command(show_status):
+    """Создать недостающие таблицы/колонки и применить миграции (api/migrations.py)."""
+    if not show_status:
+        # без migrate(): ошибка должна остановить сборку, а не уйти в лог
+        ensure_schema()
+        return
+    for m, done in migrations.status():
+        print(f"{'✓' if done else '·'} {m.id} — {m.description}")
+
+# ─────────────── Пул соединений исчерпан → 503 ───────────────
+@app.errorhandler(sqlalchemy_exc.TimeoutError)
+def pool_exhausted(e):
+    """QueuePool не выдал соединение за DB_POOL_TIMEOUT: быстро отказываем, а не копим очередь."""
+    db.session.rollback()
+    pool_metrics.timeout()
+    print(f"[DB] пул соединений исчерпан: {request.method} {request.path}")
+    return "Сервис временно перегружен, попробуйте через несколько секунд.", 503, {"Retry-After": "2"}
 
 # ───────────────────── Security заголовки ────────────────────────
 @app.after_request
@@ -207,19 +483,27 @@ def add_security_headers(resp):
     resp.headers['X-Content-Type-Options'] = 'nosniff'
     resp.headers['Referrer-Policy'] = 'strict-origin-when-cross-origin'
     resp.headers['Permissions-Policy'] = 'geolocation=(), microphone=()'
+    # публичные страницы ставят свой Cache-Control (см. public_page)
+    if 'Cache-Control' not in resp.headers and request.path.startswith('/admin'):
+        resp.headers['Cache-Control'] = 'no-store'
     return resp
 
 # ─────────────────── Публичные страницы сайта ───────────────────
 @app.get("/health")
 def health():
+    if request.args.get("timings"):
+        return {"status": "ok", "startup_ms": STARTUP_TIMINGS}, 200
     return "ok", 200
 
 @app.route("/")
+@public_page("news")
 def index():
-    latest_news = NewsArticle.query.order_by(NewsArticle.pub_date.desc()).limit(3).all()
+    latest_news = (NewsArticle.query.options(*NEWS_LIST_OPTIONS)
+                   .order_by(NewsArticle.pub_date.desc(), NewsArticle.id.desc()).limit(3).all())
     return render_template("index.html", title="Главная", latest_news=latest_news)
 
 @app.route("/ski-resort.html", endpoint="ski_resort")
+@public_page("coach", "service")
 def ski_resort():
     coaches = Coach.query.filter_by(section='ski').order_by(Coach.name).all()
     services = Service.query.filter_by(section='ski').order_by(Service.name).all()
@@ -228,6 +512,7 @@ def ski_resort():
                            coaches=coaches, services=services)
 
 @app.route("/gym.html", endpoint="gym")
+@public_page("coach", "service")
 def gym():
     coaches = Coach.query.filter_by(section='gym').order_by(Coach.name).all()
     services = Service.query.filter_by(section='gym').order_by(Service.name).all()
@@ -236,16 +521,47 @@ def gym():
                            coaches=coaches, services=services)
 
 @app.route("/news")
+@public_page("news", args=("cursor",))
 def news_list_all():
-    articles = NewsArticle.query.order_by(NewsArticle.pub_date.desc()).all()
-    return render_template("news_list_all.html", title="Все новости и акции", articles=articles)
+    page = keyset_paginate(NewsArticle.query.options(*NEWS_LIST_OPTIONS),
+                           NewsArticle.pub_date, NewsArticle.id,
+                           cursor=request.args.get("cursor"), per_page=NEWS_PER_PAGE)
+    return templating.stream_page("news_list_all.html", title="Все новости и акции",
+                                  articles=page.items, page=page)
 
 @app.route('/news/<int:article_id>')
+@public_page("news")
 def news_article_detail(article_id: int):
-    article = NewsArticle.query.get_or_404(article_id)
+    article = NewsArticle.query.options(db.undefer(NewsArticle.content_html)).get_or_404(article_id)
+    if article.content_html is None:
+        article.render_content()   # ещё не пересчитана (flask news-render) — считаем без записи
     return render_template('news_article_detail.html', article=article, title=article.title)
 
+@app.cli.command("news-render")
+@click.option("--all", "rerender_all", is_flag=True, help="пересчитать и уже посчитанные новости")
+@click.option("--batch", "batch_size", default=100, show_default=True)
+def news_render_command(rerender_all, batch_size):
+    """Посчитать content_html/excerpt/время чтения для новостей (после обновления или смены правил)."""
+    query = NewsArticle.query.options(db.undefer(NewsArticle.content_html)).order_by(NewsArticle.id)
+    if not rerender_all:
+        query = query.filter(db.or_(NewsArticle.content_html.is_(None), NewsArticle.excerpt.is_(None)))
+    updated, last_id = 0, 0
+    while True:
+        batch = query.filter(NewsArticle.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        for article in batch:
+            article.render_content()
+        last_id = batch[-1].id
+        updated += len(batch)
+        db.session.commit()
+        db.session.expunge_all()
+    if updated:
+        content_changed("news")
+    print(f"Пересчитано новостей: {updated}")
+
 @app.route("/contacts.html")
+@public_page()
 def contacts_page():
     return render_template("contacts.html", title="Контакты")
 
@@ -254,100 +570,671 @@ def thank_you():
     return "Спасибо!"
 
 # ───────────── Видеокурсы (публичная страница) ─────────────
+COURSES_PER_PAGE = 9  # по 9 (3×3)
+# facade — превью + iframe по клику (api/youtube.py); iframe — сразу iframe (loading=lazy)
+YT_EMBED_MODE = env('YT_EMBED_MODE', 'facade')
+
+_course_total: tuple = (None, 0)   # (версия 'course', число курсов)
+
+def course_total() -> int:
+    """COUNT курсов — один раз на версию контента 'course', а не на каждую страницу /courses."""
+    global _course_total
+    version = content_versions.get(["course"])["course"][0]
+    if _course_total[0] != version:
+        _course_total = (version, db.session.query(db.func.count(Course.id)).scalar())
+    return _course_total[1]
+
 @app.route("/courses")
+@public_page("course", args=("page",))
 def courses():
     page = max(int(request.args.get("page", 1) or 1), 1)
-    per_page = 9  # по 9 (3×3)
-    pagination = Course.query.order_by(Course.id.desc()).paginate(page=page, per_page=per_page, error_out=False)
+    pagination = Course.query.order_by(Course.id.desc()).paginate(
+        page=page, per_page=COURSES_PER_PAGE, error_out=False, count=False)
+    pagination.total = course_total()
     return render_template(
         "courses.html",
         title="Видеокурсы",
         courses=pagination.items,
-        pagination=pagination
+        pagination=pagination,
+        embed_mode=YT_EMBED_MODE,
     )
 
+@app.cli.command("courses-thumbnails")
+@click.option("--all", "recheck_all", is_flag=True, help="перепроверить и уже проверенные превью")
+def courses_thumbnails_command(recheck_all):
+    """Посчитать превью YouTube для курсов без проверенного Course.thumbnail."""
+    updated = 0
+    for course in Course.query.order_by(Course.id):
+        if recheck_all or not (course.thumbnail or {}).get("checked"):
+            course.thumbnail = youtube.thumbnails(course.youtube_id)
+            updated += 1
+    db.session.commit()
+    if updated:
+        content_changed("course")
+    print(f"Обновлено превью: {updated}")
+
+# ───────────── Sitemap и RSS новостей (api/feeds.py) ─────────────
+# Адреса в XML — абсолютные; за прокси/на нескольких доменах задайте канонический SITE_URL
+SITE_URL = env('SITE_URL', '').rstrip('/')
+
+def site_url(path: str) -> str:
+    return (SITE_URL or request.host_url.rstrip("/")) + path
+
+@app.route("/sitemap.xml")
+@public_page("news", "course", mimetype="application/xml; charset=utf-8")
+def sitemap_xml():
+    versions = content_versions.get(["news", "course"])
+
+    def urls():
+        yield site_url(url_for("index")), None
+        for endpoint in ("ski_resort", "gym", "contacts_page"):
+            yield site_url(url_for(endpoint)), None
+        yield site_url(url_for("news_list_all")), versions["news"][1]
+        yield site_url(url_for("courses")), versions["course"][1]
+        for n in range(2, -(-course_total() // COURSES_PER_PAGE) + 1):
+            yield site_url(url_for("courses", page=n)), versions["course"][1]
+        rows = db.session.execute(
+            db.select(NewsArticle.id, NewsArticle.pub_date, NewsArticle.updated_at)
+            .order_by(NewsArticle.pub_date.desc(), NewsArticle.id.desc())
+            .execution_options(yield_per=500))
+        for article_id, pub_date, updated_at in rows:
+            yield site_url(url_for("news_article_detail", article_id=article_id)), updated_at or pub_date
+
+    return feeds.sitemap(urls())
+
+@app.route("/news/feed.xml")
+@public_page("news", mimetype="application/rss+xml; charset=utf-8")
+def news_feed_xml():
+    rows = db.session.execute(
+        db.select(NewsArticle.id, NewsArticle.title, NewsArticle.pub_date, NewsArticle.excerpt)
+        .order_by(NewsArticle.pub_date.desc(), NewsArticle.id.desc()).limit(feeds.FEED_ITEMS)).all()
+    items = ((title, site_url(url_for("news_article_detail", article_id=article_id)), pub_date, excerpt)
+             for article_id, title, pub_date, excerpt in rows)
+    return feeds.rss('Новости СК "Алтайские Барсы"', site_url(url_for("news_list_all")),
+                     site_url(url_for("news_feed_xml")), "Новости и акции спортивного клуба", items)
+
+# ───────────── Статический экспорт (api/sitegen.py) ─────────────
+# Все публичные страницы → SITE_EXPORT_DIR/_site/…; CDN отдаёт их без Python (см. vercel.json).
+SITE_EXPORT_DIR = env('SITE_EXPORT_DIR') or os.path.join(ROOT_DIR, 'public')
+SITE_DEPLOY_HOOK = env('SITE_DEPLOY_HOOK')   # Vercel Deploy Hook: пересобрать статику после правки
+
+def _site_pages():
+    pages = [("/", None), ("/ski-resort.html", None), ("/gym.html", None),
+             ("/contacts.html", None), ("/news", None), ("/courses", None)]
+    ids = db.session.execute(db.select(NewsArticle.id).order_by(NewsArticle.id)).scalars()
+    pages += [(f"/news/{article_id}", article_id) for article_id in ids]
+    course_pages = -(-course_total() // COURSES_PER_PAGE)
+    pages += [(f"/courses?page={n}", None) for n in range(2, course_pages + 1)]
+    return pages
+
+site = SiteGenerator(app, SITE_EXPORT_DIR, _site_pages, versions=content_versions,
+                     debounce=float(env('SITE_REGEN_DEBOUNCE', '2')))
+# В долгоживущем процессе, который сам раздаёт экспорт (nginx → SITE_EXPORT_DIR), правки
+# админки перерисовывают только затронутые страницы. На serverless диск read-only —
+# там вместо этого дёргается Deploy Hook и статика собирается заново при деплое.
+SITE_REGENERATE = bool(env('SITE_EXPORT_DIR')) and not IS_SERVERLESS and env('SITE_REGENERATE', '1') != '0'
+if SITE_REGENERATE:
+    site.start()
+
+# Deploy Hook не дёргается из запроса: правки видны по content_versions, хук вызывает
+# /cron/site-deploy (serverless, vercel.json → crons каждые 5 минут — больше SITE_DEPLOY_QUIET)
+# или фоновый поток — после SITE_DEPLOY_QUIET секунд без правок.
+deploy_hook = DeployHook(app, SITE_DEPLOY_HOOK, ("coach", "service", "news", "course"),
+                         quiet=float(env('SITE_DEPLOY_QUIET', '120')))
+if SITE_DEPLOY_HOOK and not IS_SERVERLESS:
+    deploy_hook.start()
+
+def site_changed(*kinds: str, ref_id: int | None = None) -> None:
+    if SITE_REGENERATE:
+        for kind in kinds:
+            site.touch(kind, ref_id)
+
+@app.route("/cron/site-deploy")
+def cron_site_deploy():
+    auth = request.headers.get("Authorization", "")
+    if not (CRON_SECRET and auth == f"Bearer {CRON_SECRET}"):
+        return _need_auth()
+    with external_call("deploy_hook"):
+        return deploy_hook.flush(), 200
+
+@app.cli.command("site-export")
+@click.option("--out", default=None, help="каталог экспорта (по умолчанию SITE_EXPORT_DIR или ./public)")
+@click.option("--changed", is_flag=True, help="только страницы, чей контент изменился с прошлого экспорта")
+def site_export_command(out, changed):
+    """Отрендерить публичные страницы в статические файлы для CDN."""
+    if out:
+        site.out_dir = out
+    stats = site.export_changed() if changed else site.export_all(assets)
+    print(f"Экспорт в {site.out_dir}: {stats}")
+
+# ───────────── Поиск по новостям и видеокурсам ─────────────
+SEARCH_SOURCES = {
+    "news": (NewsArticle, "title", "content"),
+    "course": (Course, "title", "description"),
+}
+
+def _search_hits(q: str, limit: int):
+    try:
+        return search.search(q, limit=limit)
+    except Exception as e:  # noqa: BLE001
+        db.session.rollback()
+        print(f"[SEARCH] ошибка поиска: {e}")
+        return []
+
+@app.route("/search")
+@public_page("news", "course", args=("q",))
+def search_page():
+    q = request.args.get("q", "").strip()[:200]
+    hits = _search_hits(q, limit=30) if q else []
+    # ссылки на видеокурсы — одним запросом по всем найденным id
+    course_ids = [h.ref_id for h in hits if h.kind == "course"]
+    youtube_ids = dict(db.session.query(Course.id, Course.youtube_id)
+                       .filter(Course.id.in_(course_ids)).all()) if course_ids else {}
+    return render_template("search.html", title="Поиск", q=q, hits=hits, youtube_ids=youtube_ids)
+
+@app.cli.command("search-reindex")
+def search_reindex_command():
+    """Пересобрать поисковый индекс по всем новостям и курсам."""
+    search.ensure_index()
+    print(f"Проиндексировано документов: {search.reindex_all(SEARCH_SOURCES)}")
+
+# ───────────── JSON API для приложения и виджетов (api/readapi.py) ─────────────
+API_CORS_ORIGIN = env('API_CORS_ORIGIN', '*')
+api_v1 = Blueprint("api_v1", __name__, url_prefix="/api/v1")
+
+def public_json(*kinds: str, args: tuple[str, ...] = ()):
+    """Как public_page, но для JSON: ETag зависит ещё и от query (?fields=, ?cursor=)."""
+    def decorator(fn):
+        return content_versions.conditional(*kinds, vary_args=True)(
+            page_cache.cached(*kinds, mimetype="application/json", args=args)(fn))
+    return decorator
+
+def absolute_media_url(path: str | None) -> str | None:
+    url = media_url(path)
+    if not url:
+        return None
+    return url if url.startswith(("http://", "https://")) else request.host_url.rstrip("/") + url
+
+API_COLLECTIONS = {coll.name: coll for coll in (
+    readapi.Collection(
+        "coaches", "coach", Coach,
+        fields={"id": Coach.id, "name": Coach.name, "section": Coach.section,
+                "specialization": Coach.specialization, "experience": Coach.experience,
+                "photo": Coach.photo_path},
+        default_fields=("id", "name", "section", "specialization", "photo"),
+        filters={"section": (Coach.section, ("ski", "gym"))}, transforms={"photo": absolute_media_url}),
+    readapi.Collection(
+        "services", "service", Service,
+        fields={"id": Service.id, "name": Service.name, "section": Service.section, "price": Service.price,
+                "duration": Service.duration, "description": Service.description},
+        default_fields=("id", "name", "section", "price", "duration", "description"),
+        filters={"section": (Service.section, ("ski", "gym"))}),
+    readapi.Collection(
+        "news", "news", NewsArticle,
+        fields={"id": NewsArticle.id, "title": NewsArticle.title, "pub_date": NewsArticle.pub_date,
+                "image": NewsArticle.image_path, "excerpt": NewsArticle.excerpt,
+                "reading_minutes": NewsArticle.reading_minutes, "word_count": NewsArticle.word_count,
+                "content": NewsArticle.content, "html": NewsArticle.content_html},
+        default_fields=("id", "title", "pub_date", "image", "excerpt"),
+        sort=NewsArticle.pub_date, desc=True,
+        transforms={"image": absolute_media_url}),
+    readapi.Collection(
+        "courses", "course", Course,
+        fields={"id": Course.id, "title": Course.title, "youtube_id": Course.youtube_id,
+                "description": Course.description, "thumbnail": Course.thumbnail},
+        default_fields=("id", "title", "youtube_id", "description")),
+)}
+
+def _api_collection_view(coll: readapi.Collection):
+    def view():
+        return readapi.dumps({**readapi.collection_page(coll, request.args),
+                              "version": content_versions.get([coll.kind])[coll.kind][0]})
+    view.__name__ = f"api_{coll.name}"
+    return public_json(coll.kind, args=("fields", "cursor", "limit", *coll.filters))(view)
+
+for _coll in API_COLLECTIONS.values():
+    api_v1.add_url_rule(f"/{_coll.name}", view_func=_api_collection_view(_coll))
+
+# параметры /batch: include, limit и fields[<коллекция>], cursor[…], limit[…], <фильтр>[…]
+API_BATCH_ARGS = ("include", "limit", *(f"{param}[{coll.name}]" for coll in API_COLLECTIONS.values()
+                                        for param in ("fields", "cursor", "limit", *coll.filters)))
+
+@api_v1.route("/batch")
+@public_json("coach", "service", "news", "course", args=API_BATCH_ARGS)
+def api_batch():
+    """Несколько коллекций за один запрос (синхронизация каталога)."""
+    data = readapi.batch(API_COLLECTIONS, request.args)
+    versions = content_versions.get([API_COLLECTIONS[name].kind for name in data])
+    return readapi.dumps({"collections": data,
+                          "versions": {name: versions[API_COLLECTIONS[name].kind][0] for name in data}})
+
+@api_v1.route("")
+def api_index():
+    return Response(readapi.dumps({"version": 1, "collections": readapi.describe(API_COLLECTIONS)}),
+                    mimetype="application/json",
+                    headers={"Cache-Control": content_versions.cache_control})
+
+@api_v1.errorhandler(readapi.ApiError)
+def api_error(e: readapi.ApiError):
+    return Response(readapi.dumps({"error": str(e)}), e.status, mimetype="application/json")
+
+@api_v1.after_request
+def api_cors(resp: Response) -> Response:
+    if API_CORS_ORIGIN:
+        resp.headers["Access-Control-Allow-Origin"] = API_CORS_ORIGIN
+        resp.headers["Access-Control-Expose-Headers"] = "ETag"
+    return resp
+
+# Свободные места по расписанию (api/booking.py). Не через кэш страниц: счётчик мест
+# меняется с каждой записью; короткий max-age — решает всё равно /book.
+SCHEDULE_TZ = env('SCHEDULE_TZ', 'Asia/Almaty')
+SCHEDULE_HORIZON_DAYS = int(env('SCHEDULE_HORIZON_DAYS', '28'))    # на сколько вперёд создавать занятия
+SCHEDULE_MAX_DAYS = int(env('SCHEDULE_MAX_DAYS', '200'))          # самый длинный период запроса — сезон
+SCHEDULE_CACHE_SECONDS = int(env('SCHEDULE_CACHE_SECONDS', '10'))
+
+@api_v1.route("/schedule")
+def api_schedule():
+    args = request.args
+    section = args.get("section")
+    if section not in ("ski", "gym"):
+        raise readapi.ApiError("section: ski или gym")
+    try:
+        start = datetime.fromisoformat(args["from"]) if args.get("from") else booking.club_now(SCHEDULE_TZ)
+    except ValueError:
+        raise readapi.ApiError("from: дата в формате 2024-01-31") from None
+    days = args.get("days", 7, type=int)
+    if not 1 <= days <= SCHEDULE_MAX_DAYS:
+        raise readapi.ApiError(f"days: от 1 до {SCHEDULE_MAX_DAYS}")
+    start = start.replace(tzinfo=None, microsecond=0)
+    end = start.replace(hour=0, minute=0, second=0) + timedelta(days=days)
+    slots = booking.availability(section, start, end, service_id=args.get("service", type=int),
+                                 only_free=args.get("free") == "1")
+    return Response(readapi.dumps({"section": section, "from": start.isoformat(), "to": end.isoformat(),
+                                   "sessions": [slot.as_dict() for slot in slots]}),
+                    mimetype="application/json",
+                    headers={"Cache-Control": f"public, max-age={SCHEDULE_CACHE_SECONDS}"})
+
+app.register_blueprint(api_v1)
+
+# ───────────── Защита форм: лимиты и дубли (api/ratelimit.py) ─────────────
+# Общее хранилище для всех инстансов — Redis (RATE_LIMIT_REDIS_URL), иначе память процесса.
+rate_limiter = RateLimiter(redis_url=env('RATE_LIMIT_REDIS_URL'),
+                           max_keys=int(env('RATE_LIMIT_MAX_KEYS', '10000')))
+RATE_LIMIT_ENABLED = env('RATE_LIMIT_ENABLED', '1') != '0'
+RATE_LIMIT_IP = Rule.parse(env('RATE_LIMIT_IP', '5/60'))            # 5 форм, восполняются за минуту
+RATE_LIMIT_IDENTITY = Rule.parse(env('RATE_LIMIT_IDENTITY', '3/600'))  # на телефон / e-mail
+FORM_DEDUPE_TTL = float(env('FORM_DEDUPE_TTL', '600'))
+TRUST_PROXY = IS_SERVERLESS or env('TRUST_PROXY', '0') == '1'
+
+def client_ip() -> str:
+    """За прокси Vercel настоящий адрес клиента — первый в X-Forwarded-For."""
+    if TRUST_PROXY and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or "-"
+
+def form_guard(scope: str, identity, fields: tuple[str, ...]):
+    """
+    Дёшево отсечь злоупотребление до любой работы с БД/SMTP:
+    лимит на IP и на identity(form) (телефон/e-mail) → 429; повтор той же формы → «спасибо» без записи.
+    fields=() — без подавления дублей (только лимиты).
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return fn(*args, **kwargs)
+            who = identity(request.form)
+            wait = rate_limiter.check([(f"{scope}:ip:{client_ip()}", RATE_LIMIT_IP),
+                                       (f"{scope}:id:{who}" if who else None, RATE_LIMIT_IDENTITY)])
+            if wait:
+                retry = max(1, int(wait + 0.999))
+                print(f"[RATELIMIT] {scope}: 429 ip={client_ip()} retry={retry}s")
+                return Response("Слишком много заявок. Попробуйте позже.", 429,
+                                {"Retry-After": str(retry), "Content-Type": "text/plain; charset=utf-8"})
+            if fields and rate_limiter.duplicate(scope, [request.form.get(f) for f in fields], FORM_DEDUPE_TTL):
+                return redirect(url_for("thank_you"))
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
 # ───────────── Формы с сайта (нужны шаблонам!) ─────────────
 @app.route("/submit", methods=["POST"])
+@form_guard("lead", lambda form: normalize_phone(form.get("userPhone")), ("userName", "userPhone"))
 def submit_form():
-    name = request.form.get("userName")
-    phone = request.form.get("userPhone")
-    print(f"[FORM] Заявка: name={name!r} phone={phone!r}")
+    name = (request.form.get("userName") or "").strip()[:150]
+    phone_raw = (request.form.get("userPhone") or "").strip()[:50]
+    source = _lead_source(request.form.get("source") or request.referrer)
+    lead_buffer.add(name or None, normalize_phone(phone_raw)[:20] or None, phone_raw or None,
+                    source, flush=not LEADS_WRITE_BEHIND)
     return redirect(url_for("thank_you"))
 
+def _lead_source(value: str | None) -> str | None:
+    """Откуда заявка: 'ski-resort' из /ski-resort.html или явное значение поля source."""
+    if not value:
+        return None
+    path = value.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+    return (path.removesuffix(".html") or "index")[:50]
+
 @app.route("/submit-contact", methods=["POST"])
+@form_guard("contact", lambda form: (form.get("contact_email") or "").strip().lower(),
+            ("contact_email", "contact_subject", "contact_message"))
 def submit_contact_form():
     name = request.form.get('contact_name')
     email_from_user = request.form.get('contact_email')
     subject_from_user = request.form.get('contact_subject', 'Без темы')
     message_text = request.form.get('contact_message')
 
+    body = f"""
+    <html><body>
+        <h2>Сообщение с сайта СК "Алтайские Барсы"</h2>
+        <p><b>От:</b> {name} ({email_from_user})</p>
+        <p><b>Тема:</b> {subject_from_user}</p>
+        <hr>
+        <pre style="white-space:pre-wrap;">{message_text}</pre>
+    </body></html>
+    """
     try:
-        smtp_server = app.config['SMTP_SERVER']
-        smtp_port   = int(app.config['SMTP_PORT'])
-        smtp_user   = app.config['SMTP_USERNAME']
-        smtp_pass   = app.config['SMTP_PASSWORD']
-        email_to    = app.config['EMAIL_TO']
-
-        if all([smtp_server, smtp_port, smtp_user, smtp_pass, email_to]):
-            body = f"""
-            <html><body>
-                <h2>Сообщение с сайта СК "Алтайские Барсы"</h2>
-                <p><b>От:</b> {name} ({email_from_user})</p>
-                <p><b>Тема:</b> {subject_from_user}</p>
-                <hr>
-                <pre style="white-space:pre-wrap;">{message_text}</pre>
-            </body></html>
-            """
-            msg = MIMEText(body, 'html', 'utf-8')
-            msg['From'] = smtp_user
-            msg['To'] = email_to
-            msg['Subject'] = Header(f"Сообщение с сайта: {subject_from_user}", 'utf-8')
-            if email_from_user:
-                msg.add_header('Reply-To', email_from_user)
-
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.ehlo(); server.starttls(); server.ehlo()
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(smtp_user, email_to, msg.as_string())
-            server.quit()
-            print("[CONTACT] письмо отправлено")
-        else:
-            print("[CONTACT] SMTP не настроен — пропускаем отправку")
+        enqueue_email(app.config['EMAIL_TO'],
+                      f"Сообщение с сайта: {subject_from_user}",
+                      body, reply_to=email_from_user or None)
+        if outbox_worker:
+            outbox_worker.wake()
     except Exception as e:  # noqa: BLE001
-        print(f"[CONTACT] ошибка отправки письма: {e}")
+        db.session.rollback()
+        print(f"[CONTACT] не удалось сохранить письмо: {e}")
+
+    return redirect(url_for("thank_you"))
 
+# ───────────── Запись на занятие (api/booking.py) ─────────────
+@app.route("/book", methods=["POST"])
+# Без подавления дублей: отпечаток формы запоминался бы до записи, и повтор после
+# отказа (меньше мест) получал бы «спасибо» без брони. От двойной брони сверх
+# вместимости защищает условный UPDATE, от потока запросов — лимиты form_guard.
+@form_guard("booking", lambda form: normalize_phone(form.get("userPhone")), ())
+def book_session():
+    """Бронь мест: JSON-клиенту — 201 с бронью или ошибка с кодом, форме — «спасибо»."""
+    wants_json = request.accept_mimetypes.best == "application/json"
+    session_id = request.form.get("session_id", type=int)
+    seats = request.form.get("seats", 1, type=int)
+    name = (request.form.get("userName") or "").strip()[:150]
+    phone = normalize_phone(request.form.get("userPhone"))[:20]
+    try:
+        if not session_id or not phone:
+            raise booking.BookingError("Укажите занятие и телефон.", 400)
+        reservation = booking.book(session_id, seats, name or None, phone, booking.club_now(SCHEDULE_TZ))
+    except booking.BookingError as e:
+        print(f"[BOOKING] отказ: занятие {session_id}, мест {seats}: {e}")
+        if wants_json:
+            return {"error": str(e), "free": e.free}, e.status
+        return Response(str(e), e.status, {"Content-Type": "text/plain; charset=utf-8"})
+    if wants_json:
+        return {"id": reservation.id, "session_id": reservation.session_id, "seats": reservation.seats,
+                "status": reservation.status}, 201
     return redirect(url_for("thank_you"))
 
+# ───────────────────── Outbox (расписание) ──────────────────────
+@app.route("/cron/outbox")
+def cron_outbox():
+    auth = request.headers.get("Authorization", "")
+    if not (CRON_SECRET and auth == f"Bearer {CRON_SECRET}"):
+        return _need_auth()
+    connection = SmtpConnection(app.config)
+    try:
+        stats = drain_outbox(app.config, connection)
+    finally:
+        connection.close()
+    return stats, 200
+
+@app.cli.command("outbox-drain")
+def outbox_drain_command():
+    """Отправить все готовые письма из outbox."""
+    connection = SmtpConnection(app.config)
+    try:
+        print(drain_outbox(app.config, connection))
+    finally:
+        connection.close()
+
+# ───────────────── Медиа: уборка осиротевших файлов ─────────────────
+def reconcile_media(apply: bool, grace: float, batch_size: int) -> dict:
+    if media_uploader is None:
+        return {"error": "MEDIA_BACKEND не задан"}
+    report = media_uploader.reconcile(MEDIA_FIELDS, grace=grace, batch_size=batch_size, dry_run=not apply)
+    print(f"[MEDIA] уборка ({media_uploader.backend.name}): {report}")
+    return report
+
+@app.route("/cron/media-reconcile")
+def cron_media_reconcile():
+    auth = request.headers.get("Authorization", "")
+    if not (CRON_SECRET and auth == f"Bearer {CRON_SECRET}"):
+        return _need_auth()
+    return reconcile_media(apply=True, grace=MEDIA_ORPHAN_GRACE,
+                           batch_size=int(env('MEDIA_RECONCILE_BATCH', '100'))), 200
+
+@app.cli.command("media-reconcile")
+@click.option("--apply", is_flag=True, help="удалять (без флага — только показать, что будет удалено)")
+@click.option("--grace", default=MEDIA_ORPHAN_GRACE, show_default=True, help="не трогать файлы моложе N секунд")
+@click.option("--batch", default=100, show_default=True, help="файлов на один вызов удаления")
+def media_reconcile_command(apply, grace, batch):
+    """Найти (и с --apply удалить) файлы, на которые не ссылается ни одна запись."""
+    reconcile_media(apply, grace, batch)
+
+# Каждую ночь (vercel.json → crons) горизонт сдвигается на день вперёд
+def generate_schedule() -> dict:
+    report = booking.generate_sessions(booking.club_now(SCHEDULE_TZ), SCHEDULE_HORIZON_DAYS)
+    print(f"[BOOKING] расписание на {SCHEDULE_HORIZON_DAYS} дн.: {report}")
+    return report
+
+@app.route("/cron/schedule")
+def cron_schedule():
+    auth = request.headers.get("Authorization", "")
+    if not (CRON_SECRET and auth == f"Bearer {CRON_SECRET}"):
+        return _need_auth()
+    return generate_schedule(), 200
+
+@app.cli.command("schedule-generate")
+def schedule_generate_command():
+    """Создать занятия по правилам расписания на SCHEDULE_HORIZON_DAYS дней вперёд."""
+    generate_schedule()
+
+@app.cli.command("booking-cancel")
+@click.argument("booking_id", type=int)
+def booking_cancel_command(booking_id):
+    """Отменить бронь и вернуть места занятию."""
+    try:
+        reservation = booking.cancel(booking_id)
+    except booking.BookingError as e:
+        raise click.ClickException(str(e)) from None
+    print(f"Бронь {reservation.id} отменена, освобождено мест: {reservation.seats}")
+
 # ───────────────────────── Админ-панель ──────────────────────────
 @app.route("/admin")
 @requires_admin
 def admin_root():
     return redirect(url_for("admin_coaches_list"))
 
+@app.route("/admin/metrics")
+@requires_admin
+def admin_metrics():
+    """Задержки и число SQL-запросов по endpoint'ам (с момента старта инстанса)."""
+    return {
+        "query_budget": metrics.query_budget,
+        "startup_ms": STARTUP_TIMINGS,
+        "db_pool": {"mode": DB_POOL_MODE, **pool_metrics.snapshot(db.engine)},
+        "templates": {"bytecode": jinja_bytecode.stats if jinja_bytecode else None,
+                      "fragments": fragment_cache.snapshot()},
+        "compression": compressor.snapshot(),
+        "media": media_uploader.snapshot() if media_uploader else None,
+        "rate_limit": rate_limiter.snapshot(),
+        "endpoints": metrics.snapshot(),
+    }
+
+@app.route("/admin/search")
+@requires_admin
+def admin_search():
+    q = request.args.get("q", "").strip()[:200]
+    hits = _search_hits(q, limit=100) if q else []
+    return render_template("admin/admin_search.html", title="Поиск по новостям и курсам", q=q, hits=hits)
+
+# --- Заявки ---
+LEADS_PER_PAGE = int(env('LEADS_PER_PAGE', '50'))
+
+@app.route("/admin/leads")
+@requires_admin
+def admin_leads_list():
+    lead_buffer.flush()   # показать и то, что ещё лежит в буфере
+    page = keyset_paginate(Lead.query, Lead.created_at, Lead.id,
+                           cursor=request.args.get("cursor"), per_page=LEADS_PER_PAGE)
+    return templating.stream_response("admin/admin_leads_list.html", title="Заявки",
+                                      leads=page.items, page=page, total=db.session.query(db.func.count(Lead.id)).scalar())
+
+@app.route("/admin/leads.csv")
+@requires_admin
+def admin_leads_export():
+    lead_buffer.flush()
+    spec = bulk.BulkSpec(Lead, ("created_at", "name", "phone", "phone_raw", "source"))
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    return Response(stream_with_context(bulk.export_csv(spec)), mimetype="text/csv", headers={
+        "Content-Disposition": f'attachment; filename="leads-{stamp}.csv"',
+    })
+
+@app.route("/admin/bookings.csv")
+@requires_admin
+def admin_bookings_export():
+    spec = bulk.BulkSpec(Booking, ("created_at", "session_id", "name", "phone", "seats", "status"))
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    return Response(stream_with_context(bulk.export_csv(spec)), mimetype="text/csv", headers={
+        "Content-Disposition": f'attachment; filename="bookings-{stamp}.csv"',
+    })
+
+# --- Массовый импорт / экспорт (api/bulk.py) ---
+def _reindex_after_import(kind: str, body_attr: str):
+    def hook(records: list[dict]) -> None:
+        search.safe_index(search.index_documents, kind,
+                          [(r["id"], r["title"], r[body_attr]) for r in records])
+    return hook
+
+def _schedule_rule_defaults(rule: ScheduleRule) -> None:
+    rule.duration_min = rule.duration_min or 60
+    rule.active = True if rule.active is None else rule.active
+
+BULK_SPECS = {
+    "services": bulk.BulkSpec(
+        Service, ("name", "section", "price", "duration", "description"),
+        required=("name", "section", "price"), natural_key=("name", "section"),
+        converters={"price": bulk.to_price, "section": bulk.to_section}),
+    "coaches": bulk.BulkSpec(
+        Coach, ("name", "section", "experience", "specialization", "photo_path"),
+        required=("name", "section"), natural_key=("name", "section"),
+        converters={"section": bulk.to_section}),
+    "courses": bulk.BulkSpec(
+        Course, ("title", "youtube_id", "description"),
+        required=("title", "youtube_id"), natural_key=("youtube_id",),
+        after_import=_reindex_after_import("course", "description")),
+    "news": bulk.BulkSpec(
+        NewsArticle, ("title", "pub_date", "content", "image_path"),
+        required=("title", "content"),
+        converters={"pub_date": bulk.to_datetime},
+        prepare=NewsArticle.render_content,
+        after_import=_reindex_after_import("news", "content")),
+    # правила расписания: после импорта сразу создаются/подтягиваются занятия (api/booking.py)
+    "schedule": bulk.BulkSpec(
+        ScheduleRule, ("service_id", "coach_id", "weekday", "start_time", "duration_min", "capacity",
+                       "valid_from", "valid_until", "active"),
+        required=("service_id", "weekday", "start_time", "capacity"),
+        converters={"service_id": bulk.to_int, "coach_id": bulk.to_int,
+                    "weekday": bulk.int_in(0, 6),             # 0 — понедельник … 6 — воскресенье
+                    "start_time": bulk.to_time, "duration_min": bulk.int_in(5, 24 * 60),
+                    "capacity": bulk.int_in(1), "valid_from": bulk.to_date, "valid_until": bulk.to_date,
+                    "active": bulk.to_bool},
+        prepare=_schedule_rule_defaults, after_import=lambda records: generate_schedule()),
+}
+BULK_KINDS = {"services": "service", "coaches": "coach", "courses": "course", "news": "news"}
+BULK_BATCH_SIZE = int(env('BULK_BATCH_SIZE', str(bulk.BATCH_SIZE)))
+
+@app.route("/admin/bulk", methods=["GET", "POST"])
+@requires_admin
+def admin_bulk():
+    report = None
+    if request.method == "POST":
+        kind = request.form.get("kind")
+        upload = request.files.get("file")
+        if kind not in BULK_SPECS or not upload or not upload.filename:
+            return render_template("admin/admin_bulk.html", title="Импорт и экспорт",
+                                   kinds=BULK_SPECS, error="Выберите раздел и файл.")
+        is_json = upload.filename.lower().endswith((".json", ".jsonl", ".ndjson"))
+        rows = bulk.iter_json(upload.stream) if is_json else bulk.iter_csv(upload.stream)
+        report = bulk.import_rows(BULK_SPECS[kind], kind, rows,
+                                  dry_run=bool(request.form.get("dry_run")),
+                                  batch_size=BULK_BATCH_SIZE)
+        if (report.created or report.updated) and not report.dry_run and kind in BULK_KINDS:
+            content_changed(BULK_KINDS[kind])
+        if request.accept_mimetypes.best == "application/json":
+            return report.as_dict()
+    return render_template("admin/admin_bulk.html", title="Импорт и экспорт",
+                           kinds=BULK_SPECS, report=report)
+
+@app.route("/admin/bulk/export/<kind>.<fmt>")
+@requires_admin
+def admin_bulk_export(kind: str, fmt: str):
+    if kind not in BULK_SPECS or fmt not in ("csv", "json"):
+        abort(404)
+    spec = BULK_SPECS[kind]
+    body = bulk.export_csv(spec) if fmt == "csv" else bulk.export_json(spec)
+    mimetype = "text/csv" if fmt == "csv" else "application/json"
+    stamp = datetime.utcnow().strftime("%Y%m%d")
+    return Response(stream_with_context(body), mimetype=mimetype, headers={
+        "Content-Disposition": f'attachment; filename="{kind}-{stamp}.{fmt}"',
+    })
+
+# --- Списки админки: фильтры, сортировка, страницы (api/adminlist.py) ---
+COURSES_LIST = ListSpec(
+    Course, sorts={"id": Course.id, "title": Course.title}, default_sort="id", default_desc=True,
+    search=(Course.title, Course.youtube_id))
+COACHES_LIST = ListSpec(
+    Coach, sorts={"id": Coach.id, "name": Coach.name, "section": Coach.section}, default_sort="name",
+    search=(Coach.name, Coach.specialization), section_col=Coach.section)
+SERVICES_LIST = ListSpec(
+    Service, sorts={"id": Service.id, "name": Service.name, "price": Service.price,
+                    "section": Service.section}, default_sort="name",
+    search=(Service.name,), section_col=Service.section, price_col=Service.price,
+    flags={"duration": ("только с длительностью", Service.duration.isnot(None) & (Service.duration != "")),
+           "description": ("только с описанием", Service.description.isnot(None) & (Service.description != ""))})
+NEWS_ADMIN_LIST = ListSpec(
+    NewsArticle, sorts={"pub_date": NewsArticle.pub_date, "title": NewsArticle.title, "id": NewsArticle.id},
+    default_sort="pub_date", default_desc=True, search=(NewsArticle.title,),
+    flags={"image": ("только с картинкой", NewsArticle.image_path.isnot(None))},
+    options=(db.load_only(NewsArticle.id, NewsArticle.title, NewsArticle.pub_date,
+                          NewsArticle.image_path, NewsArticle.image_status),))
+SECTION_LABELS = {"ski": "Горнолыжная база", "gym": "Тренажерный зал"}
+
 # --- Курсы (админка) ---
 @app.route("/admin/courses")
 @requires_admin
 def admin_courses_list():
-    items = Course.query.order_by(Course.id.desc()).all()
-    return render_template("admin/admin_courses_list.html",
-                           title="Управление курсами", courses=items)
+    lst = admin_list(COURSES_LIST, request.args, per_page=ADMIN_PER_PAGE)
+    return templating.stream_response("admin/admin_courses_list.html",
+                                      title="Управление курсами", courses=lst.items, lst=lst)
 
 @app.route("/admin/courses/add", methods=["GET", "POST"])
 @requires_admin
 def admin_add_course():
     if request.method == "POST":
         title = request.form.get("title", "").strip()
-        youtube_id = request.form.get("youtube_id", "").strip()
+        youtube_id = youtube.parse_id(request.form.get("youtube_id"))
         description = request.form.get("description", "").strip()
 
         if not title or not youtube_id:
             return render_template("admin/admin_course_form.html",
                                    title="Ошибка: заполните обязательные поля",
                                    form_action=url_for("admin_add_course"),
-                                   error="Название и YouTube ID обязательны.")
+                                   error="Название и YouTube ID (или ссылка на видео) обязательны.")
 
-        db.session.add(Course(title=title, youtube_id=youtube_id, description=description))
+        course = Course(title=title, youtube_id=youtube_id, description=description,
+                        thumbnail=youtube.thumbnails(youtube_id))
+        db.session.add(course)
         db.session.commit()
+        content_changed("course")
+        search.safe_index(search.index_document, "course", course.id, course.title, course.description)
         return redirect(url_for("admin_courses_list"))
 
     return render_template("admin/admin_course_form.html",
@@ -360,17 +1247,23 @@ def admin_edit_course(course_id):
     course = Course.query.get_or_404(course_id)
 
     if request.method == "POST":
+        youtube_id = youtube.parse_id(request.form.get("youtube_id"))
         course.title = request.form.get("title", "").strip()
-        course.youtube_id = request.form.get("youtube_id", "").strip()
         course.description = request.form.get("description", "").strip()
 
-        if not course.title or not course.youtube_id:
+        if not course.title or not youtube_id:
+            course.youtube_id = request.form.get("youtube_id", "").strip()
             return render_template("admin/admin_course_form.html",
                                    title="Ошибка: заполните обязательные поля",
                                    course=course,
                                    form_action=url_for("admin_edit_course", course_id=course.id),
-                                   error="Название и YouTube ID обязательны.")
+                                   error="Название и YouTube ID (или ссылка на видео) обязательны.")
+        if youtube_id != course.youtube_id or not (course.thumbnail or {}).get("checked"):
+            course.thumbnail = youtube.thumbnails(youtube_id)
+        course.youtube_id = youtube_id
         db.session.commit()
+        content_changed("course")
+        search.safe_index(search.index_document, "course", course.id, course.title, course.description)
         return redirect(url_for("admin_courses_list"))
 
     return render_template("admin/admin_course_form.html",
@@ -384,15 +1277,18 @@ def admin_delete_course(course_id):
     course = Course.query.get_or_404(course_id)
     db.session.delete(course)
     db.session.commit()
+    content_changed("course")
+    search.safe_index(search.remove_document, "course", course_id)
     return redirect(url_for("admin_courses_list"))
 
 # --- Тренеры ---
 @app.route('/admin/coaches')
 @requires_admin
 def admin_coaches_list():
-    coaches = Coach.query.order_by(Coach.name).all()
-    return render_template('admin/admin_coaches_list.html',
-                           coaches=coaches, title="Управление тренерами")
+    lst = admin_list(COACHES_LIST, request.args, per_page=ADMIN_PER_PAGE)
+    return templating.stream_response('admin/admin_coaches_list.html',
+                                      coaches=lst.items, lst=lst, sections=SECTION_LABELS,
+                                      title="Управление тренерами")
 
 @app.route('/admin/coaches/add', methods=['GET', 'POST'])
 @requires_admin
@@ -403,20 +1299,20 @@ def admin_add_coach():
         specialization = request.form.get('specialization')
         section = request.form.get('section')
 
-        img = store_image(request.files.get('photo_file'), COACHES_SUB, 'coaches')
-        photo_url = img['url'] if img else None
-
         if not name or not section:
             return render_template('admin/admin_coach_form.html',
                                    title="Ошибка: Заполните поля",
                                    form_action=url_for('admin_add_coach'),
                                    error="Имя и секция обязательны.")
 
-        db.session.add(Coach(
-            name=name, experience=experience, specialization=specialization,
-            section=section, photo_path=photo_url
-        ))
+        coach = Coach(name=name, experience=experience, specialization=specialization, section=section)
+        upload = take_upload(request.files.get('photo_file'), COACH_PHOTO)
+        token = media_uploader.mark_pending(coach, COACH_PHOTO) if upload else None
+        db.session.add(coach)
         db.session.commit()
+        content_changed("coach")
+        if upload:
+            media_uploader.enqueue(COACH_PHOTO, coach.id, token, upload)
         return redirect(url_for('admin_coaches_list'))
 
     return render_template('admin/admin_coach_form.html',
@@ -433,11 +1329,14 @@ def admin_edit_coach(coach_id: int):
         coach.specialization = request.form.get('specialization')
         coach.section = request.form.get('section')
 
-        img = store_image(request.files.get('photo_file'), COACHES_SUB, 'coaches')
-        if img:
-            coach.photo_path = img['url']
+        # старое фото остаётся на сайте, пока новое не загружено; затем удаляется
+        upload = take_upload(request.files.get('photo_file'), COACH_PHOTO)
+        token = media_uploader.mark_pending(coach, COACH_PHOTO) if upload else None
 
         db.session.commit()
+        content_changed("coach")
+        if upload:
+            media_uploader.enqueue(COACH_PHOTO, coach.id, token, upload)
         return redirect(url_for('admin_coaches_list'))
 
     return render_template('admin/admin_coach_form.html',
@@ -449,19 +1348,23 @@ def admin_edit_coach(coach_id: int):
 @requires_admin
 def admin_delete_coach(coach_id: int):
     coach = Coach.query.get_or_404(coach_id)
+    refs = media_uploader.refs(coach, COACH_PHOTO) if media_uploader else []
     db.session.delete(coach)
     db.session.commit()
+    content_changed("coach")
+    if media_uploader:
+        media_uploader.discard(refs)
     return redirect(url_for('admin_coaches_list'))
 
 # --- Услуги ---
 @app.route('/admin/services')
 @requires_admin
 def admin_services_list():
-    services_ski = Service.query.filter_by(section='ski').order_by(Service.name).all()
-    services_gym = Service.query.filter_by(section='gym').order_by(Service.name).all()
-    return render_template('admin/admin_services_list.html',
-                           services_ski=services_ski, services_gym=services_gym,
-                           title="Управление услугами")
+    # одна выборка по обеим секциям; секция — фильтр, а не отдельный запрос
+    lst = admin_list(SERVICES_LIST, request.args, per_page=ADMIN_PER_PAGE)
+    return templating.stream_response('admin/admin_services_list.html',
+                                      services=lst.items, lst=lst, sections=SECTION_LABELS,
+                                      title="Управление услугами")
 
 @app.route('/admin/services/add', methods=['GET', 'POST'])
 @requires_admin
@@ -493,6 +1396,7 @@ def admin_add_service():
             duration=duration, section=section
         ))
         db.session.commit()
+        content_changed("service")
         return redirect(url_for('admin_services_list'))
 
     return render_template('admin/admin_service_form.html',
@@ -528,6 +1432,7 @@ def admin_edit_service(service_id: int):
                                    error=f"Цена должна быть положительным числом. {e}")
 
         db.session.commit()
+        content_changed("service")
         return redirect(url_for('admin_services_list'))
 
     return render_template('admin/admin_service_form.html',
@@ -539,17 +1444,24 @@ def admin_edit_service(service_id: int):
 @requires_admin
 def admin_delete_service(service_id: int):
     service = Service.query.get_or_404(service_id)
+    # занятия и брони удаляются каскадом — живые брони клиентов так не теряем
+    seats = booking.upcoming_seats(service_id, booking.club_now(SCHEDULE_TZ))
+    if seats:
+        return Response(f"Нельзя удалить услугу «{service.name}»: на будущие занятия записано мест — {seats}. "
+                        "Сначала отмените брони (flask booking-cancel) или дождитесь занятий.",
+                        409, {"Content-Type": "text/plain; charset=utf-8"})
     db.session.delete(service)
     db.session.commit()
+    content_changed("service")
     return redirect(url_for('admin_services_list'))
 
 # --- Новости ---
 @app.route('/admin/news')
 @requires_admin
 def admin_news_list():
-    news = NewsArticle.query.order_by(NewsArticle.pub_date.desc()).all()
-    return render_template('admin/admin_news_list.html',
-                           articles=news, title="Управление новостями")
+    lst = admin_list(NEWS_ADMIN_LIST, request.args, per_page=ADMIN_NEWS_PER_PAGE)
+    return templating.stream_response('admin/admin_news_list.html',
+                                      articles=lst.items, lst=lst, title="Управление новостями")
 
 @app.route('/admin/news/add', methods=['GET', 'POST'])
 @requires_admin
@@ -563,11 +1475,16 @@ def admin_add_news():
                                    form_action=url_for('admin_add_news'),
                                    error="Заголовок и текст новости обязательны.")
 
-        img = store_image(request.files.get('image_file'), NEWS_SUB, 'news')
-        img_url = img['url'] if img else None
-
-        db.session.add(NewsArticle(title=title, content=content, image_path=img_url))
+        article = NewsArticle(title=title, content=content)
+        article.render_content()
+        upload = take_upload(request.files.get('image_file'), NEWS_IMAGE)
+        token = media_uploader.mark_pending(article, NEWS_IMAGE) if upload else None
+        db.session.add(article)
         db.session.commit()
+        content_changed("news", ref_id=article.id)
+        search.safe_index(search.index_document, "news", article.id, article.title, article.content)
+        if upload:
+            media_uploader.enqueue(NEWS_IMAGE, article.id, token, upload)
         return redirect(url_for('admin_news_list'))
 
     return render_template('admin/admin_news_form.html',
@@ -582,17 +1499,20 @@ def admin_edit_news(article_id: int):
         article.title = request.form.get('title')
         article.content = request.form.get('content')
 
-        img = store_image(request.files.get('image_file'), NEWS_SUB, 'news')
-        if img:
-            article.image_path = img['url']
-
         if not article.title or not article.content:
             return render_template('admin/admin_news_form.html',
                                    title="Ошибка: Заполните заголовок и текст",
                                    form_action=url_for('admin_edit_news', article_id=article_id),
                                    article=article,
                                    error="Заголовок и текст новости обязательны.")
+        article.render_content()
+        upload = take_upload(request.files.get('image_file'), NEWS_IMAGE)
+        token = media_uploader.mark_pending(article, NEWS_IMAGE) if upload else None
         db.session.commit()
+        content_changed("news", ref_id=article.id)
+        search.safe_index(search.index_document, "news", article.id, article.title, article.content)
+        if upload:
+            media_uploader.enqueue(NEWS_IMAGE, article.id, token, upload)
         return redirect(url_for('admin_news_list'))
 
     return render_template('admin/admin_news_form.html',
@@ -604,10 +1524,19 @@ def admin_edit_news(article_id: int):
 @requires_admin
 def admin_delete_news(article_id: int):
     article = NewsArticle.query.get_or_404(article_id)
+    refs = media_uploader.refs(article, NEWS_IMAGE) if media_uploader else []
     db.session.delete(article)
     db.session.commit()
+    content_changed("news", ref_id=article_id)
+    search.safe_index(search.remove_document, "news", article_id)
+    if media_uploader:
+        media_uploader.discard(refs)
     return redirect(url_for('admin_news_list'))
 
+_mark("ready")
+if IS_SERVERLESS:
+    print("[STARTUP]", " ".join(f"{k}={v}ms" for k, v in STARTUP_TIMINGS.items()))
+
 # ─────────────────────────── Локальный запуск ───────────────────
 if __name__ == "__main__":
     app.run(debug=True)
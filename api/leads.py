@@ -0,0 +1,100 @@
+# api/leads.py
+"""
+Приём заявок с формы /submit через write-behind буфер.
+
+Обработчик формы только кладёт строку в память (deque под локом) — без
+обращения к БД. Фоновый поток сбрасывает буфер многострочным INSERT:
+когда набралось batch_size заявок или прошло flush_interval секунд.
+Так всплеск трафика во время промо-акции превращается в редкие пачечные
+INSERT вместо commit на каждый запрос.
+
+Если запись в БД не удалась, строки возвращаются в начало буфера (в пределах
+max_pending) и уйдут со следующей попыткой. При остановке процесса буфер
+сбрасывается через atexit.
+
+На serverless поток между вызовами заморожен — там буфер не запускают
+и заявка пишется сразу (см. add(..., flush=True) в api/index.py).
+"""
+import atexit
+import threading
+from collections import deque
+from datetime import datetime
+
+from api.models import Lead, db
+
+
+class LeadBuffer:
+    def __init__(self, app, batch_size: int = 100, flush_interval: float = 2.0,
+                 max_pending: int = 10000):
+        self.app = app
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._rows: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()           # один сброс за раз
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.flushed = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lead-buffer", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def add(self, name: str | None, phone: str | None, phone_raw: str | None,
+            source: str | None, flush: bool = False) -> None:
+        row = {"created_at": datetime.utcnow(), "name": name, "phone": phone,
+               "phone_raw": phone_raw, "source": source}
+        with self._lock:
+            if len(self._rows) >= self.max_pending:
+                self._rows.popleft()
+                self.dropped += 1
+            self._rows.append(row)
+            full = len(self._rows) >= self.batch_size
+        if flush or self._thread is None:
+            self.flush()
+        elif full:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def flush(self) -> int:
+        """Записать всё накопленное (пачками по batch_size). Возвращает число строк."""
+        written = 0
+        with self._flush_lock, self.app.app_context():
+            while True:
+                with self._lock:
+                    n = min(self.batch_size, len(self._rows))
+                    batch = [self._rows.popleft() for _ in range(n)]
+                if not batch:
+                    break
+                try:
+                    db.session.execute(db.insert(Lead), batch)
+                    db.session.commit()
+                except Exception as e:  # noqa: BLE001
+                    db.session.rollback()
+                    self._requeue(batch)
+                    print(f"[LEADS] не удалось записать {len(batch)} заявок: {e}")
+                    break
+                written += len(batch)
+        self.flushed += written
+        return written
+
+    def _requeue(self, batch: list[dict]) -> None:
+        with self._lock:
+            room = self.max_pending - len(self._rows)
+            keep = batch[-room:] if room > 0 else []
+            self.dropped += len(batch) - len(keep)
+            self._rows.extendleft(reversed(keep))
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self.pending():
+                self.flush()
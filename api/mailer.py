@@ -0,0 +1,227 @@
+# api/mailer.py
+"""
+Outbox для писем с сайта.
+
+Запрос только сохраняет письмо в outbox_messages и сразу отвечает.
+Отправкой занимается drain_outbox(): берёт пачку pending-писем и шлёт их
+через одно переиспользуемое SMTP-соединение (STARTTLS + login один раз).
+Неудачные попытки откладываются с экспоненциальным backoff, после
+OUTBOX_MAX_ATTEMPTS письмо переходит в статус 'dead'.
+
+Где запускать drain_outbox():
+  • локально / на обычном сервере — фоновый поток OutboxWorker (будится после enqueue);
+  • на serverless — по расписанию: GET /cron/outbox или `flask --app api.index outbox-drain`.
+
+Повторы, backoff, dead-letter и lease проверяются против SMTP-заглушки:
+python bench/checks.py outbox_retry_dead_letter outbox_lease_reclaim.
+
+smtplib/email импортируются внутри функций: публичным страницам они не нужны,
+а на serverless каждый лишний импорт — это время cold start.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from api.metrics import external_call
+from api.models import db, OutboxMessage
+
+
+def enqueue_email(to_addr: str, subject: str, body_html: str, reply_to: str | None = None) -> OutboxMessage:
+    msg = OutboxMessage(to_addr=to_addr, subject=subject, body_html=body_html, reply_to=reply_to)
+    db.session.add(msg)
+    db.session.commit()
+    return msg
+
+
+def smtp_configured(config) -> bool:
+    return bool(config['SMTP_SERVER'] and config['SMTP_PORT'] and config['EMAIL_TO']
+                and (config['SMTP_FROM'] or config['SMTP_USERNAME']))
+
+
+class SmtpConnection:
+    """
+    Одно SMTP-соединение на процесс. Перед отправкой проверяем его NOOP'ом,
+    при обрыве — переподключаемся; простаивающее дольше idle_timeout закрываем.
+    """
+
+    def __init__(self, config, idle_timeout: float = 60):
+        self.config = config
+        self.idle_timeout = idle_timeout
+        self._server = None  # smtplib.SMTP
+        self._last_used = 0.0
+
+    def get(self):
+        import smtplib
+
+        if self._server is not None:
+            idle = time.monotonic() - self._last_used > self.idle_timeout
+            try:
+                alive = not idle and self._server.noop()[0] == 250
+            except smtplib.SMTPException:
+                alive = False
+            if not alive:
+                self.close()
+        if self._server is None:
+            with external_call("smtp"):
+                self._server = self._connect()
+        self._last_used = time.monotonic()
+        return self._server
+
+    def _connect(self):
+        import smtplib
+
+        cfg = self.config
+        server = smtplib.SMTP(cfg['SMTP_SERVER'], int(cfg['SMTP_PORT']), timeout=cfg['SMTP_TIMEOUT'])
+        server.ehlo()
+        if cfg['SMTP_STARTTLS']:
+            server.starttls()
+            server.ehlo()
+        if cfg['SMTP_USERNAME']:
+            server.login(cfg['SMTP_USERNAME'], cfg['SMTP_PASSWORD'])
+        return server
+
+    def close(self) -> None:
+        import smtplib
+
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+def _build_mime(msg: OutboxMessage, sender: str, to_addr: str):
+    from email.header import Header
+    from email.mime.text import MIMEText
+
+    mime = MIMEText(msg.body_html, 'html', 'utf-8')
+    mime['From'] = sender
+    mime['To'] = to_addr
+    mime['Subject'] = Header(msg.subject, 'utf-8')
+    if msg.reply_to:
+        mime.add_header('Reply-To', msg.reply_to)
+    return mime
+
+
+def _claim(msg_id: int, now: datetime, lease: timedelta) -> bool:
+    """Помечает письмо 'sending'; False — его уже забрал другой воркер."""
+    claimed = (OutboxMessage.query
+               .filter(OutboxMessage.id == msg_id,
+                       db.or_(OutboxMessage.status == "pending",
+                              db.and_(OutboxMessage.status == "sending",
+                                      OutboxMessage.locked_at < now - lease)))
+               .update({OutboxMessage.status: "sending",
+                        OutboxMessage.locked_at: now,
+                        OutboxMessage.attempts: OutboxMessage.attempts + 1},
+                       synchronize_session=False))
+    db.session.commit()
+    return claimed == 1
+
+
+def drain_outbox(config, connection: SmtpConnection, limit: int | None = None) -> dict:
+    """
+    Отправляет готовые к отправке письма пачками по OUTBOX_BATCH_SIZE.
+    Возвращает счётчики {"sent": n, "retry": n, "dead": n}.
+    """
+    import smtplib
+
+    stats = {"sent": 0, "retry": 0, "dead": 0}
+    if not smtp_configured(config):
+        return stats
+
+    batch_size = config['OUTBOX_BATCH_SIZE']
+    max_attempts = config['OUTBOX_MAX_ATTEMPTS']
+    base_delay = config['OUTBOX_RETRY_BASE']
+    lease = timedelta(minutes=10)   # зависшие в 'sending' (упал воркер) берём повторно
+    sender = config['SMTP_FROM'] or config['SMTP_USERNAME']
+    processed = 0
+
+    while limit is None or processed < limit:
+        now = datetime.utcnow()
+        ids = [row.id for row in (
+            OutboxMessage.query
+            .with_entities(OutboxMessage.id)
+            .filter(db.or_(db.and_(OutboxMessage.status == "pending",
+                                   OutboxMessage.next_attempt_at <= now),
+                           db.and_(OutboxMessage.status == "sending",
+                                   OutboxMessage.locked_at < now - lease)))
+            .order_by(OutboxMessage.id)
+            .limit(batch_size)
+            .all())]
+        if not ids:
+            break
+
+        for msg_id in ids:
+            if not _claim(msg_id, now, lease):
+                continue
+            processed += 1
+            msg = db.session.get(OutboxMessage, msg_id)
+            if msg.attempts > max_attempts:
+                # повторно забрано по lease: воркер падал на этом письме раз за разом
+                msg.status, msg.last_error = "dead", msg.last_error or "воркер не завершил отправку"
+                stats["dead"] += 1
+                print(f"[OUTBOX] письмо {msg.id} снято после {msg.attempts - 1} попыток без результата")
+                db.session.commit()
+                continue
+            try:
+                # EMAIL_TO мог быть не задан в момент отправки формы
+                to_addr = msg.to_addr or config['EMAIL_TO']
+                server = connection.get()
+                with external_call("smtp"):
+                    server.sendmail(sender, [to_addr], _build_mime(msg, sender, to_addr).as_string())
+                msg.status, msg.sent_at, msg.last_error = "sent", datetime.utcnow(), None
+                stats["sent"] += 1
+            except Exception as e:  # noqa: BLE001 — любая ошибка письма: повтор, затем 'dead'
+                if isinstance(e, (smtplib.SMTPException, OSError)):
+                    connection.close()
+                else:
+                    # нет адреса, не собрался MIME и т.п. — не вечный 'sending', а попытка
+                    e = f"{e.__class__.__name__}: {e}"
+                msg.last_error = str(e)[:1000]
+                if msg.attempts >= max_attempts:
+                    msg.status = "dead"
+                    stats["dead"] += 1
+                    print(f"[OUTBOX] письмо {msg.id} не отправлено после {msg.attempts} попыток: {e}")
+                else:
+                    delay = min(base_delay * 2 ** (msg.attempts - 1), 3600)
+                    msg.status = "pending"
+                    msg.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+                    stats["retry"] += 1
+            db.session.commit()
+
+        if len(ids) < batch_size:
+            break
+    return stats
+
+
+class OutboxWorker:
+    """Фоновый поток: разбирает outbox после enqueue и раз в poll_interval секунд."""
+
+    def __init__(self, app, poll_interval: float = 30):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.connection = SmtpConnection(app.config)
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+            self._thread.start()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    stats = drain_outbox(self.app.config, self.connection)
+                    if any(stats.values()):
+                        print(f"[OUTBOX] {stats}")
+                except Exception as e:  # noqa: BLE001
+                    db.session.rollback()
+                    print(f"[OUTBOX] ошибка воркера: {e}")
@@ -0,0 +1,409 @@
+# api/media.py
+"""
+Загрузка картинок из админки вне запроса и уборка осиротевших файлов.
+
+Раньше store_image() грузил файл в Cloudinary прямо в обработчике формы,
+и админ ждал ответа облака; старые и удалённые фото не удалялись никогда.
+
+Теперь:
+  • обработчик только читает файл (read_upload), сохраняет запись со статусом
+    «pending:<токен>» (Coach.photo_status / NewsArticle.image_status) и отдаёт
+    задачу MediaUploader — пулу потоков;
+  • поток делает варианты (api/images.py), загружает оригинал в бэкенд и
+    записывает путь/варианты в запись, только если её статус всё ещё равен его
+    токену: повторная правка во время загрузки «перебивает» старую задачу,
+    а её файл сразу удаляется. Старое фото записи удаляется после замены;
+  • неудачная загрузка ставит статус «failed» (запись остаётся со старым фото);
+  • reconcile() сверяет файлы в бэкенде со ссылками из БД и удаляет
+    неиспользуемые пачками — так убирается и то, что накопилось до этого.
+
+На serverless потоки замораживаются между вызовами — там пул не создаётся
+(workers=0) и задача выполняется сразу в запросе, тем же кодом.
+
+Бэкенды (MEDIA_BACKEND): cloudinary, local (static/), memory — фейк в памяти
+для тестов и локальной отладки без облака. Перебитая загрузка и уборка сирот
+проверяются на нём: python bench/checks.py media_superseded media_reconcile.
+На Vercel уборку раз в сутки вызывает /cron/media-reconcile (vercel.json → crons).
+"""
+import io
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Iterable, Iterator
+
+from werkzeug.utils import secure_filename
+
+from api import images
+from api.metrics import external_call
+from api.models import db
+
+PENDING = "pending:"
+FAILED = "failed"
+
+
+@dataclass
+class Upload:
+    data: bytes
+    filename: str
+    rel_subdir: str          # images/coaches — локальный каталог в static/
+    folder: str              # coaches — папка в облаке
+
+
+@dataclass
+class MediaField:
+    """Где у модели лежит картинка: путь/URL, варианты и статус загрузки."""
+    model: type
+    kind: str                # тип контента для content_changed
+    path: str                # photo_path
+    variants: str            # photo_variants
+    status: str              # photo_status
+    rel_subdir: str          # images/coaches — каталог в static/ (local)
+    folder: str              # coaches — папка в облаке
+
+
+def read_upload(file_storage, field: MediaField, allowed: Callable[[str], bool]) -> Upload | None:
+    if not file_storage or file_storage.filename == "" or not allowed(file_storage.filename):
+        return None
+    return Upload(file_storage.read(), file_storage.filename, field.rel_subdir, field.folder)
+
+
+# ───────────────────────── Бэкенды ─────────────────────────
+class LocalBackend:
+    """
+    Файлы в static/<rel_subdir>/; ссылка на файл — путь относительно static/.
+    В тех же каталогах лежат картинки из git (static/images/coaches/*.png) —
+    list() и delete() видят только файлы, созданные store(): <имя>-<8 hex>.<ext>
+    и их варианты <имя>-<8 hex>-<ширина>.<fmt>.
+    """
+    name = "local"
+    OWNED_RE = re.compile(r"-[0-9a-f]{8}(?:-\d+)?\.(?:png|jpe?g|gif|webp|avif)$")
+
+    def owns(self, ref: str) -> bool:
+        return bool(self.OWNED_RE.search(ref))
+
+    def __init__(self, static_folder: str):
+        self.static_folder = static_folder
+
+    def store(self, up: Upload, img, widths, formats) -> dict:
+        name, ext = os.path.splitext(up.filename)
+        # secure_filename выкидывает кириллицу; уникальный хвост — чтобы одинаковые имена не затирали друг друга
+        stem = f"{(secure_filename(name) or 'image')[:60]}-{uuid.uuid4().hex[:8]}"
+        local_dir = os.path.join(self.static_folder, up.rel_subdir)
+        os.makedirs(local_dir, exist_ok=True)
+        with open(os.path.join(local_dir, stem + ext.lower()), "wb") as fh:
+            fh.write(up.data)
+        variants = None
+        if img is not None and formats:
+            variants = images.save_local_variants(img, local_dir, up.rel_subdir, stem, widths, formats)
+        return {"url": f"{up.rel_subdir}/{stem}{ext.lower()}", "variants": variants}
+
+    def refs(self, path: str | None, variants: dict | None) -> list[str]:
+        if not path or path.startswith(("http://", "https://")):
+            return []
+        found = [path]
+        for items in (variants or {}).get("srcset", {}).values():
+            found.extend(url for url, _ in items)
+        return found
+
+    def prefix(self, field: MediaField) -> str:
+        return field.rel_subdir
+
+    def delete(self, refs: list[str]) -> int:
+        deleted = 0
+        root = os.path.realpath(self.static_folder)
+        for ref in refs:
+            path = os.path.realpath(os.path.join(root, ref))
+            if not path.startswith(root + os.sep) or not self.owns(ref):
+                continue
+            try:
+                os.remove(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    def list(self, prefixes: Iterable[str]) -> Iterator[tuple[str, float]]:
+        for prefix in prefixes:
+            local_dir = os.path.join(self.static_folder, prefix)
+            if not os.path.isdir(local_dir):
+                continue
+            for entry in os.scandir(local_dir):
+                if entry.is_file() and self.owns(entry.name):
+                    yield f"{prefix}/{entry.name}", entry.stat().st_mtime
+
+
+class CloudinaryBackend:
+    """
+    Оригинал в Cloudinary, варианты — трансформации URL (отдельных файлов нет).
+    Ссылка на файл — public_id; удаление и листинг — Admin API пачками по 100/500.
+    """
+    name = "cloudinary"
+
+    def __init__(self, get_module: Callable, root_folder: str = "vershina"):
+        self.get_module = get_module     # ленивый импорт cloudinary (cold start)
+        self.root_folder = root_folder
+
+    def store(self, up: Upload, img, widths, formats) -> dict:
+        cloudinary = self.get_module()
+        with external_call("cloudinary"):
+            res = cloudinary.uploader.upload(
+                io.BytesIO(up.data),
+                folder=f"{self.root_folder}/{up.folder.strip('/')}",
+                resource_type="image",
+                unique_filename=True,
+                overwrite=False,
+            )
+        variants = None
+        if img is not None and formats:
+            variants = images.cloudinary_variants(img, res.get("public_id"), widths, formats,
+                                                  cloudinary.utils.cloudinary_url)
+        return {"url": res.get("secure_url"), "variants": variants, "id": res.get("public_id")}
+
+    def refs(self, path: str | None, variants: dict | None) -> list[str]:
+        if variants and variants.get("id"):
+            return [variants["id"]]
+        public_id = public_id_from_url(path)
+        return [public_id] if public_id else []
+
+    def prefix(self, field: MediaField) -> str:
+        return f"{self.root_folder}/{field.folder.strip('/')}"
+
+    def delete(self, refs: list[str]) -> int:
+        cloudinary, deleted = self.get_module(), 0
+        for i in range(0, len(refs), 100):             # лимит Admin API на вызов
+            with external_call("cloudinary"):
+                res = cloudinary.api.delete_resources(refs[i:i + 100], resource_type="image",
+                                                      invalidate=True)
+            deleted += sum(1 for status in res.get("deleted", {}).values() if status == "deleted")
+        return deleted
+
+    def list(self, prefixes: Iterable[str]) -> Iterator[tuple[str, float]]:
+        cloudinary = self.get_module()
+        for prefix in prefixes:
+            cursor = None
+            while True:
+                with external_call("cloudinary"):
+                    res = cloudinary.api.resources(type="upload", resource_type="image", max_results=500,
+                                                   prefix=prefix + "/", next_cursor=cursor)
+                for item in res.get("resources", []):
+                    created = datetime.fromisoformat(item["created_at"].replace("Z", "+00:00"))
+                    yield item["public_id"], created.timestamp()
+                cursor = res.get("next_cursor")
+                if not cursor:
+                    break
+
+
+class MemoryBackend:
+    """Фейк облака в памяти: те же вызовы, без сети. Для тестов и отладки."""
+    name = "memory"
+
+    def __init__(self, base_url: str = "https://media.invalid"):
+        self.base_url = base_url
+        self.files: dict[str, tuple[bytes, float]] = {}
+        self.uploads = 0
+        self._lock = threading.Lock()
+
+    def store(self, up: Upload, img, widths, formats) -> dict:
+        public_id = f"{up.folder.strip('/')}/{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self.files[public_id] = (up.data, time.time())
+            self.uploads += 1
+        return {"url": f"{self.base_url}/{public_id}", "variants": None, "id": public_id}
+
+    def refs(self, path: str | None, variants: dict | None) -> list[str]:
+        prefix = self.base_url + "/"
+        return [path[len(prefix):]] if path and path.startswith(prefix) else []
+
+    def prefix(self, field: MediaField) -> str:
+        return field.folder.strip("/")
+
+    def delete(self, refs: list[str]) -> int:
+        with self._lock:
+            return sum(self.files.pop(ref, None) is not None for ref in refs)
+
+    def list(self, prefixes: Iterable[str]) -> Iterator[tuple[str, float]]:
+        with self._lock:
+            items = list(self.files.items())
+        for ref, (_, ts) in items:
+            if any(ref.startswith(p + "/") for p in prefixes):
+                yield ref, ts
+
+
+def public_id_from_url(url: str | None) -> str | None:
+    """https://res.cloudinary.com/<cloud>/image/upload/v123/vershina/coaches/abc.jpg → vershina/coaches/abc"""
+    if not url or "/upload/" not in url:
+        return None
+    tail = url.split("/upload/", 1)[1].split("?", 1)[0]
+    parts = tail.split("/")
+    if parts and parts[0].startswith("v") and parts[0][1:].isdigit():
+        parts = parts[1:]
+    return os.path.splitext("/".join(parts))[0] or None
+
+
+# ───────────────────────── Загрузчик ─────────────────────────
+class MediaUploader:
+    def __init__(self, app, backend, widths, formats: Callable[[], tuple], workers: int = 2,
+                 on_change: Callable | None = None):
+        """
+        formats() — форматы вариантов (Pillow грузится лениво, при первой загрузке).
+        on_change(kind, ref_id) — после записи нового фото (content_changed).
+        workers=0 — без пула: задача выполняется сразу в вызывающем потоке.
+        """
+        self.app = app
+        self.backend = backend
+        self.widths = widths
+        self.formats = formats
+        self.on_change = on_change
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="media") if workers else None
+        self._futures: set = set()
+        self._lock = threading.Lock()
+        self.stats = {"queued": 0, "stored": 0, "failed": 0, "superseded": 0, "deleted": 0, "in_flight": 0}
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"backend": self.backend.name, "async": self._pool is not None, **self.stats}
+
+    def _submit(self, fn, *args) -> None:
+        if self._pool is None:
+            fn(*args)
+            return
+        future = self._pool.submit(fn, *args)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future) -> None:
+        with self._lock:
+            self._futures.discard(future)
+        if future.exception():
+            print(f"[MEDIA] ошибка задачи: {future.exception()}")
+
+    def mark_pending(self, obj, field: MediaField) -> str:
+        """Поставить записи статус ожидания загрузки; вызывать до commit."""
+        token = PENDING + uuid.uuid4().hex[:12]
+        setattr(obj, field.status, token)
+        return token
+
+    def enqueue(self, field: MediaField, record_id: int, token: str, up: Upload) -> None:
+        """После commit записи со статусом token: загрузить и подставить фото."""
+        self._count("queued")
+        self._submit(self._process, field, record_id, token, up)
+
+    def discard(self, refs: list[str]) -> None:
+        """Удалить файлы (старое фото удалённой записи) вне запроса."""
+        if refs:
+            self._submit(self._delete, refs)
+
+    def refs(self, obj, field: MediaField) -> list[str]:
+        return self.backend.refs(getattr(obj, field.path), getattr(obj, field.variants))
+
+    def _delete(self, refs: list[str]) -> None:
+        try:
+            self._count("deleted", self.backend.delete(refs))
+        except Exception as e:  # noqa: BLE001
+            print(f"[MEDIA] ошибка удаления {refs[:3]}…: {e}")
+
+    def _process(self, field: MediaField, record_id: int, token: str, up: Upload) -> None:
+        self._count("in_flight")
+        try:
+            with self.app.app_context():
+                self._store(field, record_id, token, up)
+        finally:
+            self._count("in_flight", -1)
+
+    def _store(self, field: MediaField, record_id: int, token: str, up: Upload) -> None:
+        model = field.model
+        try:
+            img = images.load(up.data)
+            formats = self.formats() if img is not None else ()
+            stored = self.backend.store(up, img, self.widths, formats)
+        except Exception as e:  # noqa: BLE001
+            print(f"[MEDIA] загрузка {up.filename} не удалась: {e}")
+            self._count("failed")
+            db.session.execute(db.update(model).where(model.id == record_id, getattr(model, field.status) == token)
+                               .values({field.status: FAILED}))
+            db.session.commit()
+            return
+
+        new_refs = self.backend.refs(stored["url"], stored["variants"])
+        obj = db.session.get(model, record_id)
+        if obj is None or getattr(obj, field.status) != token:
+            # запись удалили или загрузили другое фото, пока шла эта загрузка
+            db.session.rollback()
+            self._count("superseded")
+            self._delete(new_refs)
+            return
+        old_refs = self.refs(obj, field)
+        setattr(obj, field.path, stored["url"])
+        setattr(obj, field.variants, stored["variants"])
+        setattr(obj, field.status, None)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self._delete(new_refs)
+            raise
+        self._count("stored")
+        if self.on_change:
+            self.on_change(field.kind, record_id)
+        self._delete([ref for ref in old_refs if ref not in new_refs])
+
+    def wait(self) -> None:
+        """Дождаться всех задач (CLI, тесты, остановка процесса)."""
+        with self._lock:
+            pending = list(self._futures)
+        wait_futures(pending)
+
+    # ───────────── уборка ─────────────
+    def referenced(self, fields: Iterable[MediaField], batch_size: int = 500) -> set[str]:
+        """Все файлы, на которые ссылаются записи (читаем пачками по id)."""
+        found: set[str] = set()
+        for field in fields:
+            model, last_id = field.model, 0
+            cols = (model.id, getattr(model, field.path), getattr(model, field.variants))
+            while True:
+                rows = (db.session.query(*cols).filter(model.id > last_id)
+                        .order_by(model.id).limit(batch_size).all())
+                if not rows:
+                    break
+                for _, path, variants in rows:
+                    found.update(self.backend.refs(path, variants))
+                last_id = rows[-1][0]
+        return found
+
+    def reconcile(self, fields: list[MediaField], grace: float = 3600,
+                  batch_size: int = 100, dry_run: bool = True) -> dict:
+        """
+        Файлы бэкенда в папках загрузок fields, на которые нет ссылок в БД и которые
+        старше grace секунд (свежие могут принадлежать загрузке, ещё не записанной в БД).
+        """
+        keep = self.referenced(fields)
+        prefixes = sorted({self.backend.prefix(field) for field in fields})
+        cutoff = time.time() - grace
+        report = {"checked": 0, "orphans": 0, "deleted": 0, "dry_run": dry_run, "sample": []}
+        batch: list[str] = []
+        for ref, ts in self.backend.list(prefixes):
+            report["checked"] += 1
+            if ref in keep or ts > cutoff:
+                continue
+            report["orphans"] += 1
+            if len(report["sample"]) < 20:
+                report["sample"].append(ref)
+            if not dry_run:
+                batch.append(ref)
+                if len(batch) >= batch_size:
+                    report["deleted"] += self.backend.delete(batch)
+                    batch = []
+        if batch:
+            report["deleted"] += self.backend.delete(batch)
+        self._count("deleted", report["deleted"])
+        return report
@@ -0,0 +1,170 @@
+# api/metrics.py
+"""
+Метрики запросов: число SQL-запросов и их время, время рендера шаблонов,
+время внешних вызовов (SMTP, Cloudinary).
+
+Каждый ответ получает заголовок Server-Timing (видно в DevTools → Network → Timing),
+а по endpoint'ам копятся задержки для /admin/metrics (p50/p95/p99 + гистограмма).
+Если запрос сделал больше QUERY_BUDGET SQL-запросов — пишем предупреждение в лог:
+так ловятся N+1 в маршрутах вроде ski_resort.
+
+Потоковый ответ (stream_page, sitemap, экспорт CSV) рендерится и читает БД уже
+после after_request: заголовок Server-Timing уходит раньше тела и помечен
+stream;desc="body excluded", а задержка, SQL-запросы и бюджет для /admin/metrics
+считаются при закрытии ответа (call_on_close) — вместе с телом.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Границы корзин гистограммы задержек, мс
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+@contextmanager
+def external_call(name: str):
+    """with external_call("smtp"): ... — учесть время внешнего вызова в текущем запросе."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context() and hasattr(g, "perf"):
+            ext = g.perf["external"]
+            ext[name] = ext.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return round(sorted_values[idx], 2)
+
+
+class EndpointStats:
+    def __init__(self, window: int):
+        self.count = 0
+        self.latencies: deque = deque(maxlen=window)   # последние window запросов, мс
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.queries_total = 0
+        self.queries_max = 0
+        self.over_budget = 0
+
+    def add(self, total_ms: float, queries: int, over_budget: bool) -> None:
+        self.count += 1
+        self.latencies.append(total_ms)
+        for i, bound in enumerate(BUCKETS_MS):
+            if total_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.queries_total += queries
+        self.queries_max = max(self.queries_max, queries)
+        self.over_budget += over_budget
+
+    def as_dict(self) -> dict:
+        values = sorted(self.latencies)
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "p50_ms": _percentile(values, 50),
+            "p95_ms": _percentile(values, 95),
+            "p99_ms": _percentile(values, 99),
+            "max_ms": round(values[-1], 2) if values else 0.0,
+            "histogram": [[label, n] for label, n in zip(labels, self.buckets)],
+            "queries_avg": round(self.queries_total / self.count, 2) if self.count else 0,
+            "queries_max": self.queries_max,
+            "over_query_budget": self.over_budget,
+        }
+
+
+class RequestMetrics:
+    def __init__(self, query_budget: int = 10, window: int = 1000):
+        self.query_budget = query_budget
+        self.window = window
+        self._stats: dict[str, EndpointStats] = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app) -> None:
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._template_start, app)
+        template_rendered.connect(self._template_end, app)
+        # слушаем класс Engine: engine во Flask-SQLAlchemy создаётся лениво
+        event.listen(Engine, "before_cursor_execute", self._sql_start)
+        event.listen(Engine, "after_cursor_execute", self._sql_end)
+
+    # ───────────── хуки ─────────────
+    @staticmethod
+    def _start():
+        g.perf = {"start": time.perf_counter(), "queries": 0, "sql_ms": 0.0,
+                  "tpl_ms": 0.0, "tpl_stack": [], "external": {}}
+
+    @staticmethod
+    def _sql_start(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and has_request_context() and hasattr(g, "perf"):
+            context._perf_start = time.perf_counter()
+
+    @staticmethod
+    def _sql_end(conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, "_perf_start", None)
+        if start is not None and has_request_context() and hasattr(g, "perf"):
+            g.perf["queries"] += 1
+            g.perf["sql_ms"] += (time.perf_counter() - start) * 1000
+
+    @staticmethod
+    def _template_start(sender, template, context, **extra):
+        if hasattr(g, "perf"):
+            g.perf["tpl_stack"].append(time.perf_counter())
+
+    @staticmethod
+    def _template_end(sender, template, context, **extra):
+        if hasattr(g, "perf") and g.perf["tpl_stack"]:
+            start = g.perf["tpl_stack"].pop()
+            if not g.perf["tpl_stack"]:   # вложенные include не считаем дважды
+                g.perf["tpl_ms"] += (time.perf_counter() - start) * 1000
+
+    def _finish(self, resp):
+        # у потокового ответа g.perf остаётся: запросы и шаблон тела ещё впереди
+        perf = g.get("perf") if resp.is_streamed else g.pop("perf", None)
+        if perf is None:
+            return resp
+        total_ms = (time.perf_counter() - perf["start"]) * 1000
+        endpoint = request.endpoint or "<unmatched>"
+
+        parts = [f'db;dur={perf["sql_ms"]:.1f};desc="{perf["queries"]} queries"',
+                 f'tpl;dur={perf["tpl_ms"]:.1f}']
+        parts += [f"{name};dur={ms:.1f}" for name, ms in perf["external"].items()]
+        parts.append(f"total;dur={total_ms:.1f}")
+        if resp.is_streamed:
+            parts.append('stream;desc="body excluded"')
+            path = request.path
+            resp.call_on_close(lambda: self._record(endpoint, path, perf))
+        else:
+            self._record(endpoint, request.path, perf, total_ms)
+        resp.headers["Server-Timing"] = ", ".join(parts)
+        return resp
+
+    def _record(self, endpoint: str, path: str, perf: dict, total_ms: float | None = None) -> None:
+        if total_ms is None:
+            total_ms = (time.perf_counter() - perf["start"]) * 1000
+        over = perf["queries"] > self.query_budget
+        if over:
+            print(f"[PERF] {endpoint} {path}: {perf['queries']} SQL-запросов "
+                  f"(бюджет {self.query_budget}), {total_ms:.0f} мс")
+        if endpoint != "static" and endpoint != "hashed_asset":
+            with self._lock:
+                stats = self._stats.get(endpoint)
+                if stats is None:
+                    stats = self._stats[endpoint] = EndpointStats(self.window)
+                stats.add(total_ms, perf["queries"], over)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: stats.as_dict() for name, stats in sorted(self._stats.items())}
@@ -0,0 +1,127 @@
+# api/migrations.py
+"""
+Версионные миграции схемы поверх ensure_schema (api/schema.py).
+
+ensure_schema умеет только создать таблицы и добавить nullable-колонки. Всё
+остальное (индексы на существующих таблицах, перенос данных) — миграции:
+функция upgrade(conn) с уникальным id. Применённые записываются в таблицу
+schema_migrations, каждая выполняется в своей транзакции и ровно один раз.
+
+Индексы объявляются на моделях (тогда create_all создаёт их в новой базе),
+а миграция создаёт их в уже существующей — create_indexes() по имени ищет
+индекс в метаданных и пропускает уже созданные:
+
+    @migration("0004_leads_source", "индекс по источнику заявок")
+    def _(conn):
+        create_indexes(conn, "ix_leads_source")
+
+На serverless миграции запускаются явно: flask --app api.index db-migrate.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable
+
+from api import richtext, search
+from api.models import db
+
+schema_migrations = db.Table(
+    "schema_migrations",
+    db.Column("id", db.String(100), primary_key=True),
+    db.Column("applied_at", db.DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+@dataclass
+class Migration:
+    id: str
+    description: str
+    upgrade: Callable
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(migration_id: str, description: str):
+    def decorator(fn):
+        if any(m.id == migration_id for m in MIGRATIONS):
+            raise ValueError(f"миграция {migration_id} уже объявлена")
+        MIGRATIONS.append(Migration(migration_id, description, fn))
+        return fn
+    return decorator
+
+
+def find_index(name: str):
+    for table in db.metadata.tables.values():
+        for index in table.indexes:
+            if index.name == name:
+                return index
+    raise KeyError(f"индекс {name} не объявлен ни на одной модели")
+
+
+def create_indexes(conn, *names: str) -> None:
+    for name in names:
+        find_index(name).create(conn, checkfirst=True)
+
+
+def applied(conn) -> set[str]:
+    return set(conn.execute(db.select(schema_migrations.c.id)).scalars())
+
+
+def status() -> list[tuple[Migration, bool]]:
+    done = set()
+    if db.inspect(db.engine).has_table(schema_migrations.name):
+        with db.engine.connect() as conn:
+            done = applied(conn)
+    return [(m, m.id in done) for m in MIGRATIONS]
+
+
+def run_pending() -> list[str]:
+    """Применить неприменённые миграции по порядку. Возвращает их id."""
+    schema_migrations.create(db.engine, checkfirst=True)
+    with db.engine.connect() as conn:
+        done = applied(conn)
+    ran = []
+    for m in MIGRATIONS:
+        if m.id in done:
+            continue
+        with db.engine.begin() as conn:
+            m.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(id=m.id, applied_at=datetime.utcnow()))
+        print(f"Schema: миграция {m.id} — {m.description}")
+        ran.append(m.id)
+    return ran
+
+
+# ───────────────────────── Миграции ─────────────────────────
+@migration("0001_hot_path_indexes", "индексы списков: (section, name), (name, id), (pub_date DESC, id DESC)")
+def _hot_path_indexes(conn):
+    create_indexes(conn, "ix_coach_section_name", "ix_coach_name_id",
+                   "ix_service_section_name", "ix_service_name_id", "ix_news_article_pub_date_id")
+
+
+@migration("0002_news_render_backfill", "content_html, excerpt, word_count, reading_minutes для старых новостей")
+def _news_render_backfill(conn, batch_size: int = 500):
+    # NewsArticle объявлена в api/index.py — работаем с таблицей из метаданных
+    news = db.metadata.tables["news_article"]
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            db.select(news.c.id, news.c.content)
+            .where(news.c.id > last_id, news.c.excerpt.is_(None))
+            .order_by(news.c.id).limit(batch_size)).all()
+        if not rows:
+            break
+        for row in rows:
+            rendered = richtext.render(row.content)
+            conn.execute(news.update().where(news.c.id == row.id).values(
+                content_html=rendered.html, excerpt=rendered.excerpt,
+                word_count=rendered.word_count, reading_minutes=rendered.reading_minutes))
+        last_id = rows[-1].id
+
+
+@migration("0003_search_backfill", "поисковый индекс для новостей и курсов, созданных до поиска")
+def _search_backfill(conn):
+    # те же поля, что SEARCH_SOURCES в api/index.py; таблицы — из метаданных
+    search.ensure_index(conn)
+    search.reindex_all({"news": (db.metadata.tables["news_article"], "title", "content"),
+                        "course": (db.metadata.tables["courses"], "title", "description")}, conn=conn)
@@ -1,4 +1,6 @@
 # api/models.py
+from datetime import datetime
+
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
@@ -10,3 +12,115 @@ class Course(db.Model):
     title = db.Column(db.String(150), nullable=False)
     youtube_id = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text, nullable=True)
+    thumbnail = db.Column(db.JSON)  # превью для «фасада» YouTube: src, w, h, srcset (api/youtube.py)
+
+
+class ContentVersion(db.Model):
+    """Счётчик версий контента по типам ('coach', 'service', 'news', 'course')."""
+    __tablename__ = "content_versions"
+
+    kind = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class OutboxMessage(db.Model):
+    """Письмо в очереди на отправку (outbox). status: pending → sending → sent | dead."""
+    __tablename__ = "outbox_messages"
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    to_addr = db.Column(db.String(300), nullable=False)
+    reply_to = db.Column(db.String(300))
+    subject = db.Column(db.String(300), nullable=False)
+    body_html = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(10), nullable=False, default="pending", index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    sent_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+
+    def __repr__(self):
+        return f"<OutboxMessage {self.id} {self.status}>"
+
+
+class Lead(db.Model):
+    """Заявка с формы «Записаться» (/submit). Пишется пачками через api/leads.py."""
+    __tablename__ = "leads"
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    name = db.Column(db.String(150))
+    phone = db.Column(db.String(20), index=True)       # только цифры, международный формат
+    phone_raw = db.Column(db.String(50))               # как ввёл пользователь
+    source = db.Column(db.String(50))                  # страница формы: ski / gym / ...
+
+    __table_args__ = (db.Index("ix_leads_created_at_id", "created_at", "id"),)
+
+
+class ScheduleRule(db.Model):
+    """Повторяющееся занятие: услуга (и тренер) по дню недели и времени. Сеансы — ClassSession (api/booking.py)."""
+    __tablename__ = "schedule_rules"
+
+    id = db.Column(db.Integer, primary_key=True)
+    service_id = db.Column(db.Integer, db.ForeignKey("service.id", ondelete="CASCADE"), nullable=False, index=True)
+    coach_id = db.Column(db.Integer, db.ForeignKey("coach.id", ondelete="SET NULL"))
+    weekday = db.Column(db.Integer, nullable=False)          # 0 — понедельник … 6 — воскресенье
+    start_time = db.Column(db.Time, nullable=False)          # время клуба (SCHEDULE_TZ)
+    duration_min = db.Column(db.Integer, nullable=False, default=60)
+    capacity = db.Column(db.Integer, nullable=False)
+    valid_from = db.Column(db.Date)                          # сезон: None — без ограничения
+    valid_until = db.Column(db.Date)
+    active = db.Column(db.Boolean, nullable=False, default=True)
+
+    def __repr__(self):
+        return f"<ScheduleRule {self.id} wd={self.weekday} {self.start_time}>"
+
+
+class ClassSession(db.Model):
+    """
+    Конкретное занятие в календаре. booked — занятые места: меняется только
+    условным UPDATE в api/booking.py, поэтому свободные места (capacity - booked)
+    читаются без подсчёта броней.
+    """
+    __tablename__ = "class_sessions"
+
+    id = db.Column(db.Integer, primary_key=True)
+    rule_id = db.Column(db.Integer, db.ForeignKey("schedule_rules.id", ondelete="SET NULL"))
+    service_id = db.Column(db.Integer, db.ForeignKey("service.id", ondelete="CASCADE"), nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey("coach.id", ondelete="SET NULL"))
+    section = db.Column(db.String(50), nullable=False)       # копия Service.section — фильтр без JOIN
+    starts_at = db.Column(db.DateTime, nullable=False)       # время клуба, naive
+    ends_at = db.Column(db.DateTime, nullable=False)
+    capacity = db.Column(db.Integer, nullable=False)
+    booked = db.Column(db.Integer, nullable=False, default=0)
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+
+    # сеанс правила на дату — один (повторная генерация идемпотентна);
+    # расписание секции / услуги за период — диапазон по индексу
+    __table_args__ = (db.UniqueConstraint("rule_id", "starts_at", name="uq_class_session_rule_start"),
+                      db.Index("ix_class_session_section_starts", "section", "starts_at"),
+                      db.Index("ix_class_session_service_starts", "service_id", "starts_at"),
+                      db.CheckConstraint("booked >= 0 AND booked <= capacity", name="ck_class_session_seats"))
+
+    def __repr__(self):
+        return f"<ClassSession {self.id} {self.starts_at} {self.booked}/{self.capacity}>"
+
+
+class Booking(db.Model):
+    """Бронь мест на занятии. status: confirmed | cancelled (места возвращаются в ClassSession.booked)."""
+    __tablename__ = "bookings"
+
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, db.ForeignKey("class_sessions.id", ondelete="CASCADE"), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    name = db.Column(db.String(150))
+    phone = db.Column(db.String(20), index=True)       # только цифры, как Lead.phone
+    seats = db.Column(db.Integer, nullable=False, default=1)
+    status = db.Column(db.String(10), nullable=False, default="confirmed")
+
+    __table_args__ = (db.Index("ix_booking_session_status", "session_id", "status"),)
+
+    def __repr__(self):
+        return f"<Booking {self.id} session={self.session_id} {self.status}>"
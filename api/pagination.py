@@ -0,0 +1,67 @@
+# api/pagination.py
+"""
+Keyset (cursor) пагинация: WHERE (sort, id) < (последние значения) ORDER BY sort, id LIMIT n+1.
+Стоимость страницы не зависит от того, насколько «глубоко» листает пользователь,
+в отличие от OFFSET, который каждый раз пропускает все предыдущие строки.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+
+from api.models import db
+
+
+@dataclass
+class KeysetPage:
+    items: list
+    cursor: str | None        # курсор текущей страницы (None — первая)
+    next_cursor: str | None   # курсор следующей страницы (None — это последняя)
+
+    @property
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_col) -> tuple | None:
+    """Возвращает (значение, id) или None, если курсор битый."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, row_id = json.loads(raw)
+        if sort_col.type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def keyset_paginate(query, sort_col, id_col, cursor: str | None, per_page: int,
+                    desc: bool = True) -> KeysetPage:
+    """
+    query — Model.query (можно с .filter/.options), без order_by.
+    Сортировка по (sort_col, id_col); id_col делает порядок однозначным при равных датах.
+    """
+    decoded = decode_cursor(cursor, sort_col) if cursor else None
+    if decoded:
+        value, last_id = decoded
+        if desc:
+            query = query.filter(db.or_(sort_col < value, db.and_(sort_col == value, id_col < last_id)))
+        else:
+            query = query.filter(db.or_(sort_col > value, db.and_(sort_col == value, id_col > last_id)))
+
+    order = (sort_col.desc(), id_col.desc()) if desc else (sort_col.asc(), id_col.asc())
+    rows = query.order_by(*order).limit(per_page + 1).all()
+
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), getattr(last, id_col.key))
+    return KeysetPage(items=items, cursor=cursor if decoded else None, next_cursor=next_cursor)
@@ -0,0 +1,148 @@
+# api/ratelimit.py
+"""
+Ограничение частоты для форм (/submit, /submit-contact) и подавление дублей.
+
+Token bucket на ключ (IP, телефон, e-mail): ёмкость burst, пополнение
+burst токенов за period секунд. Пока токены есть — запрос проходит, иначе
+сразу 429 с Retry-After, ещё до записи в БД и постановки письма в outbox.
+
+Дубли: хэш содержимого формы запоминается на dedupe_ttl секунд; повтор
+(двойной клик, «отправить ещё раз», бот с одним и тем же текстом) не
+делает никакой работы.
+
+Хранилища:
+  • MemoryStore — LRU на OrderedDict с ограничением числа ключей: поток
+    случайных IP не раздувает память, вытесняются самые давние ключи;
+  • RedisStore — общий для всех инстансов (на serverless у каждого инстанса
+    своя память, поэтому лимит «на процесс» там мягкий). Нужен пакет redis;
+    без него или при ошибке Redis используется память.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+try:
+    import redis  # type: ignore
+except ImportError:  # pragma: no cover
+    redis = None
+
+
+@dataclass(frozen=True)
+class Rule:
+    burst: int        # сколько запросов подряд
+    period: float     # за сколько секунд восстанавливается весь burst
+
+    @classmethod
+    def parse(cls, spec: str) -> "Rule":
+        """'5/60' → 5 запросов, полностью восстанавливаются за 60 секунд."""
+        burst, _, period = spec.partition("/")
+        return cls(int(burst), float(period or 60))
+
+
+class MemoryStore:
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()   # key -> (tokens, ts)
+        self._seen: OrderedDict[str, float] = OrderedDict()                    # key -> expires_at
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rule: Rule, now: float) -> float:
+        """Списать токен. 0 — можно, иначе через сколько секунд появится токен."""
+        rate = rule.burst / rule.period
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (float(rule.burst), now))
+            tokens = min(rule.burst, tokens + (now - ts) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+    def seen(self, key: str, ttl: float, now: float) -> bool:
+        """True, если key уже был в последние ttl секунд; иначе запомнить."""
+        with self._lock:
+            expires = self._seen.pop(key, None)
+            duplicate = expires is not None and expires > now
+            self._seen[key] = expires if duplicate else now + ttl
+            while len(self._seen) > self.max_keys:
+                self._seen.popitem(last=False)
+        return duplicate
+
+
+class RedisStore:
+    # Тот же token bucket атомарно на стороне Redis
+    _TAKE = """
+    local burst = tonumber(ARGV[1]); local rate = tonumber(ARGV[2]); local now = tonumber(ARGV[3])
+    local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + (now - ts) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url: str, prefix: str = "rl:"):
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self._take = self.client.register_script(self._TAKE)
+
+    def take(self, key: str, rule: Rule, now: float) -> float:
+        return float(self._take(keys=[self.prefix + key], args=[rule.burst, rule.burst / rule.period, now]))
+
+    def seen(self, key: str, ttl: float, now: float) -> bool:
+        return not self.client.set(self.prefix + "seen:" + key, 1, nx=True, ex=max(1, int(ttl)))
+
+
+class RateLimiter:
+    def __init__(self, store=None, redis_url: str | None = None, max_keys: int = 10000):
+        self.memory = MemoryStore(max_keys)
+        self.store = store or self.memory
+        if redis_url:
+            if redis is None:
+                print("[RATELIMIT] пакет redis не установлен — лимиты в памяти процесса")
+            else:
+                self.store = RedisStore(redis_url)
+        self.stats = {"allowed": 0, "limited": 0, "duplicates": 0, "store_errors": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _call(self, method: str, *args):
+        """Redis недоступен — не роняем форму, считаем в памяти процесса."""
+        try:
+            return getattr(self.store, method)(*args)
+        except Exception as e:  # noqa: BLE001
+            if self.store is self.memory:
+                raise
+            self._count("store_errors")
+            print(f"[RATELIMIT] ошибка хранилища: {e}")
+            return getattr(self.memory, method)(*args)
+
+    def check(self, keys: list[tuple[str, Rule]]) -> float:
+        """Списать по токену для каждого (ключ, правило). 0 — можно, иначе Retry-After."""
+        now = time.time()
+        wait = max((self._call("take", key, rule, now) for key, rule in keys if key), default=0.0)
+        self._count("limited" if wait else "allowed")
+        return wait
+
+    def duplicate(self, scope: str, values, ttl: float) -> bool:
+        digest = hashlib.sha1("\x1f".join(str(v or "").strip().lower() for v in values).encode()).hexdigest()
+        dup = self._call("seen", f"{scope}:{digest}", ttl, time.time())
+        if dup:
+            self._count("duplicates")
+        return dup
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"store": type(self.store).__name__, **self.stats}
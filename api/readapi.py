@@ -0,0 +1,143 @@
+# api/readapi.py
+"""
+JSON API только для чтения: /api/v1/<коллекция> и /api/v1/batch.
+
+Для мобильного приложения и виджетов партнёров: тренеры, услуги, новости, курсы.
+
+    GET /api/v1/coaches?fields=name,section&section=ski&limit=100&cursor=…
+    GET /api/v1/batch?include=coaches,services&fields[coaches]=name,photo&limit=200
+
+  • fields — только нужные поля (id есть всегда); без fields — набор по умолчанию;
+  • cursor — keyset-страницы (api/pagination.py), next_cursor в ответе;
+  • batch — несколько коллекций за один запрос, у каждой свои fields[…]/cursor[…];
+  • ETag/304 и Cache-Control — по версиям контента (api/cache.py), как у страниц.
+
+Сериализация без ORM-объектов: выбираются только нужные колонки, строка
+превращается в dict через zip с именами полей. orjson, если установлен,
+иначе стандартный json без пробелов.
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable
+
+from api.models import db
+from api.pagination import keyset_paginate
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class ApiError(ValueError):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+@dataclass
+class Collection:
+    name: str                                     # coaches — имя в URL
+    kind: str                                     # coach — тип контента (версии, ETag)
+    model: type
+    fields: dict                                  # поле в JSON -> колонка/выражение
+    default_fields: tuple[str, ...]
+    sort: object = None                           # колонка сортировки (по умолчанию id)
+    desc: bool = False
+    filters: dict = field(default_factory=dict)   # ?<имя>=значение -> (колонка, допустимые значения)
+    transforms: dict[str, Callable] = field(default_factory=dict)   # поле -> функция значения
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} не сериализуется в JSON")
+
+
+def dumps(payload) -> str:
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+
+
+def parse_fields(coll: Collection, raw: str | None) -> list[str]:
+    if not raw:
+        return list(coll.default_fields)
+    names = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = [name for name in names if name not in coll.fields]
+    if unknown:
+        raise ApiError(f"{coll.name}: неизвестные поля {', '.join(unknown)}; "
+                       f"доступны: {', '.join(coll.fields)}")
+    return list(dict.fromkeys(["id"] + names))
+
+
+def parse_limit(raw: str | None) -> int:
+    if not raw:
+        return DEFAULT_LIMIT
+    try:
+        return max(1, min(MAX_LIMIT, int(raw)))
+    except ValueError:
+        raise ApiError("limit должен быть целым числом") from None
+
+
+def fetch(coll: Collection, fields: list[str], args: dict, cursor: str | None, limit: int) -> dict:
+    """Одна страница коллекции: {"items": [...], "next_cursor": …}."""
+    model = coll.model
+    sort = coll.sort if coll.sort is not None else model.id
+    columns = [coll.fields[name].label(name) for name in fields]
+    if sort.key not in fields:
+        columns.append(sort.label(sort.key))   # нужна для курсора, в ответ не попадает
+    query = db.session.query(*columns)
+    for param, (column, allowed) in coll.filters.items():
+        value = args.get(param)
+        if value:
+            if value not in allowed:
+                raise ApiError(f"{param} должен быть одним из: {', '.join(allowed)}")
+            query = query.filter(column == value)
+
+    page = keyset_paginate(query, sort, model.id, cursor=cursor, per_page=limit, desc=coll.desc)
+    transforms = [(i, coll.transforms[name]) for i, name in enumerate(fields) if name in coll.transforms]
+    items = []
+    for row in page.items:
+        values = list(row[:len(fields)])
+        for i, fn in transforms:
+            values[i] = fn(values[i])
+        items.append(dict(zip(fields, values)))
+    return {"items": items, "next_cursor": page.next_cursor}
+
+
+def collection_page(coll: Collection, args) -> dict:
+    """GET /api/v1/<коллекция>: ?fields=, ?cursor=, ?limit= и фильтры коллекции."""
+    fields = parse_fields(coll, args.get("fields"))
+    return fetch(coll, fields, args, args.get("cursor"), parse_limit(args.get("limit")))
+
+
+def batch(collections: dict[str, Collection], args) -> dict:
+    """
+    GET /api/v1/batch?include=a,b — параметры коллекции с суффиксом [имя]:
+    fields[news]=title, cursor[news]=…, limit[news]=10, section[coaches]=ski.
+    Общий ?limit= действует на все коллекции без своего limit[…].
+    """
+    names = [n.strip() for n in (args.get("include") or ",".join(collections)).split(",") if n.strip()]
+    unknown = [n for n in names if n not in collections]
+    if unknown:
+        raise ApiError(f"неизвестные коллекции {', '.join(unknown)}; доступны: {', '.join(collections)}")
+    result = {}
+    for name in dict.fromkeys(names):
+        coll = collections[name]
+        scoped = {param: args.get(f"{param}[{name}]") for param in coll.filters}
+        result[name] = fetch(coll, parse_fields(coll, args.get(f"fields[{name}]")), scoped,
+                             args.get(f"cursor[{name}]"),
+                             parse_limit(args.get(f"limit[{name}]") or args.get("limit")))
+    return result
+
+
+def describe(collections: dict[str, Collection]) -> dict:
+    """GET /api/v1 — какие коллекции, поля и фильтры есть."""
+    return {name: {"fields": list(coll.fields), "default_fields": list(coll.default_fields),
+                   "filters": {param: list(allowed) for param, (_, allowed) in coll.filters.items()}}
+            for name, coll in collections.items()}
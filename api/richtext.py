@@ -0,0 +1,141 @@
+# api/richtext.py
+"""
+Текст новости: безопасный HTML, анонс, число слов и время чтения.
+
+Всё это считается один раз — при сохранении новости в админке и при импорте —
+и хранится в колонках NewsArticle (content_html, excerpt, word_count,
+reading_minutes). Списки новостей читают короткий excerpt, а не режут
+striptags/truncate полный текст на каждом рендере; страница новости выводит
+уже очищенный content_html вместо сырого content | safe.
+
+Очистка — белый список тегов и атрибутов на html.parser (без внешних
+зависимостей): <script>/<style>/<iframe> выкидываются вместе с содержимым,
+on*-атрибуты и ссылки javascript: — тоже. Текст без блочной разметки (как его
+пишут в форме админки) превращается в абзацы: пустая строка — новый <p>,
+перевод строки — <br>.
+"""
+import re
+from dataclasses import dataclass
+from html import escape
+from html.parser import HTMLParser
+
+EXCERPT_CHARS = 300
+WORDS_PER_MINUTE = 180   # чтение с экрана, русский текст
+
+ALLOWED_TAGS = {
+    "p", "br", "b", "strong", "i", "em", "u", "s", "a", "ul", "ol", "li",
+    "h2", "h3", "h4", "blockquote", "hr", "span", "div", "img",
+}
+VOID_TAGS = {"br", "hr", "img"}
+DROP_WITH_CONTENT = {"script", "style", "iframe", "object", "embed", "noscript", "template"}
+ALLOWED_ATTRS = {
+    "a": {"href", "title"},
+    "img": {"src", "alt", "width", "height"},
+}
+URL_ATTRS = {"href", "src"}
+SAFE_SCHEMES = {"http", "https", "mailto", "tel"}
+SCHEME_RE = re.compile(r"^([a-z][a-z0-9+.-]*):")
+BLOCK_RE = re.compile(r"<\s*(p|div|ul|ol|h[1-6]|blockquote|br)\b", re.I)
+WORD_RE = re.compile(r"\w+(?:[-']\w+)*", re.U)
+
+
+@dataclass
+class Rendered:
+    html: str
+    excerpt: str
+    word_count: int
+    reading_minutes: int
+
+
+def _safe_url(value: str) -> bool:
+    """Относительный адрес или http(s)/mailto/tel. Пробелы внутри схемы браузер игнорирует."""
+    scheme = SCHEME_RE.match(re.sub(r"[\x00-\x20]", "", value).lower())
+    return scheme is None or scheme.group(1) in SAFE_SCHEMES
+
+
+class _Sanitizer(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out: list[str] = []
+        self.text: list[str] = []
+        self.open: list[str] = []
+        self.skip = 0                      # глубина внутри <script> и т.п.
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_WITH_CONTENT:
+            self.skip += 1
+            return
+        if self.skip or tag not in ALLOWED_TAGS:
+            return
+        kept = []
+        for name, value in attrs:
+            if name not in ALLOWED_ATTRS.get(tag, ()) or value is None:
+                continue
+            if name in URL_ATTRS and not _safe_url(value):
+                continue
+            kept.append(f' {name}="{escape(value, quote=True)}"')
+        if tag == "a" and any(a.startswith(" href=") for a in kept):
+            kept.append(' rel="noopener nofollow"')
+        if tag == "img":
+            kept.append(' loading="lazy"')
+        self.out.append(f"<{tag}{''.join(kept)}>")
+        if tag not in VOID_TAGS:
+            self.open.append(tag)
+        if tag in ("br", "p", "li", "div", "h2", "h3", "h4", "blockquote"):
+            self.text.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in DROP_WITH_CONTENT:
+            self.skip = max(0, self.skip - 1)
+            return
+        if self.skip or tag not in self.open:
+            return
+        while self.open:                   # закрываем и незакрытые внутри
+            inner = self.open.pop()
+            self.out.append(f"</{inner}>")
+            if inner == tag:
+                break
+        self.text.append(" ")
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        self.out.append(escape(data, quote=False))
+        self.text.append(data)
+
+    def result(self) -> tuple[str, str]:
+        self.close()
+        tail = "".join(f"</{tag}>" for tag in reversed(self.open))
+        return "".join(self.out) + tail, " ".join("".join(self.text).split())
+
+
+def _paragraphs(text: str) -> str:
+    """Простой текст из формы: пустая строка — абзац, перевод строки — <br>."""
+    blocks = re.split(r"\n\s*\n", text.replace("\r\n", "\n").strip())
+    return "".join("<p>" + block.strip().replace("\n", "<br>") + "</p>"
+                   for block in blocks if block.strip())
+
+
+def sanitize(content: str) -> tuple[str, str]:
+    """(очищенный HTML, простой текст) из содержимого новости."""
+    content = content or ""
+    if not BLOCK_RE.search(content):
+        content = _paragraphs(content)
+    parser = _Sanitizer()
+    parser.feed(content)
+    return parser.result()
+
+
+def excerpt(text: str, limit: int = EXCERPT_CHARS) -> str:
+    """Начало текста не длиннее limit символов, по границе слова."""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit].rsplit(" ", 1)[0].rstrip(",.;:—- ")
+    return (cut or text[:limit]) + "…"
+
+
+def render(content: str) -> Rendered:
+    html, text = sanitize(content)
+    words = len(WORD_RE.findall(text))
+    return Rendered(html=html, excerpt=excerpt(text), word_count=words,
+                    reading_minutes=max(1, round(words / WORDS_PER_MINUTE)) if words else 0)
@@ -0,0 +1,30 @@
+# api/schema.py
+"""
+Создание схемы: db.create_all() + добавление новых nullable-колонок
+в уже существующие таблицы (create_all сам существующие таблицы не меняет)
++ версионные миграции (api/migrations.py).
+"""
+from api import migrations, search
+from api.models import db
+
+
+def ensure_schema() -> list[str]:
+    """Возвращает список добавленных колонок вида 'table.column'."""
+    db.create_all()
+    search.ensure_index()
+
+    added = []
+    inspector = db.inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or not col.nullable or col.primary_key:
+                    continue
+                col_type = col.type.compile(dialect=db.engine.dialect)
+                conn.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+                added.append(f"{table.name}.{col.name}")
+    if added:
+        print("Schema: добавлены колонки", ", ".join(added))
+    migrations.run_pending()
+    return added
@@ -0,0 +1,211 @@
+# api/search.py
+"""
+Полнотекстовый поиск по новостям (title/content) и видеокурсам (title/description).
+
+Индекс — отдельная таблица, обновляется точечно при записи из админки:
+  • Postgres: search_documents с колонкой tsvector (словарь 'russian' — стемминг)
+    и GIN-индексом; ранжирование ts_rank_cd, сниппеты ts_headline;
+  • SQLite: виртуальная таблица FTS5 search_fts; ранжирование bm25, сниппеты snippet().
+
+Документ идентифицируется doc_id = ref_id * 4 + код типа, поэтому обновление
+и удаление — это поиск по первичному ключу/rowid, а не скан индекса.
+"""
+import re
+from contextlib import nullcontext
+from dataclasses import dataclass
+
+from markupsafe import Markup, escape
+
+from api.models import db
+
+KIND_CODES = {"news": 1, "course": 2}
+MARK_OPEN, MARK_CLOSE = "\x02", "\x03"   # маркеры подсветки до экранирования HTML
+
+
+@dataclass
+class SearchHit:
+    kind: str
+    ref_id: int
+    title: Markup      # с <mark> вокруг найденных слов
+    snippet: Markup
+    rank: float
+
+
+def doc_id(kind: str, ref_id: int) -> int:
+    return ref_id * 4 + KIND_CODES[kind]
+
+
+def _dialect() -> str:
+    return db.engine.dialect.name
+
+
+def _plain(html: str | None) -> str:
+    return Markup(html or "").striptags()
+
+
+def _highlight(text: str | None) -> Markup:
+    """Экранируем текст и только потом превращаем маркеры в <mark>."""
+    safe = str(escape(text or ""))
+    return Markup(safe.replace(MARK_OPEN, "<mark>").replace(MARK_CLOSE, "</mark>"))
+
+
+# ───────────────────────── Схема ─────────────────────────
+def ensure_index(conn=None) -> None:
+    """Создать таблицу индекса, если её нет (вызывается из ensure_schema и миграций)."""
+    dialect = _dialect()
+    with nullcontext(conn) if conn is not None else db.engine.begin() as conn:
+        if dialect == "postgresql":
+            conn.execute(db.text("""
+                CREATE TABLE IF NOT EXISTS search_documents (
+                    doc_id BIGINT PRIMARY KEY,
+                    kind VARCHAR(10) NOT NULL,
+                    ref_id INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    tsv TSVECTOR NOT NULL
+                )"""))
+            conn.execute(db.text(
+                "CREATE INDEX IF NOT EXISTS ix_search_documents_tsv ON search_documents USING GIN (tsv)"))
+        elif dialect == "sqlite":
+            conn.execute(db.text("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(
+                    title, body, kind UNINDEXED, ref_id UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )"""))
+
+
+# ───────────────────────── Обновление ─────────────────────────
+def _upsert(execute, dialect: str, kind: str, ref_id: int, title: str, body_html: str | None) -> None:
+    params = {"doc_id": doc_id(kind, ref_id), "kind": kind, "ref_id": ref_id,
+              "title": title or "", "body": _plain(body_html)}
+    if dialect == "postgresql":
+        execute(db.text("""
+            INSERT INTO search_documents (doc_id, kind, ref_id, title, body, tsv)
+            VALUES (:doc_id, :kind, :ref_id, :title, :body,
+                    setweight(to_tsvector('russian', :title), 'A') ||
+                    setweight(to_tsvector('russian', :body), 'B'))
+            ON CONFLICT (doc_id) DO UPDATE
+               SET title = EXCLUDED.title, body = EXCLUDED.body, tsv = EXCLUDED.tsv"""), params)
+    elif dialect == "sqlite":
+        execute(db.text("DELETE FROM search_fts WHERE rowid = :doc_id"), params)
+        execute(db.text("""
+            INSERT INTO search_fts (rowid, title, body, kind, ref_id)
+            VALUES (:doc_id, :title, :body, :kind, :ref_id)"""), params)
+
+
+def index_document(kind: str, ref_id: int, title: str, body_html: str | None) -> None:
+    """Добавить/обновить документ. Коммитит сам — вызывать после commit записи."""
+    index_documents(kind, [(ref_id, title, body_html)])
+
+
+def index_documents(kind: str, docs, conn=None) -> None:
+    """
+    Пачка документов (ref_id, title, body_html) — один commit на всю пачку.
+    С conn (миграция) пишет в её транзакцию и не коммитит.
+    """
+    dialect = _dialect()
+    if dialect not in ("postgresql", "sqlite"):
+        return
+    execute = conn.execute if conn is not None else db.session.execute
+    for ref_id, title, body_html in docs:
+        _upsert(execute, dialect, kind, ref_id, title, body_html)
+    if conn is None:
+        db.session.commit()
+
+
+def remove_document(kind: str, ref_id: int) -> None:
+    table, key = {"postgresql": ("search_documents", "doc_id"),
+                  "sqlite": ("search_fts", "rowid")}.get(_dialect(), (None, None))
+    if table:
+        db.session.execute(db.text(f"DELETE FROM {table} WHERE {key} = :doc_id"),
+                           {"doc_id": doc_id(kind, ref_id)})
+        db.session.commit()
+
+
+def safe_index(fn, *args) -> None:
+    """Ошибка индекса не должна ронять сохранение в админке — переиндексация починит."""
+    try:
+        fn(*args)
+    except Exception as e:  # noqa: BLE001
+        db.session.rollback()
+        print(f"[SEARCH] не удалось обновить индекс: {e}")
+
+
+def reindex_all(sources: dict, batch_size: int = 500, conn=None) -> int:
+    """
+    Полная переиндексация. sources: {"news": (Model или Table, title_col, body_col), ...}.
+    Идёт пачками по id, чтобы не держать весь архив в памяти. С conn — всё в её
+    транзакции (миграция 0003), без conn — commit после каждой пачки.
+    """
+    dialect = _dialect()
+    with nullcontext(conn) if conn is not None else db.engine.begin() as target:
+        if dialect == "postgresql":
+            target.execute(db.text("TRUNCATE search_documents"))
+        elif dialect == "sqlite":
+            target.execute(db.text("DELETE FROM search_fts"))
+    execute = conn.execute if conn is not None else db.session.execute
+    total = 0
+    for kind, (source, title_col, body_col) in sources.items():
+        table = getattr(source, "__table__", source)
+        last_id = 0
+        while True:
+            rows = execute(
+                db.select(table.c.id, table.c[title_col], table.c[body_col])
+                .where(table.c.id > last_id).order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            index_documents(kind, rows, conn)
+            total += len(rows)
+            last_id = rows[-1][0]
+    return total
+
+
+# ───────────────────────── Поиск ─────────────────────────
+def _fts5_query(q: str) -> str:
+    """Слова пользователя → "слово"* AND ... (префиксный поиск, без синтаксиса FTS5)."""
+    words = re.findall(r"\w+", q, flags=re.UNICODE)
+    return " ".join(f'"{w}"*' for w in words[:10])
+
+
+def search(q: str, kinds=("news", "course"), limit: int = 20) -> list[SearchHit]:
+    q = (q or "").strip()
+    if not q:
+        return []
+    dialect = _dialect()
+    kinds = [k for k in kinds if k in KIND_CODES]
+
+    if dialect == "postgresql":
+        rows = db.session.execute(db.text("""
+            SELECT d.kind, d.ref_id, d.rank,
+                   ts_headline('russian', d.title, query,
+                               'StartSel=' || chr(2) || ', StopSel=' || chr(3) || ', HighlightAll=true') AS title,
+                   ts_headline('russian', d.body, query,
+                               'StartSel=' || chr(2) || ', StopSel=' || chr(3) ||
+                               ', MaxWords=35, MinWords=12, MaxFragments=2, FragmentDelimiter=" … "') AS snippet
+            FROM (
+                SELECT doc.kind, doc.ref_id, doc.title, doc.body, ts_rank_cd(doc.tsv, query) AS rank, query
+                FROM search_documents doc, websearch_to_tsquery('russian', :q) AS query
+                WHERE doc.tsv @@ query AND doc.kind = ANY(:kinds)
+                ORDER BY rank DESC
+                LIMIT :limit
+            ) d
+            ORDER BY d.rank DESC"""), {"q": q, "kinds": kinds, "limit": limit}).all()
+    elif dialect == "sqlite":
+        match = _fts5_query(q)
+        if not match:
+            return []
+        placeholders = ", ".join(f":k{i}" for i in range(len(kinds)))
+        params = {"match": match, "limit": limit, **{f"k{i}": k for i, k in enumerate(kinds)}}
+        rows = db.session.execute(db.text(f"""
+            SELECT kind, ref_id, bm25(search_fts, 5.0, 1.0) AS rank,
+                   highlight(search_fts, 0, char(2), char(3)) AS title,
+                   snippet(search_fts, 1, char(2), char(3), ' … ', 24) AS snippet
+            FROM search_fts
+            WHERE search_fts MATCH :match AND kind IN ({placeholders})
+            ORDER BY rank
+            LIMIT :limit"""), params).all()
+    else:
+        return []
+
+    return [SearchHit(kind=r.kind, ref_id=int(r.ref_id), title=_highlight(r.title),
+                      snippet=_highlight(r.snippet), rank=float(r.rank)) for r in rows]
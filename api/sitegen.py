@@ -0,0 +1,311 @@
+# api/sitegen.py
+"""
+Статический экспорт публичных страниц для раздачи с CDN без запуска Python.
+
+`flask --app api.index site-export` рендерит через test client все публичные
+страницы (главная, лыжи, зал, контакты, новости и каждая новость, все страницы
+видеокурсов) и кладёт их в OUT/_site/ с теми же путями:
+
+    /                  → _site/index.html
+    /ski-resort.html   → _site/ski-resort.html
+    /news              → _site/news/index.html
+    /news/42           → _site/news/42/index.html
+    /courses?page=3    → _site/courses/page/3/index.html   (page=1 — это /courses)
+
+Рядом — static/ и assets/ (файлы с хэшем в имени), так что CDN отдаёт всё сам;
+vercel.json переписывает публичные URL на эти файлы, а /admin*, /submit* и всё,
+чего нет в экспорте, уходит во Flask. Страницы лежат в _site/, а не в корне,
+чтобы /news?cursor=… и /courses?page=N не совпали с файлом по пути раньше rewrites.
+Страницы отдельных новостей (/news/<id>) на Vercel не переписываются на экспорт:
+rewrite не умеет «файла нет — во Flask», и новость, созданная после сборки,
+отдавала бы 404 до следующего деплоя. Их отдаёт функция (кэш страниц + ETag),
+экспорт _site/news/<id>/ остаётся для раздачи через nginx.
+
+Инкрементальная перегенерация: в _site/manifest.json записано, от каких типов
+контента зависит каждая страница и версии контента на момент рендера.
+  • `site-export --changed` перерисует только страницы, чьи типы изменились,
+    новые страницы (новая новость) и удалит исчезнувшие;
+  • в долгоживущем процессе touch(kind, ref_id) из content_changed() копит
+    изменения и фоновый поток перерисовывает именно их: правка новости 42 —
+    это /news/42, /news и главная, а не весь архив.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from api.models import ContentVersion, db
+
+SITE_DIR = "_site"
+MANIFEST = "manifest.json"
+
+
+@dataclass
+class SitePage:
+    path: str                 # URL
+    endpoint: str
+    kinds: tuple[str, ...]    # от каких типов контента зависит
+    ref_id: int | None = None # для страниц одной записи (/news/<id>)
+
+    @property
+    def file(self) -> str:
+        """Путь файла внутри _site/."""
+        path, _, query = self.path.partition("?")
+        if query.startswith("page="):
+            return f"{path.strip('/')}/page/{query[5:]}/index.html"
+        if path.endswith(".html"):
+            return path.lstrip("/")
+        return f"{path.strip('/')}/index.html".lstrip("/")
+
+
+class SiteGenerator:
+    def __init__(self, app, out_dir: str, list_pages, versions=None, debounce: float = 2.0):
+        """
+        list_pages() → [(url, ref_id | None)] — все страницы сайта на текущий момент.
+        versions — ContentVersions (для --changed).
+        """
+        self.app = app
+        self.out_dir = out_dir
+        self.list_pages = list_pages
+        self.versions = versions
+        self.debounce = debounce
+        self._dirty: set[tuple[str, int | None]] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ───────────── страницы ─────────────
+    def pages(self) -> list[SitePage]:
+        adapter = self.app.url_map.bind("localhost")
+        result = []
+        for url, ref_id in self.list_pages():
+            endpoint, _ = adapter.match(url.partition("?")[0])
+            kinds = getattr(self.app.view_functions[endpoint], "content_kinds", ())
+            result.append(SitePage(url, endpoint, tuple(kinds), ref_id))
+        return result
+
+    def _site_path(self, *parts: str) -> str:
+        return os.path.join(self.out_dir, SITE_DIR, *parts)
+
+    def _load_manifest(self) -> dict:
+        try:
+            with open(self._site_path(MANIFEST), encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {"pages": {}, "versions": {}}
+
+    def _current_versions(self, kinds) -> dict[str, int]:
+        if self.versions is None:
+            return {}
+        return {kind: version for kind, (version, _) in self.versions.get(list(kinds)).items()}
+
+    # ───────────── рендер ─────────────
+    def _write(self, rel: str, data: bytes) -> None:
+        path = self._site_path(rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)   # атомарно: CDN/nginx никогда не видит полуфайл
+
+    def render(self, pages: list[SitePage]) -> tuple[dict[str, int], list[SitePage]]:
+        """Возвращает (статистика, успешно отрендеренные страницы)."""
+        stats, done = {"rendered": 0, "failed": 0}, []
+        client = self.app.test_client()
+        for page in pages:
+            resp = client.get(page.path)
+            if resp.status_code != 200:
+                stats["failed"] += 1
+                print(f"[SITE] {page.path}: HTTP {resp.status_code}, пропущено")
+                continue
+            self._write(page.file, resp.get_data())
+            stats["rendered"] += 1
+            done.append(page)
+        return stats, done
+
+    def _save_manifest(self, pages: list[SitePage], removed: list[str]) -> None:
+        manifest = self._load_manifest()
+        by_path = manifest.setdefault("pages", {})
+        for path in removed:
+            info = by_path.pop(path, None)
+            if info:
+                path = self._site_path(info["file"])
+                try:
+                    os.remove(path)
+                    if os.path.basename(path) == "index.html":
+                        os.rmdir(os.path.dirname(path))   # news/42/ — пустой каталог тоже убрать
+                except OSError:
+                    pass
+        for page in pages:
+            by_path[page.path] = {"file": page.file, "endpoint": page.endpoint, "kinds": list(page.kinds)}
+        kinds = {k for info in by_path.values() for k in info["kinds"]}
+        manifest["versions"] = self._current_versions(sorted(kinds))
+        self._write(MANIFEST, json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True).encode())
+
+    # ───────────── режимы ─────────────
+    def export_all(self, assets=None) -> dict[str, int]:
+        """Полный экспорт: все страницы + static/ + assets/ с хэшами."""
+        with self.app.app_context():
+            pages = self.pages()
+            old = set(self._load_manifest().get("pages", {}))
+            stats, done = self.render(pages)
+            self._save_manifest(done, sorted(old - {p.path for p in pages}))
+        if assets is not None:
+            stats["assets"] = self.copy_assets(assets)
+        return stats
+
+    def export_changed(self) -> dict[str, int]:
+        """Только страницы, чьи типы контента сменили версию, новые и удалённые."""
+        with self.app.app_context():
+            manifest = self._load_manifest()
+            known, old_versions = manifest.get("pages", {}), manifest.get("versions", {})
+            pages = self.pages()
+            current = self._current_versions({k for p in pages for k in p.kinds})
+            changed = {k for k, v in current.items() if old_versions.get(k) != v}
+            todo = [p for p in pages
+                    if p.path not in known or changed.intersection(p.kinds)]
+            removed = sorted(set(known) - {p.path for p in pages})
+            stats, done = self.render(todo)
+            self._save_manifest(done, removed)
+        stats["removed"] = len(removed)
+        return stats
+
+    def regenerate(self, touched: set[tuple[str, int | None]]) -> dict[str, int]:
+        """Страницы, затронутые правками (kind, ref_id); ref_id=None — все записи этого типа."""
+        with self.app.app_context():
+            known = self._load_manifest().get("pages", {})
+            pages = self.pages()
+            todo = []
+            for page in pages:
+                hits = [ref for kind, ref in touched if kind in page.kinds]
+                if page.path not in known:
+                    todo.append(page)
+                elif hits and (page.ref_id is None or None in hits or page.ref_id in hits):
+                    todo.append(page)
+            removed = sorted(set(known) - {p.path for p in pages})
+            stats, done = self.render(todo)
+            self._save_manifest(done, removed)
+        stats["removed"] = len(removed)
+        return stats
+
+    def copy_assets(self, assets) -> int:
+        """static/ как есть + assets/<имя.хэш.ext> для ссылок из url_for('static', ...)."""
+        static_out = os.path.join(self.out_dir, "static")
+        assets_out = os.path.join(self.out_dir, "assets")
+        count = 0
+        for rel, _digest in assets.build(compress=False).items():
+            src = os.path.join(assets.static_folder, rel)
+            for dst in (os.path.join(static_out, rel), os.path.join(assets_out, assets.hashed_name(rel))):
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                shutil.copy2(src, dst)
+            count += 1
+        return count
+
+    # ───────────── фоновая перегенерация ─────────────
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="site-regen", daemon=True)
+            self._thread.start()
+
+    def touch(self, kind: str, ref_id: int | None = None) -> None:
+        with self._lock:
+            self._dirty.add((kind, ref_id))
+        self._wake.set()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # debounce: серия правок подряд (или bulk-импорт) → один проход
+            while self._wake.wait(self.debounce):
+                self._wake.clear()
+            with self._lock:
+                touched, self._dirty = self._dirty, set()
+            try:
+                stats = self.regenerate(touched)
+                print(f"[SITE] перегенерация {sorted(touched, key=str)}: {stats}")
+            except Exception as e:  # noqa: BLE001
+                with self.app.app_context():
+                    db.session.rollback()
+                print(f"[SITE] ошибка перегенерации: {e}")
+
+
+class DeployHook:
+    """
+    Vercel Deploy Hook вне запросов и не на каждую правку.
+
+    content_changed() только поднимает версии контента (content_versions.updated_at).
+    flush() — из /cron/site-deploy или фонового потока — дёргает хук, если после
+    прошлого деплоя были правки, а последняя из них старше quiet секунд: серия
+    правок в админке → один деплой. Время прошлого вызова — строка content_versions
+    с kind=MARK; её условный UPDATE не даёт двум инстансам дёрнуть хук дважды.
+    """
+    MARK = "site_deploy"
+
+    def __init__(self, app, url: str | None, kinds, quiet: float = 120, timeout: float = 10):
+        self.app = app
+        self.url = url
+        self.kinds = tuple(kinds)
+        self.quiet = quiet
+        self.timeout = timeout
+        self._thread: threading.Thread | None = None
+
+    def flush(self, now: datetime | None = None) -> dict:
+        if not self.url:
+            return {"triggered": False, "reason": "SITE_DEPLOY_HOOK не задан"}
+        now = now or datetime.utcnow()
+        changed = db.session.query(db.func.max(ContentVersion.updated_at)).filter(
+            ContentVersion.kind.in_(self.kinds)).scalar()
+        mark = db.session.get(ContentVersion, self.MARK)
+        deployed = mark.updated_at if mark else None
+        if changed is None or (deployed and changed <= deployed):
+            return {"triggered": False, "reason": "правок после деплоя нет"}
+        if changed > now - timedelta(seconds=self.quiet):
+            return {"triggered": False, "reason": f"ждём {self.quiet:.0f} с без правок"}
+
+        if mark is None:
+            db.session.add(ContentVersion(kind=self.MARK, version=1, updated_at=now))
+            claimed = 1
+        else:
+            claimed = (db.session.query(ContentVersion)
+                       .filter(ContentVersion.kind == self.MARK, ContentVersion.updated_at == deployed)
+                       .update({ContentVersion.version: ContentVersion.version + 1,
+                                ContentVersion.updated_at: now}, synchronize_session=False))
+        try:
+            db.session.commit()
+        except Exception:  # noqa: BLE001 — строку MARK одновременно создал другой инстанс
+            db.session.rollback()
+            claimed = 0
+        if not claimed:
+            return {"triggered": False, "reason": "деплой уже запущен другим инстансом"}
+        try:
+            urllib.request.urlopen(urllib.request.Request(self.url, method="POST"), timeout=self.timeout).close()
+        except Exception as e:  # noqa: BLE001
+            print(f"[SITE] Deploy Hook не сработал: {e}")
+            # вернуть отметку: следующая проверка попробует снова
+            (db.session.query(ContentVersion).filter_by(kind=self.MARK)
+             .update({ContentVersion.updated_at: deployed or datetime(1970, 1, 1)}, synchronize_session=False))
+            db.session.commit()
+            return {"triggered": False, "reason": str(e)}
+        print(f"[SITE] Deploy Hook: правки до {changed:%Y-%m-%d %H:%M:%S} UTC")
+        return {"triggered": True}
+
+    def start(self) -> None:
+        """Долгоживущий процесс: проверять раз в quiet секунд (на serverless — /cron/site-deploy)."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="site-deploy", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.quiet)
+            with self.app.app_context():
+                try:
+                    self.flush()
+                except Exception as e:  # noqa: BLE001
+                    db.session.rollback()
+                    print(f"[SITE] ошибка проверки деплоя: {e}")
@@ -0,0 +1,204 @@
+# api/templating.py
+"""
+Ускорение Jinja: кэш байткода шаблонов и кэш фрагментов.
+
+Байткод. Каждый cold start компилирует шаблоны из исходников заново
+(index.html, news_list_all.html, админка…). LayeredBytecodeCache читает
+скомпилированный байткод из двух мест:
+  • bundle — каталог, собранный при деплое (`flask templates-compile`), только чтение;
+  • tmp    — записываемый каталог (/tmp на serverless): сюда попадает всё,
+             чего нет в bundle (или что в нём устарело).
+Ключ — имя шаблона, а не абсолютный путь: на сборке и в функции пути разные.
+Jinja сама сверяет контрольную сумму исходника и версию Python, так что
+устаревший или чужой байткод просто игнорируется.
+
+Потоковый рендер. stream_page() — flask.stream_template, но кусками ~8 КБ:
+генератор Jinja отдаёт строку на каждый узел шаблона, и без склейки каждый
+кусок стал бы отдельным блоком сжатия (api/compression.py) и chunk'ом HTTP.
+Длинные списки (/news, списки админки) начинают уходить клиенту с <head>,
+не собирая всю страницу в памяти. Сам генератор контекст запроса не держит —
+в stream_with_context его оборачивают ровно один раз: PageCache.cached для
+публичных страниц, stream_response() для остальных. Вложенные
+stream_with_context снимаются со стека в неверном порядке, если ответ не
+дочитан («Popped wrong request context»).
+
+Фрагменты. Тег {% cache "news-card", article.id, article.updated_at %}…{% endcache %}
+кэширует разметку карточки по id записи и времени её правки: при повторном
+рендере страницы (другая страница списка, сброс кэша страниц после правки
+соседней новости) striptags/truncate и responsive_img для неизменных карточек
+не выполняются — строка собирается из готовых кусков.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from typing import Iterator
+
+from flask import Response, current_app, stream_with_context
+from flask.signals import before_render_template, template_rendered
+from jinja2 import BytecodeCache, nodes
+from jinja2.ext import Extension
+
+STREAM_CHUNK = 8 * 1024
+
+
+class LayeredBytecodeCache(BytecodeCache):
+    def __init__(self, tmp_dir: str | None, bundle_dir: str | None = None):
+        self.tmp_dir = tmp_dir
+        self.bundle_dir = bundle_dir
+        self.stats = {"bundle": 0, "tmp": 0, "compiled": 0}
+        if tmp_dir:
+            try:
+                os.makedirs(tmp_dir, exist_ok=True)
+            except OSError as e:
+                print(f"[JINJA] каталог кэша {tmp_dir} недоступен: {e}")
+                self.tmp_dir = None
+
+    def get_cache_key(self, name: str, filename: str | None = None) -> str:
+        return hashlib.sha1(name.encode("utf-8")).hexdigest()
+
+    def _path(self, directory: str, key: str) -> str:
+        return os.path.join(directory, f"{key}.jinja.cache")
+
+    def load_bytecode(self, bucket) -> None:
+        for source, directory in (("tmp", self.tmp_dir), ("bundle", self.bundle_dir)):
+            if not directory:
+                continue
+            try:
+                with open(self._path(directory, bucket.key), "rb") as fh:
+                    bucket.load_bytecode(fh)
+            except OSError:
+                continue
+            if bucket.code is not None:     # checksum/версия совпали
+                self.stats[source] += 1
+                return
+        self.stats["compiled"] += 1
+
+    def dump_bytecode(self, bucket) -> None:
+        directory = self.tmp_dir or self.bundle_dir
+        if not directory:
+            return
+        path = self._path(directory, bucket.key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "wb") as fh:
+                bucket.write_bytecode(fh)
+            os.replace(tmp, path)          # параллельные процессы не видят полуфайл
+        except OSError as e:
+            print(f"[JINJA] не удалось сохранить байткод {bucket.key}: {e}")
+
+    def clear(self) -> None:
+        for directory in (self.tmp_dir, self.bundle_dir):
+            if directory and os.path.isdir(directory):
+                for entry in os.scandir(directory):
+                    if entry.name.endswith(".jinja.cache"):
+                        os.remove(entry.path)
+
+
+def compile_templates(env, bundle_dir: str, filter_func=None) -> int:
+    """Скомпилировать все шаблоны в bundle_dir (при деплое)."""
+    os.makedirs(bundle_dir, exist_ok=True)
+    cache = LayeredBytecodeCache(None, bundle_dir)
+    original, env.bytecode_cache = env.bytecode_cache, cache
+    count = 0
+    try:
+        env.cache = {} if env.cache is not None else None   # иначе шаблон возьмётся из памяти
+        for name in env.list_templates(filter_func=filter_func):
+            env.get_template(name)
+            count += 1
+    finally:
+        env.bytecode_cache = original
+    return count
+
+
+class FragmentCache:
+    """LRU готовых кусков разметки в памяти процесса."""
+
+    def __init__(self, max_entries: int = 2000, enabled: bool = True):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "hits": self.hits, "misses": self.misses}
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache "имя", ключ1, ключ2 %}…{% endcache %} — кэш из environment.fragment_cache."""
+    tags = {"cache"}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            args.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        return nodes.CallBlock(self.call_method("_render", [nodes.List(args)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, key: list, caller):
+        cache = self.environment.fragment_cache
+        if cache is None or not cache.enabled:
+            return caller()
+        key = tuple(key)
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value)
+        return value
+
+
+def stream_page(template_name: str, chunk_size: int = STREAM_CHUNK, **context) -> Iterator[str]:
+    """HTML шаблона кусками не меньше chunk_size символов (кроме последнего)."""
+    # как flask.stream_template, но без своего stream_with_context
+    app = current_app._get_current_object()
+    template = app.jinja_env.get_or_select_template(template_name)
+    app.update_template_context(context)
+    before_render_template.send(app, _async_wrapper=app.ensure_sync, template=template, context=context)
+    return _rechunk(app, template, context, chunk_size)
+
+
+def _rechunk(app, template, context: dict, chunk_size: int) -> Iterator[str]:
+    parts, size = [], 0
+    for piece in template.generate(context):
+        parts.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts)
+    template_rendered.send(app, _async_wrapper=app.ensure_sync, template=template, context=context)
+
+
+def stream_response(template_name: str, **context) -> Response:
+    """Потоковый HTML-ответ для страниц вне кэша (списки админки)."""
+    return Response(stream_with_context(stream_page(template_name, **context)), mimetype="text/html")
@@ -0,0 +1,94 @@
+# api/youtube.py
+"""
+YouTube-видео на странице курсов: «фасад» вместо iframe.
+
+Полный iframe YouTube — это мегабайты JS и десятки запросов на каждое видео
+ещё до того, как страница станет интерактивной. Вместо него рисуется превью
+(обычная картинка с i.ytimg.com) с кнопкой ▶, а iframe вставляет static/script.js
+только по клику.
+
+Какие превью у видео есть, известно не заранее: mqdefault (320×180) и hqdefault
+(480×360) есть всегда, sddefault (640×480) и maxresdefault (1280×720) — не у всех.
+Поэтому при сохранении курса в админке они проверяются HEAD-запросами, и готовый
+srcset с размерами пишется в Course.thumbnail (JSON):
+
+    {"src": <url>, "w": 480, "h": 360, "srcset": [[url, 320], ...], "checked": true}
+
+checked=false — проверить не удалось (нет сети), записан только гарантированный
+набор; `flask courses-thumbnails` перепроверит такие записи.
+"""
+import re
+import urllib.error
+import urllib.request
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+from api.metrics import external_call
+
+THUMB_HOST = "https://i.ytimg.com/vi"
+# (имя, ширина, высота, есть ли всегда)
+SIZES = (
+    ("mqdefault", 320, 180, True),
+    ("hqdefault", 480, 360, True),
+    ("sddefault", 640, 480, False),
+    ("maxresdefault", 1280, 720, False),
+)
+_ID_RE = re.compile(r"^[A-Za-z0-9_-]{11}$")
+
+
+def parse_id(value: str | None) -> str | None:
+    """ID из самого ID или ссылки (watch?v=, youtu.be/, /embed/, /shorts/). None — не похоже на видео."""
+    value = (value or "").strip()
+    if _ID_RE.match(value):
+        return value
+    parts = urlsplit(value if "//" in value else "https://" + value)
+    host = parts.netloc.lower().removeprefix("www.").removeprefix("m.")
+    candidate = None
+    if host == "youtu.be":
+        candidate = parts.path.strip("/").split("/")[0]
+    elif host.endswith("youtube.com") or host.endswith("youtube-nocookie.com"):
+        candidate = (parse_qs(parts.query).get("v") or [None])[0]
+        if not candidate:
+            segments = parts.path.strip("/").split("/")
+            if len(segments) >= 2 and segments[0] in ("embed", "shorts", "live", "v"):
+                candidate = segments[1]
+    return candidate if candidate and _ID_RE.match(candidate) else None
+
+
+def thumb_url(youtube_id: str, name: str) -> str:
+    return f"{THUMB_HOST}/{youtube_id}/{name}.jpg"
+
+
+def http_exists(url: str, timeout: float = 3) -> bool | None:
+    """HEAD-запрос: True/False — есть/нет; None — не удалось проверить."""
+    try:
+        with external_call("youtube"):
+            with urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=timeout) as resp:
+                return resp.status == 200
+    except urllib.error.HTTPError as e:
+        return False if e.code == 404 else None
+    except Exception:  # noqa: BLE001
+        return None
+
+
+def thumbnails(youtube_id: str, probe: Callable[[str], bool | None] | None = http_exists) -> dict:
+    """Описание превью для Course.thumbnail; probe=None — только гарантированные размеры."""
+    srcset, checked = [], probe is not None
+    for name, width, _height, always in SIZES:
+        if not always:
+            if probe is None:
+                continue
+            exists = probe(thumb_url(youtube_id, name))
+            if exists is None:
+                checked = False
+            if not exists:
+                continue
+        srcset.append([thumb_url(youtube_id, name), width])
+    # src для браузеров без srcset — hqdefault; размеры — для width/height (без сдвига вёрстки)
+    return {"src": thumb_url(youtube_id, "hqdefault"), "w": 480, "h": 360,
+            "srcset": srcset, "checked": checked}
+
+
+def course_thumbnail(course) -> dict:
+    """Сохранённое описание превью курса или гарантированный набор (курс из импорта и т.п.)."""
+    return course.thumbnail or thumbnails(course.youtube_id, probe=None)
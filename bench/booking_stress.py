@@ -0,0 +1,311 @@
+# bench/booking_stress.py
+"""
+Стресс-тест записи на занятия (api/booking.py): много клиентов одновременно
+бронируют несколько занятий с маленькой вместимостью.
+
+Создаётся услуга и по правилу расписания на каждое занятие (завтра, разное
+время), generate_sessions раскладывает их в ClassSession. Дальше --processes
+процессов по --threads потоков стартуют в один момент и делают по --attempts
+попыток: случайное занятие, 1…--max-seats мест; часть успешных броней
+(--cancel-rate) тут же отменяется — места должны вернуться в счётчик.
+С --http запросы идут POST /book через локальный WSGI-сервер werkzeug
+(потоки одного процесса), иначе — прямо в booking.book().
+
+Перед прогоном — сценарий через POST /book с включёнными лимитами форм: отказ
+(мест меньше, чем просят) и повтор тем же телефоном на меньшее число мест
+должен дать настоящую бронь, а не «спасибо» без записи.
+
+Проверки после прогона, для каждого занятия:
+  • booked <= capacity (нет овербукинга);
+  • booked == сумма мест подтверждённых броней (счётчик не разошёлся с бронями);
+  • ошибок, кроме отказов BookingError (нет мест, 4xx), нет.
+
+Примеры:
+    python bench/booking_stress.py                                   # временная SQLite
+    python bench/booking_stress.py --processes 4 --threads 8 --attempts 50
+    DATABASE_URL=postgresql://localhost/sport_club python bench/booking_stress.py --processes 8
+    python bench/booking_stress.py --http --threads 32
+
+Код выхода 1 — нарушен инвариант или были ошибки (для CI).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from datetime import timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from bench.run import percentile  # noqa: E402
+
+
+def setup(sessions: int, capacity: int) -> tuple[list[int], int, list[int]]:
+    """Услуга, правила на завтра и их занятия. Возвращает (id занятий, id услуги, id правил)."""
+    from api.index import app, db, Service, SCHEDULE_TZ
+    from api import booking
+    from api.models import ClassSession, ScheduleRule
+
+    with app.app_context():
+        now = booking.club_now(SCHEDULE_TZ)
+        tomorrow = now.date() + timedelta(days=1)
+        service = Service(name=f"Стресс-тест {now:%Y%m%d%H%M%S}", price=0, section="gym")
+        db.session.add(service)
+        db.session.flush()
+        rules = [ScheduleRule(service_id=service.id, weekday=tomorrow.weekday(),
+                              start_time=(now.replace(hour=8, minute=0) + timedelta(minutes=30 * i)).time(),
+                              duration_min=30, capacity=capacity, valid_from=tomorrow, valid_until=tomorrow)
+                 for i in range(sessions)]
+        db.session.add_all(rules)
+        db.session.commit()
+        rule_ids = [rule.id for rule in rules]
+        booking.generate_sessions(now, 2)
+        session_ids = list(db.session.execute(
+            db.select(ClassSession.id).where(ClassSession.rule_id.in_(rule_ids))
+            .order_by(ClassSession.id)).scalars())
+        return session_ids, service.id, rule_ids
+
+
+def cleanup(service_id: int, rule_ids: list[int], session_ids: list[int]) -> None:
+    from api.index import app, db, Service
+    from api.models import Booking, ClassSession, ScheduleRule
+
+    with app.app_context():
+        db.session.execute(db.delete(Booking).where(Booking.session_id.in_(session_ids)))
+        db.session.execute(db.delete(ClassSession).where(ClassSession.id.in_(session_ids)))
+        db.session.execute(db.delete(ScheduleRule).where(ScheduleRule.id.in_(rule_ids)))
+        db.session.execute(db.delete(Service).where(Service.id == service_id))
+        db.session.commit()
+
+
+# ───────────────────────── Сценарий ─────────────────────────
+def check_retry_after_refusal() -> list[str]:
+    """Отказ 409 и исправленный повтор тем же телефоном — через form_guard, как с сайта."""
+    import api.index as site
+    from api.models import Booking, ClassSession
+
+    session_ids, service_id, rule_ids = setup(1, 2)
+    session_id, phone = session_ids[0], "+7 700 000 00 01"
+    client, problems = site.app.test_client(), []
+    json_accept = {"Accept": "application/json"}
+    enabled, site.RATE_LIMIT_ENABLED = site.RATE_LIMIT_ENABLED, True
+    try:
+        steps = [
+            ("3 места из 2", {"seats": 3, "userPhone": phone}, json_accept, 409),
+            ("повтор на 1 место", {"seats": 1, "userPhone": phone}, json_accept, 201),
+            ("повтор формой", {"seats": 1, "userPhone": phone}, {}, 302),
+            ("мест нет", {"seats": 1, "userPhone": "+7 700 000 00 02"}, json_accept, 409),
+        ]
+        for title, form, headers, expected in steps:
+            resp = client.post("/book", data={"session_id": session_id, "userName": "Проверка", **form},
+                               headers=headers)
+            if resp.status_code != expected:
+                problems.append(f"сценарий «{title}»: {resp.status_code}, ожидался {expected}")
+        with site.app.app_context():
+            booked = site.db.session.get(ClassSession, session_id).booked
+            count = site.db.session.query(Booking).filter_by(session_id=session_id).count()
+        if (booked, count) != (2, 2):
+            problems.append(f"сценарий: занято {booked}, броней {count}, ожидалось 2 и 2")
+    finally:
+        site.RATE_LIMIT_ENABLED = enabled
+        cleanup(service_id, rule_ids, session_ids)
+    print(f"[stress] сценарий отказ → повтор: {'ok' if not problems else problems}", file=sys.stderr)
+    return problems
+
+
+# ───────────────────────── Клиенты ─────────────────────────
+def direct_booker(app):
+    from api import booking
+    from api.index import SCHEDULE_TZ
+
+    def book(session_id: int, seats: int, name: str, phone: str) -> tuple[int | None, int]:
+        try:
+            with app.app_context():
+                reservation = booking.book(session_id, seats, name, phone, booking.club_now(SCHEDULE_TZ))
+                return reservation.id, 201
+        except booking.BookingError as e:
+            return None, e.status
+    return book
+
+
+def http_booker(base_url: str):
+    def book(session_id: int, seats: int, name: str, phone: str) -> tuple[int | None, int]:
+        data = urllib.parse.urlencode({"session_id": session_id, "seats": seats,
+                                       "userName": name, "userPhone": phone}).encode()
+        req = urllib.request.Request(base_url + "/book", data=data, headers={"Accept": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return json.loads(resp.read())["id"], resp.status
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise
+            return None, e.code
+    return book
+
+
+def run_clients(app, book, session_ids: list[int], threads: int, attempts: int, max_seats: int,
+                cancel_rate: float, start_at: float, seed: int) -> dict:
+    """threads потоков по attempts попыток; результат — счётчики и задержки."""
+    from api import booking
+
+    results: list[tuple[Counter, list[float], list[str]]] = []
+
+    def client(n: int) -> None:
+        rnd = random.Random(seed * 10_000 + n)
+        stats, latencies, errors = Counter(), [], []
+        time.sleep(max(0.0, start_at - time.time()))
+        for i in range(attempts):
+            session_id, seats = rnd.choice(session_ids), rnd.randint(1, max_seats)
+            started = time.perf_counter()
+            try:
+                booking_id, status = book(session_id, seats, f"Клиент {seed}-{n}", f"7700{seed:03d}{n:03d}{i:04d}")
+            except Exception as e:  # noqa: BLE001 — считаем, а не падаем: нужен итог по всем
+                stats["errors"] += 1
+                errors.append(repr(e)[:300])
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if booking_id is None:
+                stats[f"refused_{status}"] += 1
+                continue
+            stats["booked"] += 1
+            stats["seats"] += seats
+            if rnd.random() < cancel_rate:
+                with app.app_context():
+                    booking.cancel(booking_id)
+                stats["cancelled"] += 1
+                stats["seats"] -= seats
+        results.append((stats, latencies, errors))
+
+    workers = [threading.Thread(target=client, args=(n,)) for n in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    total, latencies, errors = Counter(), [], []
+    for stats, lat, err in results:
+        total.update(stats)
+        latencies.extend(lat)
+        errors.extend(err)
+    return {"stats": dict(total), "latencies": latencies, "errors": errors[:20]}
+
+
+def process_main(payload: dict) -> dict:
+    """Один процесс-клиент: свои соединения с БД, потоки — прямые вызовы booking.book()."""
+    from api.index import app, db
+
+    with app.app_context():
+        db.engine.dispose(close=False)   # соединения родителя после fork не трогаем
+    return run_clients(app, direct_booker(app), **payload)
+
+
+# ───────────────────────── Проверка ─────────────────────────
+def verify(session_ids: list[int]) -> tuple[list[dict], list[str]]:
+    from api.index import app, db
+    from api.models import Booking, ClassSession
+
+    confirmed = (db.select(db.func.coalesce(db.func.sum(Booking.seats), 0))
+                 .where(Booking.session_id == ClassSession.id, Booking.status == "confirmed")
+                 .scalar_subquery())
+    with app.app_context():
+        rows = db.session.execute(
+            db.select(ClassSession.id, ClassSession.capacity, ClassSession.booked, confirmed.label("confirmed"))
+            .where(ClassSession.id.in_(session_ids)).order_by(ClassSession.id)).all()
+    report, problems = [], []
+    for row in rows:
+        report.append({"session": row.id, "capacity": row.capacity, "booked": row.booked,
+                       "confirmed_seats": row.confirmed})
+        if row.booked > row.capacity:
+            problems.append(f"занятие {row.id}: овербукинг {row.booked}/{row.capacity}")
+        if row.booked != row.confirmed:
+            problems.append(f"занятие {row.id}: счётчик {row.booked} ≠ местам в бронях {row.confirmed}")
+    return report, problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Стресс-тест параллельной записи на занятия")
+    parser.add_argument("--sessions", type=int, default=3, help="занятий, за которые идёт борьба")
+    parser.add_argument("--capacity", type=int, default=20, help="мест на занятии")
+    parser.add_argument("--processes", type=int, default=2, help="процессов-клиентов (без --http)")
+    parser.add_argument("--threads", type=int, default=8, help="потоков в процессе")
+    parser.add_argument("--attempts", type=int, default=25, help="попыток записи на поток")
+    parser.add_argument("--max-seats", type=int, default=2, help="мест в одной попытке: 1…N")
+    parser.add_argument("--cancel-rate", type=float, default=0.1, help="доля успешных броней, отменяемых сразу")
+    parser.add_argument("--http", action="store_true", help="через POST /book и локальный WSGI-сервер")
+    parser.add_argument("--keep", action="store_true", help="не удалять созданные записи (DATABASE_URL)")
+    args = parser.parse_args()
+
+    tmp = None
+    if not os.environ.get("DATABASE_URL"):
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "booking.db")
+    os.environ.setdefault("ADMIN_PASS", "bench")
+    os.environ.setdefault("DB_POOL_SIZE", str(args.threads))
+    os.environ.update(OUTBOX_WORKER="0", AUTO_MIGRATE="1", RATE_LIMIT_ENABLED="0")
+
+    from api.index import app
+
+    scenario_problems = check_retry_after_refusal()
+    session_ids, service_id, rule_ids = setup(args.sessions, args.capacity)
+    payload = {"session_ids": session_ids, "threads": args.threads, "attempts": args.attempts,
+               "max_seats": args.max_seats, "cancel_rate": args.cancel_rate}
+    print(f"[stress] {app.config['SQLALCHEMY_DATABASE_URI'].split('://')[0]}: занятия {session_ids}, "
+          f"мест {args.capacity}, спрос {args.threads * (1 if args.http else args.processes) * args.attempts} "
+          f"попыток", file=sys.stderr)
+
+    started = time.perf_counter()
+    if args.http:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *a, **kw):
+                pass
+
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            parts = [run_clients(app, http_booker(f"http://127.0.0.1:{server.server_port}"),
+                                 start_at=time.time() + 0.5, seed=0, **payload)]
+        finally:
+            server.shutdown()
+    else:
+        start_at = time.time() + 2.0          # все процессы стартуют одновременно
+        with multiprocessing.Pool(args.processes) as pool:
+            parts = pool.map(process_main, [{**payload, "start_at": start_at, "seed": p}
+                                            for p in range(args.processes)])
+    elapsed = time.perf_counter() - started
+
+    stats, latencies, errors = Counter(), [], []
+    for part in parts:
+        stats.update(part["stats"])
+        latencies.extend(part["latencies"])
+        errors.extend(part["errors"])
+    report, problems = verify(session_ids)
+    problems = scenario_problems + problems
+    if sum(row["booked"] for row in report) != stats["seats"]:
+        problems.append(f"клиенты насчитали {stats['seats']} мест, в занятиях {sum(r['booked'] for r in report)}")
+    if stats["errors"]:
+        problems.append(f"ошибок: {stats['errors']}")
+
+    print(json.dumps({"elapsed_s": round(elapsed, 2), "stats": dict(stats),
+                      "p50_ms": percentile(latencies, 50), "p99_ms": percentile(latencies, 99),
+                      "sessions": report, "errors": errors[:5], "problems": problems},
+                     ensure_ascii=False, indent=2))
+    if tmp is None and not args.keep:
+        cleanup(service_id, rule_ids, session_ids)
+    if tmp:
+        tmp.cleanup()
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# bench/checks.py
+"""
+Проверки путей ошибок, которые бенчмарк не видит: каждая функция check_* готовит
+данные во временной SQLite, прогоняет сценарий через приложение и возвращает
+список нарушений (пустой — всё в порядке).
+
+  • check_csv_formula_escape — имена и телефоны заявок с «=», «+», «-», «@»
+    уходят в /admin/leads.csv с префиксом «'» (Excel не выполнит их как формулу),
+    а экспорт услуг с такой ячейкой импортируется обратно без изменений;
+  • check_outbox_retry_dead_letter — drain_outbox против StandInSmtp (SMTP-заглушка
+    на 127.0.0.1): отказ сервера → повтор с backoff 30/60 с → 'dead' после
+    OUTBOX_MAX_ATTEMPTS; исправный сервер — письма пачки уходят одним соединением;
+  • check_outbox_lease_reclaim — письмо, зависшее в 'sending' дольше lease (упал
+    воркер), забирается и отправляется; свежий 'sending' не трогается, а зависшее
+    после последней попытки снимается в 'dead';
+  • check_media_superseded — MemoryBackend (фейк облака) и MediaUploader с одним
+    потоком: вторая правка фото, пока первая загрузка висит в бэкенде, побеждает;
+    файл первой загрузки и старое фото записи удаляются;
+  • check_media_reconcile — reconcile находит осиротевшие файлы в папках загрузок,
+    в dry-run ничего не трогает, с удалением — удаляет пачками только сирот старше
+    grace: файлы по ссылкам из БД, свежие и чужие папки остаются.
+
+Примеры:
+    python bench/checks.py                       # все проверки
+    python bench/checks.py csv_formula_escape    # только выбранные
+
+Код выхода 1 — есть нарушения (для CI).
+"""
+import base64
+import csv
+import io
+import json
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+ADMIN_PASS = "bench"
+ADMIN = {"Authorization": "Basic " + base64.b64encode(f"admin:{ADMIN_PASS}".encode()).decode()}
+
+
+# ───────────────────────── CSV ─────────────────────────
+def check_csv_formula_escape() -> list[str]:
+    import api.index as site
+
+    client, problems = site.app.test_client(), []
+    payloads = ['=HYPERLINK("http://evil.example","Клик")', "+cmd|' /C calc'!A0", "-2+3", "@SUM(A1:A2)"]
+    for value in payloads:
+        client.post("/submit", data={"userName": value, "userPhone": value, "source": "checks"})
+    with client.get("/admin/leads.csv", headers=ADMIN) as resp:
+        rows = list(csv.DictReader(io.StringIO(resp.get_data(as_text=True).lstrip("﻿"))))
+    names = {row["name"] for row in rows if row["source"] == "checks"}
+    for value in payloads:
+        if "'" + value not in names:
+            problems.append(f"leads.csv: «{value}» без префикса «'»")
+    for row in rows:
+        for column in ("name", "phone", "phone_raw"):
+            if row[column].startswith(("=", "+", "-", "@")):
+                problems.append(f"leads.csv: ячейка {column}={row[column]!r} начинается с формулы")
+
+    # экспорт → импорт: префикс снимается, данные не меняются
+    with site.app.app_context():
+        service = site.Service(name="Проверка CSV", section="gym", price=1000, description="=1+1 и -скидка")
+        site.db.session.add(service)
+        site.db.session.commit()
+        service_id = service.id
+    with client.get("/admin/bulk/export/services.csv", headers=ADMIN) as resp:
+        exported = resp.get_data()
+    client.post("/admin/bulk", headers={**ADMIN, "Accept": "application/json"},
+                data={"kind": "services", "file": (io.BytesIO(exported), "services.csv")})
+    with site.app.app_context():
+        description = site.db.session.get(site.Service, service_id).description
+    if description != "=1+1 и -скидка":
+        problems.append(f"services.csv: после импорта description={description!r}")
+    return problems
+
+
+# ───────────────────────── Outbox ─────────────────────────
+class StandInSmtp(socketserver.ThreadingTCPServer):
+    """
+    Минимальный SMTP-сервер для drain_outbox: EHLO/MAIL/RCPT/DATA/NOOP/QUIT без TLS
+    и авторизации. fail=True — на MAIL FROM отвечает 451 (временный отказ).
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SmtpSession)
+        self.fail = False
+        self.connections = 0
+        self.messages: list[str] = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _SmtpSession(socketserver.StreamRequestHandler):
+    def reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self) -> None:
+        server = self.server
+        server.connections += 1
+        self.reply("220 stand-in ESMTP")
+        while line := self.rfile.readline():
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 stand-in")
+            elif command.startswith("MAIL"):
+                self.reply("451 4.3.0 try again later" if server.fail else "250 OK")
+            elif command.startswith(("RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                data = []
+                while (chunk := self.rfile.readline()) not in (b".\r\n", b""):
+                    data.append(chunk.decode(errors="replace"))
+                server.messages.append("".join(data))
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+def _smtp_config(site, smtp: StandInSmtp, **overrides) -> dict:
+    return {**site.app.config, "SMTP_SERVER": "127.0.0.1", "SMTP_PORT": smtp.port, "SMTP_STARTTLS": False,
+            "SMTP_USERNAME": "", "SMTP_FROM": "site@example.test", "EMAIL_TO": "club@example.test",
+            "SMTP_TIMEOUT": 5, **overrides}
+
+
+def _clear_outbox(site) -> None:
+    from api.models import OutboxMessage
+
+    site.db.session.execute(site.db.delete(OutboxMessage))
+    site.db.session.commit()
+
+
+def check_outbox_retry_dead_letter() -> list[str]:
+    import api.index as site
+    from api.mailer import SmtpConnection, drain_outbox, enqueue_email
+    from api.models import OutboxMessage
+
+    smtp, problems = StandInSmtp(), []
+    config = _smtp_config(site, smtp, OUTBOX_MAX_ATTEMPTS=3, OUTBOX_RETRY_BASE=30, OUTBOX_BATCH_SIZE=10)
+    connection = SmtpConnection(config)
+    try:
+        with site.app.app_context():
+            _clear_outbox(site)
+            msg_id = enqueue_email("club@example.test", "Отказ SMTP", "<p>1</p>").id
+            smtp.fail = True
+            for attempt, delay in ((1, 30), (2, 60)):
+                started = datetime.utcnow()
+                stats = drain_outbox(config, connection)
+                msg = site.db.session.get(OutboxMessage, msg_id)
+                waited = (msg.next_attempt_at - started).total_seconds()
+                if stats["retry"] != 1 or msg.status != "pending" or msg.attempts != attempt:
+                    problems.append(f"попытка {attempt}: {stats}, {msg.status}, attempts={msg.attempts}")
+                if not delay - 1 <= waited <= delay + 5:
+                    problems.append(f"попытка {attempt}: следующая через {waited:.0f} с, ожидалось {delay}")
+                if "451" not in (msg.last_error or ""):
+                    problems.append(f"попытка {attempt}: last_error={msg.last_error!r}")
+                if drain_outbox(config, connection) != {"sent": 0, "retry": 0, "dead": 0}:
+                    problems.append(f"попытка {attempt}: письмо взято раньше backoff")
+                msg.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+                site.db.session.commit()
+            stats = drain_outbox(config, connection)
+            msg = site.db.session.get(OutboxMessage, msg_id)
+            if stats["dead"] != 1 or msg.status != "dead" or msg.attempts != 3:
+                problems.append(f"после 3 отказов: {stats}, {msg.status}, attempts={msg.attempts}")
+
+            smtp.fail, smtp.connections = False, 0
+            for n in range(3):
+                enqueue_email("club@example.test", f"Письмо {n}", f"<p>{n}</p>")
+            stats = drain_outbox(config, connection)
+            if stats != {"sent": 3, "retry": 0, "dead": 0} or len(smtp.messages) != 3:
+                problems.append(f"исправный SMTP: {stats}, получено {len(smtp.messages)}")
+            if smtp.connections != 1:
+                problems.append(f"пачка из 3 писем: соединений {smtp.connections}, ожидалось 1")
+            if site.db.session.get(OutboxMessage, msg_id).status != "dead":
+                problems.append("письмо в 'dead' отправлено повторно")
+    finally:
+        connection.close()
+        smtp.stop()
+    return problems
+
+
+def check_outbox_lease_reclaim() -> list[str]:
+    import api.index as site
+    from api.mailer import SmtpConnection, drain_outbox
+    from api.models import OutboxMessage
+
+    smtp, problems = StandInSmtp(), []
+    config = _smtp_config(site, smtp, OUTBOX_MAX_ATTEMPTS=3)
+    connection = SmtpConnection(config)
+    try:
+        with site.app.app_context():
+            _clear_outbox(site)
+            now = datetime.utcnow()
+            rows = {
+                "stuck": OutboxMessage(to_addr="club@example.test", subject="Зависло", body_html="<p>1</p>",
+                                       status="sending", attempts=1, locked_at=now - timedelta(minutes=11)),
+                "fresh": OutboxMessage(to_addr="club@example.test", subject="Отправляется", body_html="<p>2</p>",
+                                       status="sending", attempts=1, locked_at=now - timedelta(minutes=1)),
+                "exhausted": OutboxMessage(to_addr="club@example.test", subject="Падает", body_html="<p>3</p>",
+                                           status="sending", attempts=3, locked_at=now - timedelta(minutes=30)),
+            }
+            site.db.session.add_all(rows.values())
+            site.db.session.commit()
+            ids = {name: msg.id for name, msg in rows.items()}
+            stats = drain_outbox(config, connection)
+            site.db.session.expire_all()
+            got = {name: (site.db.session.get(OutboxMessage, msg_id).status,
+                          site.db.session.get(OutboxMessage, msg_id).attempts) for name, msg_id in ids.items()}
+            expected = {"stuck": ("sent", 2), "fresh": ("sending", 1), "exhausted": ("dead", 4)}
+            if got != expected:
+                problems.append(f"после lease: {got}, ожидалось {expected}")
+            if stats != {"sent": 1, "retry": 0, "dead": 1}:
+                problems.append(f"счётчики: {stats}")
+            if [m for m in smtp.messages if "Subject:" in m and "Отправляется" in m]:
+                problems.append("письмо со свежим lease отправлено вторым воркером")
+    finally:
+        connection.close()
+        smtp.stop()
+    return problems
+
+
+# ───────────────────────── Медиа ─────────────────────────
+# 1×1 GIF: images.load открывает его без ошибок (если Pillow есть)
+TINY_GIF = (b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+            b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;")
+
+
+def _gated_backend():
+    """MemoryBackend, чья первая store() ждёт release — загрузка «висит» в облаке."""
+    from api.media import MemoryBackend
+
+    class GatedBackend(MemoryBackend):
+        def __init__(self):
+            super().__init__()
+            self.entered, self.release = threading.Event(), threading.Event()
+
+        def store(self, up, img, widths, formats):
+            if not self.entered.is_set():
+                self.entered.set()
+                self.release.wait(10)
+            return super().store(up, img, widths, formats)
+
+    return GatedBackend()
+
+
+def check_media_superseded() -> list[str]:
+    import api.index as site
+    from api.media import MediaUploader, Upload
+
+    backend, problems = _gated_backend(), []
+    uploader = MediaUploader(site.app, backend, site.IMAGE_WIDTHS, site.image_formats, workers=1)
+    field = site.COACH_PHOTO
+    backend.files["coaches/old"] = (b"old", time.time())
+
+    def upload(name: str) -> Upload:
+        return Upload(TINY_GIF, name, field.rel_subdir, field.folder)
+
+    with site.app.app_context():
+        coach = site.Coach(name="Проверка медиа", section="ski", photo_path=f"{backend.base_url}/coaches/old")
+        first = uploader.mark_pending(coach, field)
+        site.db.session.add(coach)
+        site.db.session.commit()
+        coach_id = coach.id
+        uploader.enqueue(field, coach_id, first, upload("first.gif"))
+    if not backend.entered.wait(10):
+        return ["первая загрузка не дошла до бэкенда"]
+
+    with site.app.app_context():
+        coach = site.db.session.get(site.Coach, coach_id)
+        second = uploader.mark_pending(coach, field)
+        site.db.session.commit()
+        uploader.enqueue(field, coach_id, second, upload("second.gif"))
+    backend.release.set()
+    uploader.wait()
+
+    with site.app.app_context():
+        coach = site.db.session.get(site.Coach, coach_id)
+        path, status = coach.photo_path, coach.photo_status
+    files = set(backend.files)
+    if status is not None:
+        problems.append(f"статус после загрузки: {status!r}")
+    if len(files) != 1 or path != f"{backend.base_url}/{next(iter(files), '')}":
+        problems.append(f"фото записи {path!r}, файлы в бэкенде {sorted(files)} — ожидался один, второй загрузки")
+    if backend.uploads != 2:
+        problems.append(f"загрузок {backend.uploads}, ожидалось 2")
+    stats = uploader.snapshot()
+    if (stats["stored"], stats["superseded"], stats["deleted"]) != (1, 1, 2):
+        problems.append(f"счётчики загрузчика: {stats}")
+    return problems
+
+
+def check_media_reconcile() -> list[str]:
+    import api.index as site
+    from api.media import MediaUploader, MemoryBackend
+
+    backend, problems = MemoryBackend(), []
+    uploader = MediaUploader(site.app, backend, site.IMAGE_WIDTHS, site.image_formats, workers=0)
+    old, fresh = time.time() - 7200, time.time()
+    backend.files.update({
+        "coaches/keep": (b"", old),        # фото тренера
+        "news/keep": (b"", old),           # картинка новости
+        "coaches/orphan": (b"", old),
+        "news/orphan": (b"", old),
+        "coaches/fresh": (b"", fresh),     # загрузка ещё может записаться в БД
+        "other/old": (b"", old),           # не папка загрузок
+    })
+    with site.app.app_context():
+        site.db.session.add_all([
+            site.Coach(name="Сверка", section="gym", photo_path=f"{backend.base_url}/coaches/keep"),
+            site.NewsArticle(title="Сверка", content="<p>текст</p>", image_path=f"{backend.base_url}/news/keep"),
+        ])
+        site.db.session.commit()
+
+        before = set(backend.files)
+        report = uploader.reconcile(site.MEDIA_FIELDS, grace=3600, batch_size=1, dry_run=True)
+        if (report["orphans"], report["deleted"]) != (2, 0) or set(backend.files) != before:
+            problems.append(f"dry-run: {report}, файлы {sorted(backend.files)}")
+        if sorted(report["sample"]) != ["coaches/orphan", "news/orphan"]:
+            problems.append(f"dry-run нашёл сирот {report['sample']}")
+
+        report = uploader.reconcile(site.MEDIA_FIELDS, grace=3600, batch_size=1, dry_run=False)
+        left = sorted(backend.files)
+        if report["deleted"] != 2 or left != ["coaches/fresh", "coaches/keep", "news/keep", "other/old"]:
+            problems.append(f"уборка: {report}, осталось {left}")
+    return problems
+
+
+CHECKS = {name.removeprefix("check_"): fn for name, fn in globals().items() if name.startswith("check_")}
+
+
+def main() -> int:
+    names = sys.argv[1:] or list(CHECKS)
+    unknown = [name for name in names if name not in CHECKS]
+    if unknown:
+        print(f"неизвестные проверки: {', '.join(unknown)}; есть: {', '.join(CHECKS)}", file=sys.stderr)
+        return 2
+
+    tmp = tempfile.TemporaryDirectory()
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "checks.db")
+    os.environ.update(ADMIN_PASS=ADMIN_PASS, OUTBOX_WORKER="0", AUTO_MIGRATE="1", RATE_LIMIT_ENABLED="0",
+                      LEADS_WRITE_BEHIND="0", PAGE_CACHE_ENABLED="0", MEDIA_BACKEND="memory")
+
+    report = {}
+    for name in names:
+        try:
+            report[name] = CHECKS[name]()
+        except Exception as e:  # noqa: BLE001 — упавшая проверка — тоже нарушение, остальные идут дальше
+            report[name] = [f"исключение: {e!r}"]
+        print(f"[checks] {name}: {'ok' if not report[name] else 'FAIL'}", file=sys.stderr)
+    print(json.dumps({name: problems for name, problems in report.items() if problems},
+                     ensure_ascii=False, indent=2))
+    tmp.cleanup()
+    return 1 if any(report.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# bench/explain.py
+"""
+Проверка планов запросов: EXPLAIN для SQL каждого маршрута, падение на seq scan.
+
+Маршруты (публичные страницы, списки админки, /api/v1) прогоняются через
+Flask test client с выключенным кэшем страниц — дважды, объясняются SELECT-ы
+второго, «тёплого» прохода (то, что закэшировано до смены версии контента,
+вроде числа курсов, в него уже не попадает):
+  • SQLite — EXPLAIN QUERY PLAN, полный проход — «SCAN <таблица>» без USING INDEX,
+    кроме прохода по rowid в порядке ORDER BY с LIMIT (он останавливается на LIMIT —
+    аналог Index Scan по первичному ключу в Postgres);
+  • Postgres — EXPLAIN (FORMAT JSON), полный проход — узел «Seq Scan».
+Нарушение — полный проход по таблице, в которой больше --max-rows строк
+(маленькие таблицы Postgres честно читает целиком, это не ошибка).
+Осознанные исключения — ALLOWED_FULL_SCANS.
+
+Каждый запрос идёт без внешнего app_context — со своей сессией, как в проде:
+общая сессия отдавала бы записи из identity map без SQL, и маршрут вроде
+news_article_detail проходил бы проверку с нулём SELECT-ов. Маршрут без
+единого SELECT (кроме NO_QUERY) — тоже нарушение. EXPLAIN идёт отдельным
+соединением, вне сессий приложения.
+
+Примеры:
+    python bench/explain.py --size 5000                    # временная SQLite, 5000 строк каждой модели
+    DATABASE_URL=postgresql://… python bench/explain.py --size 5000 --max-rows 1000
+    DATABASE_URL=postgresql://… python bench/explain.py    # на уже наполненной базе (staging-копия)
+
+Код выхода 1 — есть нарушения (для CI).
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import sys
+import tempfile
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT_DIR)
+
+from bench.run import ADMIN_PASS, routes, seed  # noqa: E402
+
+SQLITE_SCAN_RE = re.compile(r"^SCAN (?:TABLE )?(\w+)(?: AS \w+)?(.*)$")
+LIMIT_RE = re.compile(r"\bLIMIT\b", re.I)
+
+# (маршрут, таблица) -> почему полный проход допустим
+ALLOWED_FULL_SCANS = {
+    ("admin_courses_list", "courses"): "«всего N» над списком курсов в админке — COUNT по всей таблице",
+}
+
+# маршруты, которым БД не нужна; остальные на тёплом проходе обязаны её читать
+NO_QUERY = {"contacts_page"}
+
+EXTRA_ROUTES = [
+    ("api_coaches", "/api/v1/coaches?section=ski", False),
+    ("api_services", "/api/v1/services", False),
+    ("api_news", "/api/v1/news", False),
+    ("api_courses", "/api/v1/courses", False),
+    ("api_batch", "/api/v1/batch", False),
+    ("api_schedule", "/api/v1/schedule?section=ski&days=200", False),
+    ("sitemap", "/sitemap.xml", False),
+    ("news_feed", "/news/feed.xml", False),
+]
+
+
+class QueryRecorder:
+    """Запоминает SELECT-ы (текст для драйвера + параметры), выполненные за время записи."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.queries: list[tuple[str, object]] = []
+        self.active = False
+        event.listen(engine, "before_cursor_execute", self._on_query)
+
+    def _on_query(self, conn, cursor, statement, parameters, context, executemany):
+        if self.active and not executemany and statement.lstrip().upper().startswith("SELECT"):
+            self.queries.append((statement, parameters))
+
+    def record(self, fn) -> list[tuple[str, object]]:
+        self.queries, self.active = [], True
+        try:
+            fn()
+        finally:
+            self.active = False
+        unique = {}
+        for statement, params in self.queries:
+            unique.setdefault(statement, params)
+        return list(unique.items())
+
+
+def full_scans(conn, statement: str, params) -> list[str]:
+    """Таблицы, которые план читает целиком."""
+    if conn.dialect.name == "sqlite":
+        details = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, params)]
+        ordered_limit = LIMIT_RE.search(statement) and not any("TEMP B-TREE" in d for d in details)
+        tables = []
+        for detail in details:
+            match = SQLITE_SCAN_RE.match(detail)
+            if match and "USING" not in match.group(2) and not ordered_limit:
+                tables.append(match.group(1))
+        return tables
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, params).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        tables, stack = [], [plan[0]["Plan"]]
+        while stack:
+            node = stack.pop()
+            if node.get("Node Type") == "Seq Scan":
+                tables.append(node["Relation Name"])
+            stack.extend(node.get("Plans", ()))
+        return tables
+    raise SystemExit(f"EXPLAIN для {conn.dialect.name} не поддерживается")
+
+
+def check(app, db, max_rows: int, size: int) -> list[str]:
+    client = app.test_client()
+    auth = {"Authorization": "Basic " + base64.b64encode(f"admin:{os.environ['ADMIN_PASS']}".encode()).decode()}
+    table_rows: dict[str, int] = {}
+    problems = []
+
+    with app.app_context():
+        engine = db.engine     # дальше без app_context: у каждого запроса своя сессия
+    recorder = QueryRecorder(engine)
+    with engine.connect() as conn:
+        def rows_in(table: str) -> int:
+            if table not in table_rows:
+                quoted = conn.dialect.identifier_preparer.quote(table)
+                table_rows[table] = conn.exec_driver_sql(f"SELECT count(*) FROM {quoted}").scalar()
+            return table_rows[table]
+
+        def fetch(path: str, headers: dict) -> int:
+            # get_data(): потоковый ответ (sitemap) выполняет запросы, пока его читают;
+            # закрытие снимает контекст запроса потока
+            with client.get(path, headers=headers) as resp:
+                resp.get_data()
+                return resp.status_code
+
+        for name, path, admin in routes(size) + EXTRA_ROUTES:
+            headers = auth if admin else {}
+            status = fetch(path, headers)   # прогрев
+            queries = recorder.record(lambda: fetch(path, headers))
+            print(f"[explain] {name} {path} → {status}, SELECT: {len(queries)}", file=sys.stderr)
+            if name not in NO_QUERY and not queries:
+                problems.append(f"{name}: ни одного SELECT — план не проверен")
+            for statement, params in queries:
+                for table in full_scans(conn, statement, params):
+                    if (name, table) in ALLOWED_FULL_SCANS:
+                        continue
+                    if rows_in(table) > max_rows:
+                        sql = " ".join(statement.split())
+                        problems.append(f"{name}: полный проход по {table} ({rows_in(table)} строк): "
+                                        f"{sql[:200]}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN запросов маршрутов api/index.py")
+    parser.add_argument("--size", type=int, default=0,
+                        help="наполнить пустую базу: строк каждой модели (без DATABASE_URL — временная SQLite)")
+    parser.add_argument("--max-rows", type=int, default=1000, help="полный проход по таблице больше — ошибка")
+    parser.add_argument("--content-bytes", type=int, default=2000, help="размер текста новости при наполнении")
+    args = parser.parse_args()
+
+    tmp = None
+    if not os.environ.get("DATABASE_URL"):
+        tmp = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tmp.name, "explain.db")
+    os.environ.setdefault("ADMIN_PASS", ADMIN_PASS)
+    os.environ.update(OUTBOX_WORKER="0", AUTO_MIGRATE="1", PAGE_CACHE_ENABLED="0")
+
+    from api.index import app, db, Coach
+
+    if args.size:
+        with app.app_context():
+            empty = db.session.query(Coach.id).first() is None
+        if empty:
+            seed(args.size, args.content_bytes)
+        else:
+            print("[explain] база не пустая — --size не применяется", file=sys.stderr)
+    with app.app_context():
+        size = args.size or db.session.query(db.func.max(Coach.id)).scalar() or 1
+
+    problems = check(app, db, args.max_rows, size)
+    for line in problems:
+        print("[explain]", line)
+    if tmp:
+        tmp.cleanup()
+    print(f"[explain] нарушений: {len(problems)}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
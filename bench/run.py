@@ -0,0 +1,278 @@
+# bench/run.py
+"""
+Нагрузочный бенчмарк всех публичных страниц и списков админки.
+
+Для каждого объёма данных поднимается отдельный процесс со своей SQLite-базой,
+наполненной Coach/Service/NewsArticle/Course, и маршруты прогоняются
+  • через Flask test client (без сети — чистая стоимость приложения);
+  • через локальный WSGI-сервер werkzeug с N параллельными клиентами.
+
+Результат — JSON: пропускная способность, p50/p99, SQL-запросов на запрос, пик RSS.
+
+Примеры:
+    python bench/run.py --sizes 10,1000,10000 --requests 200 --out bench/latest.json
+    python bench/run.py --sizes 10,1000 --baseline bench/baseline.json   # сравнить с эталоном
+    python bench/run.py --sizes 1000 --cache                               # с кэшем страниц
+"""
+import argparse
+import base64
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+ADMIN_PASS = "bench"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))
+    return round(values[idx], 3)
+
+
+# ───────────────────────── Данные ─────────────────────────
+def seed(size: int, content_bytes: int) -> None:
+    from api.index import app, db, Coach, Service, NewsArticle, Course
+
+    rnd = random.Random(size)
+    body = ("<p>" + "Лыжи, сноуборд, тренажёры. " * (content_bytes // 28 + 1))[:content_bytes] + "</p>"
+    start = datetime(2024, 1, 1)
+
+    def chunks(make, total, chunk=5000):
+        for offset in range(0, total, chunk):
+            yield [make(i) for i in range(offset, min(total, offset + chunk))]
+
+    with app.app_context():
+        db.create_all()
+        for model, make in (
+            (Coach, lambda i: {"name": f"Тренер {i:06d}", "experience": "10 лет", "specialization": "Горные лыжи",
+                               "section": "ski" if i % 2 else "gym"}),
+            (Service, lambda i: {"name": f"Услуга {i:06d}", "description": "Описание услуги", "price": rnd.randint(1, 50) * 1000,
+                                 "duration": "60 мин", "section": "ski" if i % 2 else "gym"}),
+            (NewsArticle, lambda i: {"title": f"Новость {i:06d}", "content": body,
+                                     "pub_date": start + timedelta(minutes=i)}),
+            (Course, lambda i: {"title": f"Курс {i:06d}", "youtube_id": f"yt{i:09d}", "description": "Видеоурок"}),
+        ):
+            for rows in chunks(make, size):
+                db.session.execute(db.insert(model), rows)
+            db.session.commit()
+
+
+def routes(size: int) -> list[tuple[str, str, bool]]:
+    """(имя, путь, нужна ли авторизация). Публичные страницы + списки админки."""
+    last_page = max(1, -(-size // 9))
+    return [
+        ("index", "/", False),
+        ("ski_resort", "/ski-resort.html", False),
+        ("gym", "/gym.html", False),
+        ("news_list_all", "/news", False),
+        ("news_article_detail", f"/news/{max(1, size // 2)}", False),
+        ("courses", "/courses", False),
+        ("courses_last_page", f"/courses?page={last_page}", False),
+        ("contacts_page", "/contacts.html", False),
+        ("admin_coaches_list", "/admin/coaches", True),
+        ("admin_services_list", "/admin/services", True),
+        ("admin_courses_list", "/admin/courses", True),
+        ("admin_news_list", "/admin/news", True),
+    ]
+
+
+# ───────────────────────── Прогоны ─────────────────────────
+class QueryCounter:
+    def __init__(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(Engine, "after_cursor_execute", self._on_query)
+
+    def _on_query(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def summarize(latencies: list[float], elapsed: float, queries: int, errors: int) -> dict:
+    n = len(latencies)
+    return {
+        "requests": n,
+        "errors": errors,
+        "throughput_rps": round(n / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "queries_per_request": round(queries / n, 2) if n else 0.0,
+    }
+
+
+def run_test_client(app, counter: QueryCounter, path: str, auth: dict, requests: int) -> dict:
+    client = app.test_client()
+
+    def fetch() -> int:
+        # тело дочитывается и ответ закрывается: потоковые страницы рендерятся
+        # во время чтения, а незакрытый поток держит контекст запроса
+        with client.get(path, headers=auth) as resp:
+            resp.get_data()
+            return resp.status_code
+
+    fetch()   # прогрев: компиляция шаблонов, пул соединений
+    latencies, errors = [], 0
+    q0, t0 = counter.count, time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = fetch()
+        latencies.append((time.perf_counter() - start) * 1000)
+        errors += status >= 400
+    return summarize(latencies, time.perf_counter() - t0, counter.count - q0, errors)
+
+
+def run_wsgi(base_url: str, counter: QueryCounter, path: str, auth: dict, requests: int, concurrency: int) -> dict:
+    def one(_):
+        req = urllib.request.Request(base_url + path, headers=auth)
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req) as resp:
+                resp.read()
+                ok = resp.status < 400
+        except Exception:  # noqa: BLE001
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    one(0)
+    q0, t0 = counter.count, time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - t0
+    return summarize([r[0] for r in results], elapsed, counter.count - q0, sum(not r[1] for r in results))
+
+
+def child(args) -> dict:
+    """Один объём данных: наполнить базу и прогнать все маршруты (в отдельном процессе)."""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    seed(args.size, args.content_bytes)
+    from api.index import app
+
+    counter = QueryCounter()
+    auth = {"Authorization": "Basic " + base64.b64encode(f"admin:{ADMIN_PASS}".encode()).decode()}
+    result = {"size": args.size, "modes": {}}
+
+    if args.mode in ("client", "both"):
+        result["modes"]["client"] = {
+            name: run_test_client(app, counter, path, auth if admin else {}, args.requests)
+            for name, path, admin in routes(args.size)
+        }
+    if args.mode in ("wsgi", "both"):
+        server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+        try:
+            result["modes"]["wsgi"] = {
+                name: run_wsgi(base_url, counter, path, auth if admin else {}, args.requests, args.concurrency)
+                for name, path, admin in routes(args.size)
+            }
+        finally:
+            server.shutdown()
+
+    result["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return result
+
+
+# ───────────────────────── Сравнение ─────────────────────────
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессии: p50 выросла или RPS упал больше чем на tolerance, SQL-запросов стало больше."""
+    base_runs = {run["size"]: run for run in baseline.get("runs", [])}
+    problems = []
+    for run in current["runs"]:
+        base = base_runs.get(run["size"])
+        if not base:
+            continue
+        for mode, by_route in run["modes"].items():
+            for route, stats in by_route.items():
+                old = base["modes"].get(mode, {}).get(route)
+                if not old:
+                    continue
+                tag = f"size={run['size']} {mode} {route}"
+                if old["p50_ms"] and stats["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+                    problems.append(f"{tag}: p50 {old['p50_ms']} → {stats['p50_ms']} мс")
+                if old["throughput_rps"] and stats["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+                    problems.append(f"{tag}: RPS {old['throughput_rps']} → {stats['throughput_rps']}")
+                if stats["queries_per_request"] > old["queries_per_request"]:
+                    problems.append(f"{tag}: SQL/запрос {old['queries_per_request']} → {stats['queries_per_request']}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк маршрутов api/index.py")
+    parser.add_argument("--sizes", default="10,1000", help="объёмы строк каждой модели через запятую")
+    parser.add_argument("--requests", type=int, default=100, help="запросов на маршрут")
+    parser.add_argument("--concurrency", type=int, default=8, help="параллельных клиентов в режиме wsgi")
+    parser.add_argument("--mode", choices=("client", "wsgi", "both"), default="both")
+    parser.add_argument("--content-bytes", type=int, default=4000, help="размер текста новости")
+    parser.add_argument("--cache", action="store_true", help="не отключать кэш страниц")
+    parser.add_argument("--out", help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимое ухудшение, доля")
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)   # режим дочернего процесса
+    args = parser.parse_args()
+
+    if args.size is not None:
+        json.dump(child(args), sys.stdout)
+        return 0
+
+    runs = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ,
+                       DATABASE_URL="sqlite:///" + os.path.join(tmp, "bench.db"),
+                       ADMIN_PASS=ADMIN_PASS, OUTBOX_WORKER="0", AUTO_MIGRATE="1",
+                       PYTHONPATH=ROOT_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+            if not args.cache:
+                env["PAGE_CACHE_ENABLED"] = "0"
+            cmd = [sys.executable, os.path.abspath(__file__), "--size", str(size),
+                   "--requests", str(args.requests), "--concurrency", str(args.concurrency),
+                   "--mode", args.mode, "--content-bytes", str(args.content_bytes)]
+            print(f"[bench] size={size} …", file=sys.stderr)
+            out = subprocess.run(cmd, env=env, cwd=ROOT_DIR, check=True, stdout=subprocess.PIPE, text=True).stdout
+            runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "cache": args.cache,
+        "runs": runs,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            problems = compare(report, json.load(fh), args.tolerance)
+        for line in problems:
+            print("[bench] регрессия:", line, file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
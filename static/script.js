@@ -103,6 +103,7 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 });
 // ===== YouTube: вставка iframe по клику (поддержка .video-wrap[data-yt] и .js-yt[data-yt]) =====
+// Фасад (см. api/youtube.py): до клика на странице только превью, без JS YouTube.
 const mountYouTubeIframe = (wrap) => {
   const id = wrap.getAttribute('data-yt');
   if (!id) return;
@@ -114,21 +115,42 @@ const mountYouTubeIframe = (wrap) => {
     'allow',
     'accelerometer; autoplay; clipboard-write; encrypted-media; gyroscope; picture-in-picture; web-share'
   );
+  iframe.title = wrap.getAttribute('data-title') || 'YouTube';
   iframe.src = `https://www.youtube-nocookie.com/embed/${id}?rel=0&autoplay=1`;
   iframe.style.position = 'absolute';
   iframe.style.inset = '0';
   iframe.style.width = '100%';
   iframe.style.height = '100%';
   iframe.style.border = '0';
-  // Очищаем превью и вставляем iframe прямо в текущий контейнер
-  wrap.innerHTML = '';
-  // Гарантируем, что контейнер имеет нужные стили (если это <a>, они уже есть в CSS)
-  wrap.classList.add('video-wrap');
-  wrap.style.position = 'relative';
-  wrap.style.aspectRatio = '16 / 9';
-  wrap.appendChild(iframe);
+  // Превью — ссылка/кнопка; iframe внутри интерактивного элемента недопустим,
+  // поэтому заменяем её обычным контейнером с тем же соотношением сторон
+  const box = document.createElement('div');
+  box.className = 'video-wrap';
+  box.style.position = 'relative';
+  box.style.aspectRatio = '16 / 9';
+  box.appendChild(iframe);
+  wrap.replaceWith(box);
+  iframe.focus();
 };
 
+// Наведение/фокус на превью — заранее открыть соединения к YouTube (клик запустит быстрее)
+let ytWarmed = false;
+const warmYouTube = () => {
+  if (ytWarmed) return;
+  ytWarmed = true;
+  ['https://www.youtube-nocookie.com', 'https://www.google.com', 'https://i.ytimg.com'].forEach((href) => {
+    const link = document.createElement('link');
+    link.rel = 'preconnect';
+    link.href = href;
+    document.head.appendChild(link);
+  });
+};
+['pointerover', 'focusin'].forEach((type) => {
+  document.addEventListener(type, (e) => {
+    if (e.target.closest?.('.video-wrap[data-yt], .js-yt[data-yt]')) warmYouTube();
+  }, { passive: true });
+});
+
 // Клик мышью
 document.addEventListener('click', (e) => {
   const wrap = e.target.closest('.video-wrap[data-yt], .js-yt[data-yt]');